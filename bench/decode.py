@@ -0,0 +1,91 @@
+import os
+import sys
+import json
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.suite import workdir
+from core import decoders
+
+# модули читают misc/ при импорте, поэтому сначала временная папка, как в bench/suite.py
+with open(os.path.join(ROOT, "misc", "endpoints.json"), "rb") as f:
+    os.chdir(workdir(json.load(f)))
+
+from core import exchanges
+
+
+# python3 bench/decode.py [--rounds N] [--fixtures DIR]
+# Разбор записанных ответов tickers/{price,status,info}_<биржа>.json тремя способами: стандартный json,
+# orjson.loads и core.decoders.Decoder биржи (msgspec со схемой только из читаемых полей).
+# Время - процессорное (time.process_time), медиана по rounds. В цикле опроса каждый раз разбираются только
+# тикеры, статус и сведения о монетах берутся из MetadataCache; поэтому итог - отдельно за цикл и за полное обновление.
+# Снапшоты, собранные из каждого разбора, сверяются между собой
+KINDS = (("price", "ticker_price"), ("status", "status"), ("info", "coin_info"))
+
+
+def measure(decode, body, rounds):
+    times = []
+    for _ in range(rounds):
+        started = time.process_time()
+        decode(body)
+        times.append(time.process_time() - started)
+    return sorted(times)[len(times) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--fixtures", default=os.path.join(ROOT, "tickers"))
+    args = parser.parse_args()
+
+    ways = [("json", json.loads)]
+    if decoders.orjson is not None:
+        ways.append(("orjson", decoders.orjson.loads))
+    else:
+        print("orjson is not installed")
+    if decoders.msgspec is None:
+        print("msgspec is not installed, Decoder falls back to orjson/json")
+    names = [name for name in exchanges.EXCHANGES
+             if all(os.path.exists(os.path.join(args.fixtures, f"{kind}_{name}.json")) for kind, _ in KINDS)]
+
+    # способ -> [секунды на тикеры, секунды на все три ответа]
+    totals = {way: [0., 0.] for way, _ in ways + [("Decoder", None)]}
+    same = True
+    for name in names:
+        exchange = exchanges.EXCHANGES[name]()
+        line = []
+        built = []
+        for way, decode in ways + [("Decoder", None)]:
+            payloads = []
+            own = 0.
+            for kind, endpoint in KINDS:
+                with open(os.path.join(args.fixtures, f"{kind}_{name}.json"), "rb") as f:
+                    body = f.read()
+                parse = decode or exchange.decoders[endpoint].decode
+                seconds = measure(parse, body, args.rounds)
+                own += seconds
+                totals[way][1] += seconds
+                if kind == "price":
+                    totals[way][0] += seconds
+                payloads.append(parse(body))
+            # новый объект биржи на каждый способ: список пар не должен браться из прошлой сборки
+            built.append(exchanges.EXCHANGES[name]().build_snapshot(*payloads).to_pairs())
+            line.append(f"{way} {round(own * 1000, 2)}")
+        same &= all(pairs == built[0] for pairs in built[1:])
+        print(f"{name}: price + status + info, {', '.join(line)} ms")
+
+    print(f"recorded {', '.join(names)}, median of {args.rounds} rounds, CPU ms")
+    baseline_cycle, baseline_full = totals["json"]
+    for way, (cycle, full) in totals.items():
+        print(f"{way:8} cycle (tickers) {round(cycle * 1000, 2):8} ms, saved {round((baseline_cycle - cycle) * 1000, 2):7} ms | "
+              f"full refresh {round(full * 1000, 2):8} ms, saved {round((baseline_full - full) * 1000, 2):7} ms")
+    print(f"snapshots from every decoder: {'same' if same else 'DIFFERENT'}")
+    if not same:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
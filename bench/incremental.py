@@ -0,0 +1,85 @@
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.scanner import IncrementalScanner
+
+
+# python3 bench/incremental.py [--exchanges N] [--bases N] [--updates N] [--limit L]
+# Синтетический поток цен: exchanges бирж x bases монет, каждое обновление - случайная (биржа, база)
+# со сдвигом mid до ±spread. Меряется время core.scanner.IncrementalScanner.update на одно обновление
+# против полного перебора всех баз и бирж, который пришлось бы делать на каждое обновление без него.
+# В конце открытые сигналы сверяются с полным перебором
+def prices(rng, mid, spread):
+    mid *= 1 + rng.gauss(0, spread)
+    return mid * (1 - spread / 10), mid * (1 + spread / 10)
+
+
+def brute_force(book, limit):
+    # база -> лучшее отношение min ask / max bid по всем биржам
+    found = {}
+    for base, quotes in book.items():
+        ratio = min(ask for _, ask in quotes.values()) / max(bid for bid, _ in quotes.values())
+        if ratio < limit:
+            found[base] = ratio
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--exchanges", type=int, default=10)
+    parser.add_argument("--bases", type=int, default=3000)
+    parser.add_argument("--updates", type=int, default=200000)
+    parser.add_argument("--limit", type=float, default=0.98)
+    parser.add_argument("--spread", type=float, default=0.004, help="relative price noise between exchanges")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    names = [f"exchange{number}" for number in range(args.exchanges)]
+    bases = [f"COIN{number}" for number in range(args.bases)]
+    mids = {base: 10 ** rng.uniform(-4, 4) for base in bases}
+    book = {base: {name: prices(rng, mids[base], args.spread) for name in names} for base in bases}
+    feed = []
+    for _ in range(args.updates):
+        name, base = rng.choice(names), rng.choice(bases)
+        feed.append((name, base) + prices(rng, mids[base], args.spread))
+
+    scanner = IncrementalScanner(args.limit)
+    started = time.perf_counter()
+    for base, quotes in book.items():
+        for name, (bid, ask) in quotes.items():
+            scanner.update(name, base, bid, ask)
+    load = time.perf_counter() - started
+
+    signals = 0
+    started = time.perf_counter()
+    for name, base, bid, ask in feed:
+        if scanner.update(name, base, bid, ask) is not None:
+            signals += 1
+    incremental = (time.perf_counter() - started) / len(feed)
+
+    for name, base, bid, ask in feed:
+        book[base][name] = (bid, ask)
+    started = time.perf_counter()
+    expected = brute_force(book, args.limit)
+    rescan = time.perf_counter() - started
+
+    print(f"{args.exchanges} exchanges x {args.bases} bases, {len(feed)} updates, limit {args.limit}")
+    print(f"load: {round(load * 1000, 1)} ms")
+    print(f"incremental: {round(incremental * 1e6, 2)} us per update ({round(1 / incremental)} updates/s), "
+          f"{signals} threshold crossings")
+    print(f"full rescan: {round(rescan * 1000, 1)} ms per pass, {round(rescan / incremental)}x one incremental update")
+    opened = {base: ratio for base, (_, _, ratio) in scanner.signals.items()}
+    match = opened.keys() == expected.keys() and all(abs(opened[base] - expected[base]) < 1e-12 for base in opened)
+    print(f"open signals: {len(opened)}, brute force: {len(expected)}, {'match' if match else 'MISMATCH'}")
+    if not match:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import os
+import sys
+import time
+import random
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from core.snapshots import Snapshot, replay
+from core.scanner import scan_matrix, scan_pairs
+
+
+# python3 bench/matrix.py [--exchanges N] [--bases N] [--rounds N]
+# Поиск в режиме опроса: core.scanner.scan_matrix (numpy, базы x биржи x биржи одной операцией)
+# против построчного scan_pairs на синтетических снапшотах и на записанных tickers/tickers_*.json.
+# Каждая биржа торгует долей coverage всех монет, цены расходятся между биржами на ±spread.
+# Результаты обоих путей сверяются
+def synthetic(exchanges, bases, coverage, spread, seed):
+    rng = random.Random(seed)
+    mids = {f"COIN{number}": 10 ** rng.uniform(-4, 4) for number in range(bases)}
+    snapshots = []
+    for number in range(exchanges):
+        pairs = {}
+        for base, mid in mids.items():
+            if rng.random() < coverage:
+                mid *= 1 + rng.gauss(0, spread)
+                pairs[base] = {"prices": {"USDT": mid}, "bid": {"USDT": mid * 0.9995}, "ask": {"USDT": mid * 1.0005}}
+        snapshots.append(Snapshot.from_pairs(f"exchange{number}", pairs))
+    return snapshots
+
+
+def measure(scan, snapshots, limit, rounds):
+    times = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        hits = scan(snapshots, limit)
+        times.append(time.perf_counter() - started)
+    return sorted(times)[len(times) // 2], hits
+
+
+def compare(title, snapshots, limit, rounds):
+    matrix, matrix_hits = measure(scan_matrix, snapshots, limit, rounds)
+    loop, loop_hits = measure(scan_pairs, snapshots, limit, rounds)
+    matrix_hits, loop_hits = sorted(matrix_hits), sorted(loop_hits)
+    same = [hit[:3] for hit in matrix_hits] == [hit[:3] for hit in loop_hits] and \
+        all(abs(a[3] - b[3]) < 1e-12 for a, b in zip(matrix_hits, loop_hits))
+    print(f"{title}: matrix {round(matrix * 1000, 2)} ms, loop {round(loop * 1000, 2)} ms "
+          f"({round(loop / matrix, 1)}x), {len(matrix_hits)} hits, {'same' if same else 'DIFFERENT'}")
+    return same
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--exchanges", type=int, default=10)
+    parser.add_argument("--bases", type=int, default=3000)
+    parser.add_argument("--coverage", type=float, default=0.7)
+    parser.add_argument("--spread", type=float, default=0.004)
+    parser.add_argument("--limit", type=float, default=0.98)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    same = compare(f"synthetic {args.exchanges} exchanges x {args.bases} bases",
+                   synthetic(args.exchanges, args.bases, args.coverage, args.spread, args.seed), args.limit, args.rounds)
+    recorded = replay(["binance", "okx", "gate", "kucoin", "bitget", "bybit"], os.path.join(ROOT, "tickers"))
+    if recorded:
+        same &= compare(f"recorded {', '.join(snapshot.name for snapshot in recorded)}", recorded, args.limit, args.rounds)
+    if not same:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import exchanges
+from core.workers import ParsePool
+
+
+# python3 bench/parse_pool.py [--processes N] [--copies K] [--cycles C]
+# Время цикла по записанным ответам бирж (tickers/price_*, status_*, info_*): разбор тикеров и сборка снапшотов
+# в цикле событий против core.workers.ParsePool. Сеть не участвует, copies размножает биржи,
+# чтобы получить 6+ бирж из записанных. stall - самая долгая пауза, на которую цикл событий был занят
+
+
+def recorded(directory="tickers"):
+    names = []
+    for name in exchanges.EXCHANGES:
+        if all(os.path.exists(os.path.join(directory, f"{kind}_{name}.json")) for kind in ("price", "status", "info")):
+            names.append(name)
+    return names
+
+
+def read(name, kind, directory="tickers"):
+    with open(os.path.join(directory, f"{kind}_{name}.json"), "rb") as f:
+        return f.read()
+
+
+async def heartbeat(stalls, period=0.001):
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(period)
+        stalls.append(loop.time() - started - period)
+
+
+async def run(targets, pool, cycles):
+    stalls = []
+    beat = asyncio.create_task(heartbeat(stalls))
+    await asyncio.sleep(0.01)
+    times = []
+    for _ in range(cycles):
+        stalls.clear()
+        started = time.perf_counter()
+        if pool is None:
+            # как в BaseExchange.send и get_tickers_price без пула: тикеры разбираются каждый цикл, метаданные из кеша
+            for key, exchange, ticker_body, status_body, coin_body, status_of_coins, coin_infos in targets:
+                exchange.build_snapshot(exchange.decoders["ticker_price"].decode(ticker_body), status_of_coins, coin_infos)
+                await asyncio.sleep(0)
+        else:
+            await asyncio.gather(*[
+                pool.build(exchange, ticker_body, status_body, coin_body, key)
+                for key, exchange, ticker_body, status_body, coin_body, _, _ in targets
+            ])
+        times.append(time.perf_counter() - started)
+        await asyncio.sleep(0.01)
+    beat.cancel()
+    return times, max(stalls, default=0.)
+
+
+def report(title, times, stall):
+    times = sorted(times)
+    print(f"{title}: median {round(times[len(times) // 2] * 1000, 1)} ms, "
+          f"best {round(times[0] * 1000, 1)} ms, stall {round(stall * 1000, 1)} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--copies", type=int, default=2)
+    parser.add_argument("--cycles", type=int, default=20)
+    args = parser.parse_args()
+
+    targets = []
+    for copy in range(args.copies):
+        for name in recorded():
+            exchange = exchanges.EXCHANGES[name]()
+            status_body, coin_body = read(name, "status"), read(name, "info")
+            targets.append((f"{name}#{copy}", exchange, read(name, "price"), status_body, coin_body,
+                            exchange.decoders["status"].decode(status_body), exchange.decoders["coin_info"].decode(coin_body)))
+    print(f"{len(targets)} exchanges, {args.processes} processes, {os.cpu_count()} cpus")
+
+    report("event loop", *asyncio.run(run(targets, None, args.cycles)))
+    pool = ParsePool(args.processes).start()
+    try:
+        report("process pool", *asyncio.run(run(targets, pool, args.cycles)))
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
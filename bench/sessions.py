@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import aiohttp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.stub import StubServer
+from bench.suite import workdir, stats, row
+
+
+# python3 bench/sessions.py [--latency S] [--jitter S] [--handshake S] [--cycles N]
+# Время цикла опроса (get_tickers_price всех записанных бирж через bench/stub.py) с одной долгоживущей
+# сессией на биржу и так, как было до неё: новая aiohttp.ClientSession, а значит и новое соединение, на каждый запрос.
+# Метаданные после первого цикла берутся из кеша, так что в цикле по одному запросу тикеров на биржу.
+# stub слушает http на localhost, поэтому рукопожатия TCP и TLS по сети изображает --handshake: задержка первого
+# ответа на каждом новом соединении (для биржи за 50 мс RTT это порядка 0.1-0.15 с)
+class FreshSessions:
+    # прежнее поведение: сессия на каждый запрос, закрываются в конце цикла
+    def __init__(self):
+        self.sessions = []
+
+    def get_session(self):
+        session = aiohttp.ClientSession()
+        self.sessions.append(session)
+        return session
+
+    async def close(self):
+        sessions, self.sessions = self.sessions, []
+        for session in sessions:
+            await session.close()
+
+
+async def cycles(instances, count, fresh=None):
+    times = []
+    for _ in range(count):
+        started = time.perf_counter()
+        await asyncio.gather(*[exchange.get_tickers_price() for exchange in instances])
+        if fresh is not None:
+            await fresh.close()
+        times.append(time.perf_counter() - started)
+    return times
+
+
+async def run(server, args):
+    # импорт только здесь: модули читают misc/ из текущей папки при импорте
+    from core import exchanges
+
+    await server.start()
+    instances = [exchanges.EXCHANGES[name]() for name in server.names]
+    pooled_session = exchanges.BaseExchange.get_session
+    fresh = FreshSessions()
+    try:
+        # прогрев: кеш метаданных и разбор
+        await cycles(instances, 2)
+        exchanges.BaseExchange.get_session = fresh.get_session
+        before = await cycles(instances, args.cycles, fresh)
+        exchanges.BaseExchange.get_session = pooled_session
+        after = await cycles(instances, args.cycles)
+        return stats(before), stats(after)
+    finally:
+        exchanges.BaseExchange.get_session = pooled_session
+        await fresh.close()
+        await exchanges.BaseExchange.close_sessions()
+        await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixtures", default=os.path.join(ROOT, "tickers"))
+    parser.add_argument("--latency", type=float, default=0.)
+    parser.add_argument("--jitter", type=float, default=0.)
+    parser.add_argument("--handshake", type=float, default=0.1)
+    parser.add_argument("--cycles", type=int, default=30)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    with open(os.path.join(ROOT, "misc", "endpoints.json"), "rb") as f:
+        endpoints = json.load(f)
+    server = StubServer(endpoints, args.fixtures, args.latency, args.jitter, port=args.port, handshake=args.handshake)
+    print(f"fixtures: {', '.join(server.names)}, latency {args.latency} s, handshake {args.handshake} s")
+    os.chdir(workdir(server.rewritten()))
+
+    before, after = asyncio.run(run(server, args))
+    print(row("session per request", before))
+    print(row("pooled session", after))
+    print(f"median cycle {round((1 - after['median'] / before['median']) * 100, 1)}% faster")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import os
+import json
+import random
+import asyncio
+import weakref
+from urllib.parse import urlparse
+from aiohttp import web, WSMsgType
+
+
+# Локальная замена API бирж для бенчмарков: отдаёт записанные ответы (tickers/price_*, status_*, info_* -
+# то, что пишет main.py --persist) по тем же путям, что в misc/endpoints.json, с задержкой latency ± jitter секунд.
+# handshake - добавка к первому ответу на каждом новом соединении, вместо рукопожатий TCP и TLS по сети.
+# Стаканы не записываются, их stub строит сам вокруг записанных bid/ask (add_book)
+KINDS = {"ticker_price": "price", "status": "status", "coin_info": "info"}
+
+# как биржа заворачивает стакан в ответ, см. parse_order_book адаптеров
+BOOK_FORMATS = {
+    "binance": lambda book: book,
+    "gate": lambda book: book,
+    "kucoin": lambda book: {"code": "200000", "data": book},
+    "bitget": lambda book: {"code": "00000", "data": book},
+    "okx": lambda book: {"code": "0", "data": [book]},
+    "bybit": lambda book: {"retCode": 0, "result": book},
+}
+
+
+def recorded(endpoints, directory="tickers"):
+    # -> биржи из endpoints, у которых записаны все три ответа
+    names = []
+    for name in endpoints:
+        if all(os.path.exists(os.path.join(directory, f"{kind}_{name}.json")) for kind in KINDS.values()):
+            names.append(name)
+    return names
+
+
+def book(bid, ask, levels=50, step=0.0005, level_notional=500.):
+    # уровни через step от лучших цен, на каждом примерно level_notional в котируемой
+    return {
+        "bids": [[str(bid * (1 - step * level)), str(level_notional / bid)] for level in range(levels)],
+        "asks": [[str(ask * (1 + step * level)), str(level_notional / ask)] for level in range(levels)],
+    }
+
+
+class StubServer:
+    def __init__(self, endpoints, directory="tickers", latency=0., jitter=0., host="127.0.0.1", port=8765, seed=0,
+                 handshake=0.):
+        self.endpoints = endpoints
+        self.directory = directory
+        self.latency = latency
+        self.jitter = jitter
+        self.handshake = handshake
+        self.connections = weakref.WeakSet()
+        self.host = host
+        self.port = port
+        self.random = random.Random(seed)
+        # путь без query -> тело; путь с query -> тело стакана
+        self.bodies = {}
+        self.books = {}
+        self.runner = None
+        self.names = recorded(endpoints, directory)
+        for name in self.names:
+            for endpoint, kind in KINDS.items():
+                with open(os.path.join(directory, f"{kind}_{name}.json"), "rb") as f:
+                    self.bodies[self.path(name, endpoint).split("?")[0]] = f.read()
+
+    def prefix(self, name):
+        return f"/{name}{urlparse(self.endpoints[name]['base_url']).path}"
+
+    def path(self, name, endpoint, **fields):
+        return self.prefix(name) + self.endpoints[name][endpoint].format(**fields)
+
+    def rewritten(self):
+        # endpoints.json, в котором все записанные биржи смотрят на stub. Лимитов у stub нет, а бюджет
+        # бирж (у Binance 1200 в минуту) бенчмарк выбирает за секунды и дальше мерил бы ожидание в RateLimiter
+        endpoints = json.loads(json.dumps(self.endpoints))
+        for name in self.names:
+            endpoints[name]['base_url'] = f"http://{self.host}:{self.port}{self.prefix(name)}"
+            endpoints[name].pop('rate_limit', None)
+        return endpoints
+
+    def add_book(self, name, base, quote, bid, ask):
+        if 'order_book' in self.endpoints[name]:
+            body = BOOK_FORMATS[name](book(bid, ask))
+            self.books[self.path(name, "order_book", base=base, quote=quote)] = json.dumps(body).encode()
+
+    async def handle(self, request):
+        body = self.books.get(request.path_qs) or self.bodies.get(request.path)
+        delay = self.latency + self.random.uniform(-self.jitter, self.jitter)
+        if request.transport not in self.connections:
+            self.connections.add(request.transport)
+            delay += self.handshake
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if body is None:
+            return web.Response(status=404)
+        return web.Response(body=body, content_type="application/json")
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_route("GET", "/{tail:.*}", self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        return self
+
+    async def close(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+
+class StreamStub:
+    # Замена WebSocket бирж (core.streams): всё, что присылают клиенты (подписки, ping), копится в received,
+    # send() рассылает сообщение всем подключённым, drop() рвёт соединения, при refuse подключение получает 503.
+    # attempts - время каждой попытки подключения по часам цикла событий, для проверки backoff
+    def __init__(self, host="127.0.0.1", port=8766):
+        self.host = host
+        self.port = port
+        self.clients = set()
+        self.received = []
+        self.attempts = []
+        self.refuse = False
+        self.connected = asyncio.Event()
+        self.runner = None
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}/ws"
+
+    async def handle(self, request):
+        self.attempts.append(asyncio.get_running_loop().time())
+        if self.refuse:
+            return web.Response(status=503)
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.clients.add(ws)
+        self.connected.set()
+        try:
+            async for message in ws:
+                if message.type == WSMsgType.TEXT:
+                    self.received.append(message.data)
+        finally:
+            self.clients.discard(ws)
+        return ws
+
+    async def send(self, message):
+        data = message if isinstance(message, str) else json.dumps(message)
+        for ws in list(self.clients):
+            await ws.send_str(data)
+
+    async def drop(self):
+        self.connected.clear()
+        for ws in list(self.clients):
+            await ws.close()
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/ws", self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        return self
+
+    async def close(self):
+        await self.drop()
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
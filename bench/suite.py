@@ -0,0 +1,223 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime, timezone
+from functools import partial
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.stub import StubServer
+
+
+# python3 bench/suite.py [--latency S] [--jitter S] [--rounds N] [-k NAME] [--pool]
+# Бенчмарк без бирж и без ключей: записанные ответы из tickers/ отдаёт локальный stub (bench/stub.py),
+# модули работают во временной папке с ненастоящими misc/keys.json и misc/endpoints.json, направленным на stub
+# (misc/bad_bases.json - копия из репозитория).
+# Случаи: get_tickers_price каждой записанной биржи, find_arbitrage_pairs по готовым снапшотам
+# и полный цикл (опрос всех бирж + поиск). Результаты дописываются в bench/history.json вместе с коммитом,
+# и медиана каждого случая сравнивается с прошлым запуском с теми же параметрами на той же машине.
+# Ответы Bybit (tickers/*_bybit.json) не записаны, а собраны вручную в формате v3 из записи Binance: цены
+# с небольшим разбросом, сети без адресов контрактов, как отдаёт Bybit. Настоящие запишет main.py --persist,
+# если добавить bybit в exchanges.ENABLED. bench/history.json у каждой машины свой и в git не попадает
+HISTORY = os.path.join(ROOT, "bench", "history.json")
+
+
+def workdir(endpoints):
+    directory = tempfile.mkdtemp(prefix="arbitrage-bench-")
+    os.makedirs(os.path.join(directory, "misc"))
+    keys = {name: {"public": "bench", "private": "bench", "passphrase": "bench"} for name in endpoints}
+    keys["telegram"] = {"private": "123456:bench"}
+    with open(os.path.join(ROOT, "misc", "bad_bases.json"), "rb") as f:
+        bad_bases = json.load(f)
+    for name, data in (("keys.json", keys), ("endpoints.json", endpoints), ("telegram_ids.json", []),
+                       ("bad_bases.json", bad_bases)):
+        with open(os.path.join(directory, "misc", name), "w") as f:
+            json.dump(data, f)
+    return directory
+
+
+def stats(times):
+    times = sorted(times)
+    if len(times) > 1:
+        first, _, third = statistics.quantiles(times, n=4)
+    else:
+        first = third = times[0]
+    mean = statistics.mean(times)
+    return {
+        "rounds": len(times),
+        "min": times[0],
+        "max": times[-1],
+        "mean": mean,
+        "stddev": statistics.stdev(times) if len(times) > 1 else 0.,
+        "median": statistics.median(times),
+        "iqr": third - first,
+        "ops": 1 / mean if mean else 0.,
+    }
+
+
+async def measure(case, rounds, warmup):
+    for _ in range(warmup):
+        await case()
+    times = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        await case()
+        times.append(time.perf_counter() - started)
+    return stats(times)
+
+
+async def run(server, args):
+    # импорт только здесь: модули читают misc/ из текущей папки при импорте
+    from core import exchanges
+    from core.profit import ProfitEngine
+    from core.depth import DepthChecker
+    from core.lifecycle import OpportunityTracker
+    import main
+
+    await server.start()
+    instances = [exchanges.EXCHANGES[name]() for name in server.names]
+    try:
+        # первый цикл прогревает кеш метаданных и даёт монеты, для которых stub построит стаканы
+        for exchange in instances:
+            snapshot = await exchange.get_tickers_price()
+            for base in snapshot.bases():
+                index = snapshot.index(base)
+                for quote in snapshot.quotes:
+                    if snapshot.ask[quote][index]:
+                        server.add_book(exchange.name, snapshot.symbol(base), quote,
+                                        snapshot.bid[quote][index], snapshot.ask[quote][index])
+
+        # то, что main.py задаёт в __main__
+        main.limit = args.limit
+        main.profit = ProfitEngine(args.notional, main.taker_fees, main.identity)
+        main.depth = DepthChecker(args.notional)
+        # без ttl возможности из записанных ответов не закрываются: как в рабочем цикле, о каждой сообщается
+        # один раз, дальше она только отслеживается
+        main.tracker = OpportunityTracker()
+        main.capture = None
+
+        async def full_cycle():
+            await main.find_arbitrage_pairs(await main.gather_snapshots(instances))
+
+        cases = {f"get_tickers_price[{exchange.name}]": exchange.get_tickers_price for exchange in instances}
+        cases["find_arbitrage_pairs"] = partial(main.find_arbitrage_pairs, [exchange.snapshot for exchange in instances])
+        cases["full_cycle"] = full_cycle
+
+        results = {}
+        for name, case in cases.items():
+            if args.k and args.k not in name:
+                continue
+            results[name] = await measure(case, args.rounds, args.warmup)
+            print(row(name, results[name]))
+        return results
+    finally:
+        await exchanges.BaseExchange.close_sessions()
+        await server.close()
+
+
+def row(name, result):
+    return f"{name:<32} min {result['min'] * 1000:8.2f}  median {result['median'] * 1000:8.2f}  " \
+           f"mean {result['mean'] * 1000:8.2f}  stddev {result['stddev'] * 1000:7.2f}  ms  ops {result['ops']:8.1f}"
+
+
+def commit():
+    try:
+        return subprocess.run(["git", "-C", ROOT, "describe", "--always", "--dirty"],
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def save(entry, path=HISTORY):
+    # -> прошлый запуск с теми же параметрами на той же машине или None
+    history = []
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            history = json.load(f)
+    previous = None
+    for past in reversed(history):
+        if past["params"] == entry["params"] and past["machine"] == entry["machine"]:
+            previous = past
+            break
+    history.append(entry)
+    with open(path, "w") as f:
+        json.dump(history, f, indent=1)
+    return previous
+
+
+def compare(previous, results, threshold):
+    print(f"\nagainst {previous['commit']} ({previous['time']}):")
+    regressions = 0
+    for name, result in results.items():
+        before = previous["cases"].get(name)
+        if before is None:
+            continue
+        change = result["median"] / before["median"] - 1
+        mark = "  REGRESSION" if change > threshold else ""
+        regressions += bool(mark)
+        print(f"{name:<32} {before['median'] * 1000:8.2f} -> {result['median'] * 1000:8.2f} ms  {change * 100:+6.1f}%{mark}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixtures", default=os.path.join(ROOT, "tickers"))
+    parser.add_argument("--latency", type=float, default=0.)
+    parser.add_argument("--jitter", type=float, default=0.)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--limit", type=float, default=0.98)
+    parser.add_argument("--notional", type=float, default=1000)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--pool", action="store_true", help="parse in core.workers.ParsePool")
+    parser.add_argument("-k", default=None, help="only cases with this substring")
+    parser.add_argument("--threshold", type=float, default=0.1, help="median slowdown reported as a regression")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    with open(os.path.join(ROOT, "misc", "endpoints.json"), "rb") as f:
+        endpoints = json.load(f)
+    server = StubServer(endpoints, args.fixtures, args.latency, args.jitter, port=args.port)
+    missing = [name for name in endpoints if 'ticker_price' in endpoints[name] and endpoints[name].get('status')
+               and name not in server.names]
+    print(f"fixtures: {', '.join(server.names)}" + (f" (not recorded: {', '.join(missing)})" if missing else ""))
+    os.chdir(workdir(server.rewritten()))
+
+    pool = None
+    if args.pool:
+        from core import exchanges
+        from core.workers import ParsePool
+        pool = exchanges.BaseExchange.pool = ParsePool().start()
+    try:
+        results = asyncio.run(run(server, args))
+    finally:
+        if pool is not None:
+            pool.close()
+
+    if args.no_save or not results:
+        return
+    entry = {
+        "commit": commit(),
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": f"{platform.node()} {platform.machine()} {os.cpu_count()} cpus",
+        "params": {"latency": args.latency, "jitter": args.jitter, "limit": args.limit,
+                   "notional": args.notional, "pool": args.pool},
+        "cases": results,
+    }
+    previous = save(entry)
+    # код возврата 1, если что-то замедлилось больше threshold
+    if previous is not None and compare(previous, results, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+import asyncio
+import json
+import os
+import struct
+import sys
+import time
+import traceback
+import zlib
+from array import array
+from datetime import datetime, timezone
+from core.snapshots import BASES
+from core import tracing
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Хранилище истории: captures/<день UTC>/<таблица>.chunks, файлы только дописываются.
+# Файл - последовательность блоков: MAGIC, длина заголовка, заголовок JSON, сжатые zlib колонки подряд.
+# Строковые колонки хранятся номерами в словаре из заголовка блока. Недописанный хвост (упали посреди записи) читатель пропускает
+MAGIC = b"ACC1"
+HEAD = struct.Struct("<4sI")
+
+# таблица -> [(колонка, typecode array или "str")]
+TABLES = {
+    "snapshots": [
+        ("time", "d"), ("exchange", "str"), ("base", "str"),
+        ("bid", "d"), ("ask", "d"), ("bid_quote", "str"), ("ask_quote", "str"),
+    ],
+    "opportunities": [
+        ("time", "d"), ("base", "str"), ("buy", "str"), ("sell", "str"), ("buy_quote", "str"), ("sell_quote", "str"),
+        ("buy_price", "d"), ("sell_price", "d"), ("notional", "d"), ("net_profit", "d"), ("net_edge", "d"),
+        ("executable_spread", "d"), ("max_notional", "d"),
+    ],
+}
+
+
+def day_of(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%d")
+
+
+class Batch:
+    # Колонки одной таблицы до записи на диск, строки - номера в словаре strings
+    def __init__(self, table):
+        self.table = table
+        self.strings = []
+        self.codes = {}
+        self.columns = {name: array("I" if typecode == "str" else typecode) for name, typecode in TABLES[table]}
+        self.day = None
+
+    def __len__(self):
+        return len(self.columns["time"])
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.strings)
+            self.strings.append(value)
+        return code
+
+    def add(self, row):
+        for (name, typecode), value in zip(TABLES[self.table], row):
+            self.columns[name].append(self.code(value) if typecode == "str" else value)
+
+    def encode(self):
+        blobs = [zlib.compress(self.columns[name].tobytes(), 6) for name, _ in TABLES[self.table]]
+        header = json.dumps({
+            "rows": len(self),
+            "strings": self.strings,
+            "columns": [[name, self.columns[name].typecode, len(blob)] for (name, _), blob in zip(TABLES[self.table], blobs)],
+        }).encode()
+        return HEAD.pack(MAGIC, len(header)) + header + b"".join(blobs)
+
+
+class CaptureSink:
+    # Дописывает каждый цикл нормализованные цены снапшотов и найденные возможности.
+    # В цикле сканера только копируются колонки; сжатие и запись - в фоновой задаче и потоке.
+    # Очередь ограничена: если диск не успевает, пачки сверх max_pending выбрасываются, сканер не ждёт
+    def __init__(self, directory="captures", max_pending=64, chunk_rows=50000, flush_interval=60):
+        self.directory = directory
+        self.queue = asyncio.Queue(max_pending)
+        self.chunk_rows = chunk_rows
+        self.flush_interval = flush_interval
+        self.batches = {}
+        self.task = None
+        self.dropped = 0
+
+    def put(self, table, rows):
+        if self.task is None:
+            self.task = tracing.detach(self.drain())
+        try:
+            self.queue.put_nowait((table, rows))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            print(f"Capture is behind, {self.dropped} batches dropped")
+
+    def put_snapshots(self, snapshots, timestamp=None):
+        # цены снапшотов меняются на месте, поэтому значения копируются сразу
+        timestamp = time.time() if timestamp is None else timestamp
+        rows = []
+        names = BASES.names
+        for snapshot in snapshots:
+            quotes = snapshot.quotes
+            bids, asks = snapshot.norm_bid, snapshot.norm_ask
+            bid_quotes, ask_quotes = snapshot.bid_quote, snapshot.ask_quote
+            for index in snapshot.active:
+                rows.append((timestamp, snapshot.name, names[index], bids[index], asks[index],
+                             quotes[bid_quotes[index]], quotes[ask_quotes[index]]))
+        self.put("snapshots", rows)
+
+    def put_opportunities(self, opportunities, timestamp=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        nan = float("nan")
+        self.put("opportunities", [
+            (timestamp, opportunity.base, opportunity.buy, opportunity.sell, opportunity.buy_quote, opportunity.sell_quote,
+             opportunity.buy_price, opportunity.sell_price, opportunity.notional, opportunity.net_profit, opportunity.net_edge,
+             nan if opportunity.executable_spread is None else opportunity.executable_spread,
+             nan if opportunity.max_notional is None else opportunity.max_notional)
+            for opportunity in opportunities
+        ])
+
+    async def drain(self):
+        loop = asyncio.get_running_loop()
+        flushed_at = loop.time()
+        while True:
+            try:
+                item = await asyncio.wait_for(self.queue.get(), self.flush_interval)
+            except asyncio.TimeoutError:
+                item = (None, [])
+            # None - знак от close(): всё, что было раньше в очереди, уже дописано
+            if item is None:
+                break
+            table, rows = item
+            try:
+                if rows:
+                    await self.append(table, rows)
+                if loop.time() - flushed_at >= self.flush_interval:
+                    await self.flush()
+                    flushed_at = loop.time()
+            except Exception:
+                traceback.print_exception(*sys.exc_info())
+
+    async def append(self, table, rows):
+        batch = self.batches.get(table)
+        day = day_of(rows[0][0])
+        # блок не переходит через полночь: партиция по дню
+        if batch is not None and batch.day != day:
+            await self.write(batch)
+            batch = None
+        if batch is None:
+            batch = self.batches[table] = Batch(table)
+            batch.day = day
+        for row in rows:
+            batch.add(row)
+        if len(batch) >= self.chunk_rows:
+            await self.write(batch)
+
+    async def write(self, batch):
+        if self.batches.get(batch.table) is batch:
+            del self.batches[batch.table]
+        if len(batch):
+            await asyncio.to_thread(self.dump, batch)
+
+    def dump(self, batch):
+        directory = os.path.join(self.directory, batch.day)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"{batch.table}.chunks"), "ab") as f:
+            f.write(batch.encode())
+
+    async def flush(self):
+        for batch in list(self.batches.values()):
+            await self.write(batch)
+
+    async def close(self):
+        # дописать всё, что уже в очереди и в буферах. Задачу не отменяем: wait_for с готовым элементом
+        # может проглотить отмену, и drain крутился бы дальше. Она сама выходит, дойдя до None
+        if self.task is not None:
+            if not self.task.done():
+                await self.queue.put(None)
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        # если drain уже не работал, остаток очереди дописывается здесь
+        while not self.queue.empty():
+            table, rows = self.queue.get_nowait()
+            if rows:
+                await self.append(table, rows)
+        await self.flush()
+
+
+def chunks(table, start=None, end=None, directory="captures"):
+    # -> блоки таблицы за дни от start до end (строки "YYYY-MM-DD" или timestamp), по порядку записи:
+    # {колонка: array или list строк}
+    if not os.path.isdir(directory):
+        return
+    start = day_of(start) if isinstance(start, (int, float)) else start
+    end = day_of(end) if isinstance(end, (int, float)) else end
+    for day in sorted(os.listdir(directory)):
+        if (start is not None and day < start) or (end is not None and day > end):
+            continue
+        path = os.path.join(directory, day, f"{table}.chunks")
+        if not os.path.exists(path):
+            continue
+        with open(path, "rb") as f:
+            data = f.read()
+        position = 0
+        while position + HEAD.size <= len(data):
+            magic, header_size = HEAD.unpack_from(data, position)
+            if magic != MAGIC or position + HEAD.size + header_size > len(data):
+                break
+            header = json.loads(data[position + HEAD.size:position + HEAD.size + header_size])
+            position += HEAD.size + header_size
+            if position + sum(size for _, _, size in header["columns"]) > len(data):
+                break
+            strings = header["strings"]
+            columns = {}
+            for name, typecode, size in header["columns"]:
+                column = array(typecode, zlib.decompress(data[position:position + size]))
+                position += size
+                columns[name] = [strings[code] for code in column] if dict(TABLES[table])[name] == "str" else column
+            yield columns
+
+
+def read(table, start=None, end=None, directory="captures"):
+    # Для анализа: все блоки таблицы одним набором колонок. С numpy числа - ndarray, строки - массив объектов
+    result = {name: array(typecode) if typecode != "str" else [] for name, typecode in TABLES[table]}
+    for columns in chunks(table, start, end, directory):
+        for name, column in columns.items():
+            result[name].extend(column)
+    if np is not None:
+        return {name: np.frombuffer(column, dtype=column.typecode) if isinstance(column, array) else np.array(column, dtype=object)
+                for name, column in result.items()}
+    return result
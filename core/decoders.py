@@ -0,0 +1,48 @@
+import json
+from typing import Any, List, TypedDict
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+def loads(body):
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def dumps(data):
+    # -> bytes
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data).encode()
+
+
+def schema(path, fields):
+    # Тип для msgspec: по ключам path лежит список записей, в записях только fields.
+    # Остальные поля msgspec пропускает, не создавая для них объектов
+    data = List[TypedDict("Row", {field: Any for field in fields}, total=False)]
+    for key in reversed(path):
+        data = TypedDict("Level", {key: data}, total=False)
+    return data
+
+
+class Decoder:
+    # Разбор ответа биржи. Если установлен msgspec и известны поля, которые читает адаптер,
+    # ответ сразу разбирается только в них; иначе orjson, если он есть, или стандартный json
+    def __init__(self, path=(), fields=None):
+        self.decoder = None
+        if msgspec is not None and fields:
+            self.decoder = msgspec.json.Decoder(schema(path, fields))
+
+    def decode(self, body):
+        if self.decoder is not None:
+            return self.decoder.decode(body)
+        return loads(body)
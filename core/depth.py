@@ -0,0 +1,110 @@
+import asyncio
+import sys
+import traceback
+from core import exchanges
+
+
+def buy_fill(asks, notional):
+    # Покупка на notional котируемой валюты по стакану: -> (куплено монет, потрачено)
+    amount = 0.
+    spent = 0.
+    for price, quantity in asks:
+        cost = price * quantity
+        if spent + cost >= notional:
+            amount += (notional - spent) / price
+            return amount, notional
+        amount += quantity
+        spent += cost
+    return amount, spent
+
+
+def sell_fill(bids, amount):
+    # Продажа amount монет по стакану: -> (продано монет, выручка)
+    sold = 0.
+    proceeds = 0.
+    for price, quantity in bids:
+        if sold + quantity >= amount:
+            proceeds += (amount - sold) * price
+            return amount, proceeds
+        sold += quantity
+        proceeds += price * quantity
+    return sold, proceeds
+
+
+def executable_spread(asks, bids, notional):
+    # Спред по VWAP: купить на notional по asks биржи A и продать купленное по bids биржи B
+    amount, spent = buy_fill(asks, notional)
+    if amount <= 0:
+        return None
+    sold, proceeds = sell_fill(bids, amount)
+    if sold < amount or spent < notional:
+        return None
+    return proceeds / spent - 1
+
+
+def max_notional(asks, bids, min_spread=0., iterations=30):
+    # Наибольший размер сделки, при котором спред по VWAP ещё не ниже min_spread
+    low, high = 0., sum(price * quantity for price, quantity in asks)
+    for _ in range(iterations):
+        middle = (low + high) / 2
+        spread = executable_spread(asks, bids, middle)
+        if spread is not None and spread >= min_spread:
+            low = middle
+        else:
+            high = middle
+    return low
+
+
+class DepthChecker:
+    # Вторая ступень фильтра: L2 стаканы запрашиваются только для кандидатов, прошедших фильтр по mid ценам
+    def __init__(self, notional, concurrency=8, min_spread=0.):
+        self.notional = notional
+        self.min_spread = min_spread
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.exchanges = {}
+
+    def exchange(self, name):
+        if name not in self.exchanges:
+            self.exchanges[name] = exchanges.EXCHANGES[name]()
+        return self.exchanges[name]
+
+    async def order_book(self, snapshot, base, quote):
+        # -> (bids, asks) с ценами, пересчитанными из quote в numeraire по курсам снапшота
+        symbol_base = snapshot.symbol(base)
+        async with self.semaphore:
+            bids, asks = await self.exchange(snapshot.name).request_order_book(symbol_base, quote)
+        if quote == snapshot.numeraire:
+            return bids, asks
+        rate_bid, rate_ask = snapshot.rates[quote]
+        return [(price * rate_bid, quantity) for price, quantity in bids], \
+            [(price * rate_ask, quantity) for price, quantity in asks]
+
+    async def check(self, opportunity, by_name):
+        try:
+            (_, asks), (bids, _) = await asyncio.gather(
+                self.order_book(by_name[opportunity.buy], opportunity.base, opportunity.buy_quote),
+                self.order_book(by_name[opportunity.sell], opportunity.base, opportunity.sell_quote),
+            )
+        except Exception:
+            traceback.print_exception(*sys.exc_info())
+            return opportunity
+        opportunity.executable_spread = executable_spread(asks, bids, self.notional)
+        opportunity.max_notional = max_notional(asks, bids, self.min_spread)
+        return opportunity
+
+    async def check_all(self, opportunities, snapshots):
+        by_name = {snapshot.name: snapshot for snapshot in snapshots}
+        checked = await asyncio.gather(*[self.check(opportunity, by_name) for opportunity in opportunities])
+        # если стаканы получить не удалось (max_notional не посчитан), кандидат остаётся непроверенным
+        return [
+            opportunity for opportunity in checked
+            if opportunity.max_notional is None or
+            (opportunity.executable_spread is not None and opportunity.executable_spread >= self.min_spread)
+        ]
+
+
+class SkipDepth:
+    # Для --replay: цены в файлах старые, а стаканы бирж - сегодняшние, сверять их не с чем.
+    # Кандидаты проходят без проверки, executable_spread и max_notional остаются None
+    async def check_all(self, opportunities, snapshots):
+        return list(opportunities)
@@ -7,8 +7,101 @@ import time
 import aiohttp
 import asyncio
 import traceback
+import random
 import sys
 from datetime import datetime
+from core.snapshots import Snapshot, Listing, BASES, TRADABLE, to_float
+from core.ratelimit import RateLimiter
+from core.decoders import Decoder
+from core.identity import network, UNKNOWN_FEE
+from core import metrics
+from core import tracing
+
+
+class CacheEntry:
+    def __init__(self, data, etag=None, last_modified=None):
+        self.data = data
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = time.monotonic()
+
+
+class MetadataCache:
+    # Список пар и конфиг депозитов/выводов меняются несколько раз в час,
+    # поэтому отдаём их из кеша и обновляем в фоне, а каждый цикл ходим только за тикерами
+    def __init__(self):
+        self.entries = {}
+        self.refreshing = {}
+
+    async def get(self, key, ttl, fetch):
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = await fetch(None)
+            self.entries[key] = entry
+        elif time.monotonic() - entry.fetched_at > ttl and key not in self.refreshing:
+            self.refreshing[key] = tracing.detach(self.refresh(key, fetch, entry))
+        return entry.data
+
+    async def refresh(self, key, fetch, entry):
+        try:
+            self.entries[key] = await fetch(entry)
+        except Exception:
+            traceback.print_exception(*sys.exc_info())
+        finally:
+            del self.refreshing[key]
+
+    async def close(self):
+        for task in list(self.refreshing.values()):
+            task.cancel()
+        await asyncio.gather(*self.refreshing.values(), return_exceptions=True)
+        self.refreshing.clear()
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class CircuitBreaker:
+    # После failure_threshold неудачных запросов подряд биржа отключается на reset_timeout секунд,
+    # затем автомат полуоткрыт: проходит один пробный запрос, остальные ждут его исхода.
+    # Успех закрывает автомат, ошибка открывает его снова
+    def __init__(self, failure_threshold=3, reset_timeout=60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        # future пробного запроса, пока он идёт
+        self.probe = None
+
+    async def acquire(self):
+        # -> (можно ли отправлять запрос, future пробного запроса или None)
+        while self.opened_at is not None:
+            if self.probe is not None:
+                await asyncio.shield(self.probe)
+                continue
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False, None
+            self.probe = asyncio.get_running_loop().create_future()
+            return True, self.probe
+        return True, None
+
+    def finish(self, probe):
+        # Пробный запрос закончился. Если ни success(), ни failure() не было (отмена, не сетевая ошибка),
+        # автомат остаётся открытым, и пробой станет следующий запрос
+        if probe is not None and self.probe is probe:
+            self.probe = None
+            probe.set_result(None)
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.finish(self.probe)
+
+    def failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold or self.probe is not None:
+            self.opened_at = time.monotonic()
+        self.finish(self.probe)
 
 
 class BaseExchange:
@@ -18,204 +111,413 @@ class BaseExchange:
     with open("misc/endpoints.json", "rb") as f:
         endpoints = json.load(f)
 
+    # Одна долгоживущая сессия на биржу: соединения и TLS переиспользуются между циклами
+    sessions = {}
+    connection_limit = 10
+    dns_cache_ttl = 300
+    keepalive_timeout = 60
+
+    # Необязательная запись в tickers/ (core.snapshots.FileSink), по умолчанию выключена
+    sink = None
+
+    # Необязательный разбор в отдельных процессах (core.workers.ParsePool): тогда тикеры и метаданные
+    # приходят сюда непрочитанными байтами, а снапшот собирается в процессе биржи
+    pool = None
+
+    # Один лимитер и один автомат на биржу, общие для всех экземпляров класса
+    limiters = {}
+    breakers = {}
+
+    # Дедлайн одного запроса и повторы с джиттером при сетевых ошибках, таймаутах и 5xx
+    request_timeout = 10
+    retries = 2
+    retry_delay = 0.5
+
+    metadata = MetadataCache()
+    metadata_ttl = {"status": 900, "coin_info": 300}
+
     def __init__(self, name):
         self.name = name
         self.base_url = self.endpoints[self.name]['base_url']
         self.ticker_price = self.endpoints[self.name]['ticker_price']
         self.status = self.endpoints[self.name]['status']
         self.coin_info = self.endpoints[self.name]['coin_info']
+        self.connection_limit = self.endpoints[self.name].get('connection_limit', self.connection_limit)
+        self.metadata_ttl = {**self.metadata_ttl, **self.endpoints[self.name].get('metadata_ttl', {})}
+        self.poll_period = self.endpoints[self.name].get('poll_period')
+        if self.name not in self.limiters:
+            self.limiters[self.name] = RateLimiter(self.endpoints[self.name].get('rate_limit'))
+        self.limiter = self.limiters[self.name]
+        if self.name not in self.breakers:
+            self.breakers[self.name] = CircuitBreaker()
+        self.breaker = self.breakers[self.name]
         self.spread_limit = 0.95
         self.vol24 = 200000
+        # котируемые валюты; первая - общая единица (numeraire), в которую пересчитываются цены остальных
+        self.quotes = tuple(self.endpoints[self.name].get('quotes', ("USDT",)))
+        # на каждый эндпоинт свой разбор: только поля, которые читают адаптер и build_snapshot
+        ticker_fields = self.ticker_fields + ((self.last_field,) if self.last_field else ())
+        self.decoders = {
+            "ticker_price": Decoder(self.ticker_path, ticker_fields),
+            "status": Decoder(self.status_path, self.status_fields),
+            "coin_info": Decoder(self.coin_info_path, (self.coin_field,) + self.coin_fields),
+        }
+        self.decoder = Decoder()
+        # снапшот биржи переиспользуется между циклами, список пар пересобирается только при новых метаданных
+        self.snapshot = None
+        self.listing = None
+        self.listing_source = None
+
+    def get_session(self):
+        session = self.sessions.get(self.name)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.connection_limit,
+                limit_per_host=self.connection_limit,
+                ttl_dns_cache=self.dns_cache_ttl,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            session = aiohttp.ClientSession(connector=connector)
+            self.sessions[self.name] = session
+        return session
+
+    @classmethod
+    async def close_sessions(cls):
+        await cls.metadata.close()
+        for session in cls.sessions.values():
+            await session.close()
+        cls.sessions.clear()
+
+    def dump(self, kind, data):
+        if self.sink is not None:
+            self.sink.write(f"{kind}_{self.name}.json", data)
+
+    def poll_interval(self, default):
+        # poll_period "auto" - опрашивать тикеры так часто, как позволяет бюджет лимитов биржи
+        min_period = self.limiter.min_period(["ticker_price"])
+        if self.poll_period == "auto":
+            return max(min_period, 1)
+        return max(self.poll_period or default, min_period)
+
+    def observe(self, endpoint, response):
+        self.limiter.observe(endpoint, response.status, response.headers)
+        if response.status in (418, 429) or response.status >= 500:
+            response.raise_for_status()
+
+    async def request(self, path, headers=None, endpoint=None):
+        return (await self.request_conditional(path, headers=headers, endpoint=endpoint)).data
+
+    async def request_conditional(self, path, entry=None, headers=None, endpoint=None):
+        # ETag/Last-Modified от прошлого ответа: если биржа их отдаёт, на 304 тело не качаем
+        headers = dict(headers or {})
+        if entry is not None and entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry is not None and entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        allowed, probe = await self.breaker.acquire()
+        if not allowed:
+            raise CircuitOpen(f"{self.name} is unavailable, circuit is open")
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    result = await self.send(path, entry, headers, endpoint)
+                    self.breaker.success()
+                    return result
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                    # на 418/429 не повторяем: лимитер уже поставил паузу
+                    rate_limited = isinstance(e, aiohttp.ClientResponseError) and e.status in (418, 429)
+                    if rate_limited or attempt == self.retries:
+                        self.breaker.failure()
+                        raise
+                    with tracing.span("retry backoff"):
+                        await asyncio.sleep(self.retry_delay * 2 ** attempt * random.uniform(0.5, 1.5))
+        finally:
+            self.breaker.finish(probe)
+
+    async def send(self, path, entry, headers, endpoint):
+        with tracing.span("rate limit"):
+            await self.limiter.acquire(endpoint)
+        timeout = aiohttp.ClientTimeout(total=self.request_timeout)
+        # задержка считается от отправки до последнего байта тела, без ожидания в лимитере и без разбора
+        started = time.perf_counter()
+        try:
+            with tracing.span(f"request {endpoint}"):
+                async with self.get_session().get(self.base_url+path, headers=headers, timeout=timeout) as response:
+                    self.observe(endpoint, response)
+                    if response.status == 304 and entry is not None:
+                        metrics.http_seconds.observe(time.perf_counter() - started, self.name, endpoint)
+                        entry.fetched_at = time.monotonic()
+                        return entry
+                    body = await response.read()
+        except Exception:
+            metrics.http_errors.inc(self.name, endpoint)
+            raise
+        metrics.http_seconds.observe(time.perf_counter() - started, self.name, endpoint)
+        metrics.http_bytes.observe(len(body), self.name, endpoint)
+        if self.pool is not None and endpoint in self.decoders:
+            data = body
+        else:
+            with metrics.decode_seconds.time(self.name, endpoint), tracing.span(f"decode {endpoint}"):
+                data = self.decoders.get(endpoint, self.decoder).decode(body)
+        return CacheEntry(data, response.headers.get("ETag"), response.headers.get("Last-Modified"))
 
     async def request_tickers_price(self):
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"{self.base_url+self.ticker_price}") as response:
-                data = await response.json()
-                with open(f"tickers/price_{self.name}.json", "w") as f:
-                    json.dump(data, f)
+        data = await self.request(self.ticker_price, endpoint="ticker_price")
+        self.dump("price", data)
         return data
     
     async def request_status(self):
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"{self.base_url+self.status}") as response:
-                data = await response.json()
-                with open(f"tickers/status_{self.name}.json", "w") as f:
-                    json.dump(data, f)
-        return data
-
-
-class BinanceExchange(BaseExchange):
-    def __init__(self, name="binance"):
-        super().__init__(name)
-        self.quotes = ("USDT",)
-
+        return await self.metadata.get((self.name, "status"), self.metadata_ttl["status"], self.fetch_status)
 
     async def request_coin_info(self):
-        async with aiohttp.ClientSession() as session:
-            headers = {
-                "X-MBX-APIKEY": self.keys["binance"]['public']
-            }
-            timestamp = int(time.time()) * 1000 # miliseconds
-            queries = f"timestamp={timestamp}&recvWindow=10000" # query
-            signature = hmac.new(
-                self.keys['binance']['private'].encode('utf-8'),
-                msg=queries.encode('utf-8'),
-                digestmod=hashlib.sha256
-            ).hexdigest()
-            queries = queries + f"&signature={signature}"
-            async with session.get(f"{self.endpoints['binance']['base_url']+self.endpoints['binance']['coin_info']}?{queries}", headers=headers) as response:
-                data = await response.json()
-                with open(f"tickers/info_{self.name}.json", "w") as f:
-                    json.dump(data, f)
+        return await self.metadata.get((self.name, "coin_info"), self.metadata_ttl["coin_info"], self.fetch_coin_info)
+
+    async def request_order_book(self, base, quote="USDT"):
+        # -> (bids, asks), списки (цена, количество) от лучшей цены
+        path = self.endpoints[self.name]['order_book'].format(base=base, quote=quote)
+        bids, asks = self.parse_order_book(await self.request(path, endpoint="order_book"))
+        bids = [(float(level[0]), float(level[1])) for level in bids]
+        asks = [(float(level[0]), float(level[1])) for level in asks]
+        return bids, asks
+
+    def parse_order_book(self, data):
+        return data['bids'], data['asks']
+
+    async def fetch_status(self, entry=None):
+        entry = await self.request_conditional(self.status, entry, endpoint="status")
+        self.dump("status", entry.data)
+        return entry
+
+    async def fetch_coin_info(self, entry=None):
+        entry = await self.request_conditional(self.coin_info, entry, endpoint="coin_info")
+        self.dump("info", entry.data)
+        return entry
+
+    # Адаптер биржи описывает только, где в ответах лежат списки и как читать запись:
+    #   *_path - ключи до списка в ответе
+    #   parse_status(sample) -> (base, quote, торгуется ли пара), status_fields - поля, которые он читает
+    #   coin_field - поле с монетой в coin_info, parse_coin(sample) -> (открыты ли депозит и вывод, поля для Listing.set),
+    #   в полях "networks" - сети монеты (core.identity.network), из них берутся комиссии и сверка активов между биржами
+    #   coin_fields - поля, которые читает parse_coin
+    #   symbol_format - как из монеты и котируемой собирается символ в тикерах
+    #   ticker_fields - (символ, bid, ask, объём в котируемой), last_field - последняя цена, если её нужно проверять на 0
+    # Снапшот из них собирает build_snapshot, одинаково для всех бирж
+    status_path = ()
+    coin_info_path = ()
+    ticker_path = ()
+    status_fields = ()
+    coin_field = "coin"
+    coin_fields = ()
+    symbol_format = "{base}{quote}"
+    ticker_fields = ("symbol", "bidPrice", "askPrice", "quoteVolume")
+    last_field = None
+
+    def parse_status(self, sample):
+        raise NotImplementedError
+
+    def parse_coin(self, sample):
+        raise NotImplementedError
+
+    @staticmethod
+    def extract(data, path):
+        for key in path:
+            data = data[key]
         return data
-    
 
     async def get_tickers_price(self):
-        return_list = await asyncio.gather(self.request_tickers_price(), self.request_status(), self.request_coin_info())
-        ticker_prices, status_of_coins, coin_infos = return_list[0], return_list[1], return_list[2]
-
-        PAIRS = {}
-
-        for sample in status_of_coins['symbols']:
-            base = sample['baseAsset']
-            quote = sample['quoteAsset']
-            tradable = sample['status']
-
-            if tradable != "TRADING":
+        with tracing.span(self.name):
+            ticker_prices, status_of_coins, coin_infos = await asyncio.gather(
+                self.request_tickers_price(), self.request_status(), self.request_coin_info()
+            )
+            started = time.perf_counter()
+            with tracing.span("build"):
+                if self.pool is not None:
+                    snapshot = await self.pool.build(self, ticker_prices, status_of_coins, coin_infos)
+                else:
+                    snapshot = self.build_snapshot(ticker_prices, status_of_coins, coin_infos)
+            metrics.snapshot_seconds.observe(time.perf_counter() - started, self.name)
+        for name, count in snapshot.dropped.items():
+            metrics.dropped_bases.set(count, self.name, name)
+        metrics.active_bases.set(len(snapshot.active), self.name)
+        if self.sink is not None:
+            self.dump("tickers", snapshot.to_pairs())
+        return snapshot
+
+    def build_listing(self, status_of_coins, coin_infos):
+        # Трейдодоступные пары (монета, котируемая). Сама numeraire монетой не считается (USDT-USDC)
+        markets = []
+        numeraire = self.quotes[0]
+        for sample in self.extract(status_of_coins, self.status_path):
+            base, quote, ok = self.parse_status(sample)
+            if ok and quote in self.quotes and base != numeraire:
+                markets.append((BASES.intern(base), quote))
+        listing = Listing(len(BASES))
+        flags = listing.flags
+        for index, quote in markets:
+            flags[index] = TRADABLE
+
+        # Монеты с закрытыми депозитом или выводом выкидываем. Если записей на монету несколько
+        # (по записи на сеть, OKX), монета остаётся, если открыта хотя бы одна. Сети запоминаются все,
+        # закрытые тоже: по ним IdentityIndex понимает, что перевести монету нельзя
+        coin_field = self.coin_field
+        for sample in self.extract(coin_infos, self.coin_info_path):
+            index = BASES.get(sample[coin_field])
+            if index is None or index >= len(flags) or not flags[index]:
                 continue
-
-            if quote not in self.quotes:
+            open_, fields = self.parse_coin(sample)
+            listing.add_networks(index, fields.get("networks", ()))
+            if open_:
+                listing.set(index, fields)
+        listing.choose_networks()
+        listing.closed = len({index for index, quote in markets if flags[index] == TRADABLE})
+
+        # Символы тикеров считаются заранее, чтобы в цикле по тикерам был один поиск в словаре.
+        # Пары котируемых к numeraire (BTCUSDT и т.п.) задают курс, даже если сама монета в поиск не идёт
+        rates = {BASES.get(quote): quote for quote in self.quotes[1:]}
+        for index, quote in markets:
+            rate = rates.get(index) if quote == numeraire else None
+            if not flags[index] and rate is None:
                 continue
-
-            if base not in PAIRS:
-                PAIRS[base] = {}
-
-            PAIRS[base]["prices"] = {}
-            PAIRS[base]['tradable'] = True
-            PAIRS[base]['quotes'] = self.quotes
-        
-        for sample in coin_infos:
-            name = sample['name'].lower()
-            withdraw = sample['withdrawAllEnable']
-            deposit = sample['depositAllEnable']
-            trading = sample['trading']
-            base = sample['coin'] 
-
-            if base not in PAIRS:
+            symbol_base = listing.symbols[index] or BASES.names[index]
+            listing.tickers[self.symbol_format.format(base=symbol_base, quote=quote)] = \
+                (index if flags[index] else -1, quote, rate)
+        return listing
+
+    def build_snapshot(self, ticker_prices, status_of_coins, coin_infos):
+        # Список пар зависит только от метаданных, а MetadataCache до обновления отдаёт их одним и тем же объектом
+        if self.listing_source is None or self.listing_source[0] is not status_of_coins or \
+            self.listing_source[1] is not coin_infos:
+            with metrics.listing_seconds.time(self.name), tracing.span("listing"):
+                self.listing = self.build_listing(status_of_coins, coin_infos)
+            self.listing_source = (status_of_coins, coin_infos)
+        if self.snapshot is None:
+            self.snapshot = Snapshot(self.name, self.quotes)
+        snapshot = self.snapshot
+        snapshot.reset(self.listing)
+
+        tickers = self.listing.tickers
+        symbol_field, bid_field, ask_field, volume_field = self.ticker_fields
+        last_field = self.last_field
+        spread_limit = self.spread_limit
+        vol24 = self.vol24
+        numeraire = snapshot.numeraire
+        rates = snapshot.rates
+        deferred = []
+        priced = set()
+        # сколько пар отсеяно каждым фильтром, для core.metrics
+        spread_dropped = volume_dropped = 0
+        for sample in self.extract(ticker_prices, self.ticker_path):
+            parsed = tickers.get(sample[symbol_field])
+            if parsed is None:
                 continue
-
-            if deposit and withdraw and trading:
-                PAIRS[base]['deposit'] = deposit
-                PAIRS[base]['withdraw'] = withdraw
-                PAIRS[base]['name'] = name
+            index, quote, rate = parsed
+            # пустые строки и None (нет заявок) считаются нулём
+            bid = float(sample[bid_field] or 0)
+            ask = float(sample[ask_field] or 0)
+            if ask <= 0 or bid / ask <= spread_limit or \
+                (last_field is not None and float(sample[last_field] or 0) == 0):
+                if index >= 0:
+                    spread_dropped += 1
+                continue
+            if rate is not None:
+                rates[rate] = (bid, ask)
+            if index < 0:
+                continue
+            volume = float(sample[volume_field] or 0)
+            if quote == numeraire:
+                if volume > vol24:
+                    snapshot.set_quote(index, quote, bid, ask, volume)
+                    priced.add(index)
+                else:
+                    volume_dropped += 1
             else:
-                del PAIRS[base]
-
-        for sample in ticker_prices:
-            symbol = sample['symbol']
-            
-            for quote in self.quotes:
-                if symbol.endswith(quote):
-                    index = symbol.find(quote)
-                    base = symbol[:index]
-                    break
-                else: 
-                    base = False
-            if base and base in PAIRS and (float(sample['bidPrice']) / float(sample['askPrice'])) > self.spread_limit and \
-                float(sample['quoteVolume']) > self.vol24:
-                PAIRS[base]["prices"][quote] = (float(sample["bidPrice"]) + float(sample["askPrice"])) / 2
-            elif base in PAIRS:
-                del PAIRS[base]
-        
-        with open(f"tickers/tickers_{self.name}.json", "w") as f:
-            json.dump(PAIRS, f)
+                deferred.append((index, quote, bid, ask, volume))
 
+        # объём в остальных котируемых сравнивается с vol24 в numeraire, а курсы известны только после прохода
+        for index, quote, bid, ask, volume in deferred:
+            if quote in rates and volume * (rates[quote][0] + rates[quote][1]) / 2 > vol24:
+                snapshot.set_quote(index, quote, bid, ask, volume)
+                priced.add(index)
+            else:
+                volume_dropped += 1
+        snapshot.dropped = {"spread_limit": spread_dropped, "vol24": volume_dropped, "deposit_withdraw": self.listing.closed}
 
-class KucoinExchange(BaseExchange):
-    def __init__(self, name="kucoin"):
-        super().__init__(name)
-        self.quotes = ("USDT",)
+        # в поиск идут только монеты со всеми флагами: без тикера или без сведений о депозитах сравнивать не с чем
+        with tracing.span("normalize"):
+            return snapshot.finish(indexes=priced)
 
-    async def request_coin_info(self):
-        async with aiohttp.ClientSession() as session:
-            async with session.get(self.base_url+self.coin_info) as response:
-                data = await response.json()
-                with open(f"tickers/info_{self.name}.json", "w") as f:
-                    json.dump(data, f)
-        return data
 
-    async def get_tickers_price(self):
-        return_list = await asyncio.gather(self.request_tickers_price(), self.request_status(), self.request_coin_info())
-        ticker_prices, status_of_coins, coin_infos = return_list[0]['data']['ticker'], return_list[1]['data'], return_list[2]['data']
+class BinanceExchange(BaseExchange):
+    status_path = ("symbols",)
+    status_fields = ("baseAsset", "quoteAsset", "status")
+    coin_fields = ("name", "depositAllEnable", "withdrawAllEnable", "trading", "networkList")
 
-        reversed_base = {}
-        PAIRS = {}
+    def __init__(self, name="binance"):
+        super().__init__(name)
 
-        # Получаю стартовый словарь с трейдодоступными монетами
-        for sample in status_of_coins:
-            symbol = sample['name']
-            base = sample['name'].split("-")[0]
-            quote = sample['quoteCurrency']
-            tradable = sample['enableTrading']
 
-            if not tradable:
-                continue
+    async def fetch_coin_info(self, entry=None):
+        headers = {
+            "X-MBX-APIKEY": self.keys["binance"]['public']
+        }
+        timestamp = int(time.time()) * 1000 # miliseconds
+        queries = f"timestamp={timestamp}&recvWindow=10000" # query
+        signature = hmac.new(
+            self.keys['binance']['private'].encode('utf-8'),
+            msg=queries.encode('utf-8'),
+            digestmod=hashlib.sha256
+        ).hexdigest()
+        queries = queries + f"&signature={signature}"
+        entry = await self.request_conditional(f"{self.coin_info}?{queries}", entry, headers=headers, endpoint="coin_info")
+        self.dump("info", entry.data)
+        return entry
+
+    def parse_status(self, sample):
+        return sample['baseAsset'], sample['quoteAsset'], sample['status'] == "TRADING"
+
+    def parse_coin(self, sample):
+        open_ = sample['depositAllEnable'] and sample['withdrawAllEnable'] and sample['trading']
+        return open_, {
+            "name": sample['name'].lower(),
+            "networks": [
+                network(chain['network'], chain.get('contractAddress'), chain['depositEnable'], chain['withdrawEnable'],
+                        to_float(chain['withdrawFee']), to_float(chain['withdrawMin']))
+                for chain in sample['networkList']
+            ],
+        }
 
-            if quote not in self.quotes:
-                continue
 
-            if base not in PAIRS:
-                PAIRS[base] = {}
+class KucoinExchange(BaseExchange):
+    status_path = ("data",)
+    coin_info_path = ("data",)
+    ticker_path = ("data", "ticker")
+    coin_field = "name"
+    symbol_format = "{base}-{quote}"
+    ticker_fields = ("symbol", "buy", "sell", "volValue")
+    status_fields = ("name", "quoteCurrency", "enableTrading")
+    coin_fields = ("fullName", "isDepositEnabled", "isWithdrawEnabled", "withdrawalMinFee", "withdrawalMinSize", "currency",
+                   "contractAddress")
 
-            PAIRS[base]["prices"] = {}
-            PAIRS[base]['tradable'] = True
-            PAIRS[base]['quotes'] = self.quotes
+    def __init__(self, name="kucoin"):
+        super().__init__(name)
 
-        for sample in coin_infos:
-            name = sample['fullName'].lower()
-            withdraw = sample['isWithdrawEnabled']
-            deposit = sample['isDepositEnabled']
-            withdraw_fee = sample['withdrawalMinFee']
-            withdraw_min = sample['withdrawalMinSize']
-            base = sample['name'] 
+    def parse_order_book(self, data):
+        return data['data']['bids'], data['data']['asks']
 
-            if base not in PAIRS:
-                continue
+    def parse_status(self, sample):
+        # name - отображаемое имя монеты, в тикерах же код (currency), см. base_another
+        return sample['name'].split("-")[0], sample['quoteCurrency'], sample['enableTrading']
 
-            if deposit and withdraw:
-                PAIRS[base]['deposit'] = deposit
-                PAIRS[base]['withdraw'] = withdraw
-                PAIRS[base]['name'] = name
-                PAIRS[base]['withdraw_min_fee'] = withdraw_fee
-                PAIRS[base]['withdraw_min_amount'] = withdraw_min
-                base_another = sample['currency']
-                if base_another != base:
-                    reversed_base[base_another] = base
-                    PAIRS[base]['base_another'] = base_another
-                else:
-                    PAIRS[base]['base_another'] = base
-            else:
-                del PAIRS[base]
-
-        for sample in ticker_prices:
-            symbol = sample['symbol'].replace('-', '')
-            base = sample['symbol'].split('-')[0]
-            
-            for quote in self.quotes:
-                if symbol.endswith(quote):
-                    if base in reversed_base:
-                        base = reversed_base[base]
-                    break
-                else: 
-                    base = False
-            if base and base in PAIRS and (float(sample['buy']) / float(sample['sell'])) > self.spread_limit and \
-                float(sample['volValue']) > self.vol24:
-                PAIRS[base]["prices"][quote] = (float(sample['buy']) + float(sample['sell'])) / 2
-            elif base in PAIRS:
-                del PAIRS[base]
-            
-        with open(f"tickers/tickers_{self.name}.json", "w") as f:
-            json.dump(PAIRS, f)
+    def parse_coin(self, sample):
+        # v1 не называет сеть, только адрес контракта основной
+        return sample['isDepositEnabled'] and sample['isWithdrawEnabled'], {
+            "name": sample['fullName'].lower(),
+            "withdraw_min_fee": sample['withdrawalMinFee'],
+            "withdraw_min_amount": sample['withdrawalMinSize'],
+            "base_another": sample['currency'],
+            "networks": [network("", sample['contractAddress'], sample['isDepositEnabled'], sample['isWithdrawEnabled'],
+                                 to_float(sample['withdrawalMinFee']), to_float(sample['withdrawalMinSize']))],
+        }
 
 
 class CoinbaseExchange(BaseExchange):
@@ -287,440 +589,197 @@ class BithumbExchange(BaseExchange):
 
 
 class BitgetExchange(BaseExchange):
+    status_path = ("data",)
+    coin_info_path = ("data",)
+    ticker_path = ("data",)
+    coin_field = "coinName"
+    ticker_fields = ("symbol", "buyOne", "sellOne", "quoteVol")
+    last_field = "close"
+    status_fields = ("baseCoin", "quoteCoin", "status")
+    coin_fields = ("chains",)
+
     def __init__(self, name="bitget"):
         super().__init__(name)
-        self.quotes = ("USDT",)
 
-    async def request_coin_info(self):
-        async with aiohttp.ClientSession() as session:
-            async with session.get(self.base_url+self.coin_info) as response:
-                data = await response.json()
-                with open(f"tickers/info_{self.name}.json", "w") as f:
-                    json.dump(data, f)
-        return data
-    
-    async def get_tickers_price(self):
-        return_list = await asyncio.gather(self.request_tickers_price(), self.request_status(), self.request_coin_info())
-        ticker_prices, status_of_coins, coin_infos = return_list[0]['data'], return_list[1]['data'], return_list[2]['data']
+    def parse_order_book(self, data):
+        return data['data']['bids'], data['data']['asks']
 
-        PAIRS = {}
+    def parse_status(self, sample):
+        return sample['baseCoin'], sample['quoteCoin'], sample['status'] == "online"
 
-        # Получаю стартовый словарь с трейдодоступными монетами
-        for sample in status_of_coins:
-            base = sample['baseCoin']
-            quote = sample['quoteCoin']
-            tradable = sample['status']
-
-            if tradable != "online":
-                continue
-
-            if quote not in self.quotes:
-                continue
-
-            if base not in PAIRS:
-                PAIRS[base] = {}
-
-            PAIRS[base]["prices"] = {}
-            PAIRS[base]['tradable'] = True
-            PAIRS[base]['quotes'] = self.quotes
-
-        for sample in coin_infos:
-            base = sample['coinName']
-            means = {
-                "withdraw_min_fee": 0,
-                "withdraw_min_amount": 0,
-                "deposit_min_amount": 0,
-            }
-            withdraw = False
-            deposit = False
-            for chain in sample['chains']:
-                withdrawable = chain['withdrawable']
-                depositable = chain['rechargeable']
-                
-                if withdrawable == "true":
-                    withdraw = True
-                if depositable == "true":
-                    deposit = True
-                means["withdraw_min_fee"] += float(chain['withdrawFee'])
-                means["withdraw_min_amount"] += float(chain['minWithdrawAmount'])
-                means["deposit_min_amount"] += float(chain["minDepositAmount"])
-            for key in means:
-                if means[key] > 0:
-                    means[key] /= len(sample['chains'])
-
-            if base not in PAIRS:
-                continue
-
-            # подумать над базовой логикой
-            if deposit and withdraw:
-                PAIRS[base]['deposit'] = deposit
-                PAIRS[base]['withdraw'] = withdraw
-                PAIRS[base]['name'] = ""
-                PAIRS[base]['withdraw_min_fee'] = means["withdraw_min_fee"]
-                PAIRS[base]['withdraw_min_amount'] = means["withdraw_min_amount"]
-                PAIRS[base]['deposit_min_amount'] = means["deposit_min_amount"]
-                PAIRS[base]['chain'] = ""
-            else:
-                del PAIRS[base]
-
-        for sample in ticker_prices:
-            symbol = sample['symbol']
-            for quote in self.quotes:
-                if symbol.endswith(quote):
-                    index = symbol.find(quote)
-                    base = symbol[:index]
-                    break
-                else: 
-                    base = False
-            
-            if base and (base in PAIRS) and float(sample['close']) != 0 and (float(sample['buyOne']) / float(sample['sellOne'])) > self.spread_limit\
-                and float(sample["usdtVol"]) > self.vol24:
-                PAIRS[base]["prices"][quote] = (float(sample['buyOne']) + float(sample['sellOne'])) / 2
-            elif base and (base in PAIRS):
-                del PAIRS[base]
-
-        with open(f"tickers/tickers_{self.name}.json", "w") as f:
-            json.dump(PAIRS, f)
+    def parse_coin(self, sample):
+        chains = sample['chains']
+        # подумать над базовой логикой
+        open_ = any(chain['withdrawable'] == "true" for chain in chains) and \
+            any(chain['rechargeable'] == "true" for chain in chains)
+        return open_, {
+            "name": "",
+            "chain": "",
+            "networks": [
+                network(chain['chain'], "", chain['rechargeable'] == "true", chain['withdrawable'] == "true",
+                        to_float(chain['withdrawFee']), to_float(chain['minWithdrawAmount']), to_float(chain['minDepositAmount']))
+                for chain in chains
+            ],
+        }
 
 
 class OkxExchange(BaseExchange):
+    status_path = ("data",)
+    coin_info_path = ("data",)
+    ticker_path = ("data",)
+    coin_field = "ccy"
+    symbol_format = "{base}-{quote}"
+    ticker_fields = ("instId", "bidPx", "askPx", "volCcy24h")
+    status_fields = ("baseCcy", "quoteCcy", "state")
+    coin_fields = ("canDep", "canWd", "name", "minFee", "minWd", "minDep", "chain")
+
     def __init__(self, name="okx"):
         super().__init__(name)
-        self.quotes = ("USDT",)
-
-    async def request_coin_info(self):
-        async with aiohttp.ClientSession() as session:
-            method = "GET"
-            requestPath = "/api/v5/asset/currencies"
-            now = datetime.utcnow()
-            timestamp = now.isoformat()[:-3] + "Z"
-
-            prehash = timestamp + method + requestPath
-
-            sign = hmac.new(
-                self.keys['okx']['private'].encode('utf-8'),
-                msg=prehash.encode('utf-8'),
-                digestmod=hashlib.sha256
-            ).digest()
-
-            b64 = base64.b64encode(sign)
-
-            headers = {
-                "OK-ACCESS-KEY": self.keys['okx']['public'],
-                "OK-ACCESS-SIGN": b64.decode(),
-                "OK-ACCESS-TIMESTAMP": timestamp,
-                "OK-ACCESS-PASSPHRASE": self.keys['okx']['passphrase']
-            }
-            async with session.get(f"{self.base_url+self.coin_info}", headers=headers) as response:
-                data = await response.json()
-                with open(f"tickers/info_{self.name}.json", "w") as f:
-                    json.dump(data, f)
-                # print(f"{self.name} request_coin_info: {data.keys()}")
-        return data
-
-    async def get_tickers_price(self):
-        return_list = await asyncio.gather(self.request_tickers_price(), self.request_status(), self.request_coin_info())
-        ticker_prices, status_of_coins, coin_infos = return_list[0]['data'], return_list[1]['data'], return_list[2]['data']
-
-        PAIRS = {}
-
-        for sample in status_of_coins:
-            base = sample['baseCcy']
-            quote = sample['quoteCcy']
-            tradable = sample['state']
 
-            if tradable != "live":
-                continue
-
-            if quote not in self.quotes:
-                continue
-
-            if base not in PAIRS:
-                PAIRS[base] = {}
-
-            PAIRS[base]["prices"] = {}
-            PAIRS[base]['tradable'] = tradable
-            PAIRS[base]['quotes'] = self.quotes
-
-        for sample in coin_infos:
-            name = sample['name'].lower()
-            withdraw = sample['canWd']
-            deposit = sample['canDep']
-            withdraw_min_fee = sample['minFee']
-            withdraw_max_fee = sample['maxFee']
-            withdraw_min_amount = sample["minWd"]
-            withdraw_max_amount = sample["maxWd"]
-            chain = sample['chain']
-            base = sample['ccy']
-
-            if base not in PAIRS:
-                continue
-
-            # подумать над базовой логикой
-            if deposit and withdraw:
-                PAIRS[base]['deposit'] = deposit
-                PAIRS[base]['withdraw'] = withdraw
-                PAIRS[base]['name'] = name
-                PAIRS[base]['withdraw_min_fee'] = withdraw_min_fee
-                PAIRS[base]['withdraw_max_fee'] = withdraw_max_fee
-                PAIRS[base]['withdraw_min_amount'] = withdraw_min_amount
-                PAIRS[base]['withdraw_max_amount'] = withdraw_max_amount
-                PAIRS[base]['chain'] = chain
-            else:
-                del PAIRS[base]
-
-        for sample in ticker_prices:
-            symbol = sample['instId'].replace('-', '')
-            base = sample['instId'].split("-")[0]
-            flag = False
-
-            for quote in self.quotes:
-                if symbol.endswith(quote):
-                    flag = True
-                    break
-            if flag and (base in PAIRS) and (float(sample["bidPx"]) / float(sample["askPx"])) > self.spread_limit and \
-                float(sample['volCcy24h']) > self.vol24:
-                PAIRS[base]["prices"][quote] = (float(sample["bidPx"]) + float(sample["askPx"])) / 2
-            elif base in PAIRS:
-                del PAIRS[base]
-
-        with open(f"tickers/tickers_{self.name}.json", "w") as f:
-            json.dump(PAIRS, f)
+    def parse_order_book(self, data):
+        return data['data'][0]['bids'], data['data'][0]['asks']
+
+    async def fetch_coin_info(self, entry=None):
+        method = "GET"
+        requestPath = "/api/v5/asset/currencies"
+        now = datetime.utcnow()
+        timestamp = now.isoformat()[:-3] + "Z"
+
+        prehash = timestamp + method + requestPath
+
+        sign = hmac.new(
+            self.keys['okx']['private'].encode('utf-8'),
+            msg=prehash.encode('utf-8'),
+            digestmod=hashlib.sha256
+        ).digest()
+
+        b64 = base64.b64encode(sign)
+
+        headers = {
+            "OK-ACCESS-KEY": self.keys['okx']['public'],
+            "OK-ACCESS-SIGN": b64.decode(),
+            "OK-ACCESS-TIMESTAMP": timestamp,
+            "OK-ACCESS-PASSPHRASE": self.keys['okx']['passphrase']
+        }
+        entry = await self.request_conditional(self.coin_info, entry, headers=headers, endpoint="coin_info")
+        self.dump("info", entry.data)
+        return entry
+
+    def parse_status(self, sample):
+        return sample['baseCcy'], sample['quoteCcy'], sample['state'] == "live"
+
+    def parse_coin(self, sample):
+        # по записи на каждую сеть монеты, сеть - после тикера: USDT-TRC20
+        chain = sample['chain'].split("-", 1)[-1]
+        return sample['canDep'] and sample['canWd'], {
+            "name": sample['name'].lower(),
+            "chain": sample['chain'],
+            "networks": [network(chain, "", sample['canDep'], sample['canWd'],
+                                 to_float(sample['minFee']), to_float(sample['minWd']), to_float(sample['minDep']))],
+        }
 
 
 class BybitExchange(BaseExchange):
+    status_path = ("result", "list")
+    coin_info_path = ("result", "rows")
+    ticker_path = ("result", "list")
+    ticker_fields = ("s", "bp", "ap", "qv")
+    last_field = "lp"
+    status_fields = ("baseCoin", "quoteCoin", "showStatus")
+    coin_fields = ("chains",)
+
     def __init__(self, name="bybit"):
         super().__init__(name)
-        self.quotes = ("USDT",)
 
-    async def request_coin_info(self):
-        async with aiohttp.ClientSession() as session:
-            timestamp=str(int(time.time() * 10 ** 3))
-            recvWindow = "10000"
-            prehash = timestamp + self.keys['bybit']['public'] + recvWindow
-
-            sign = hmac.new(
-                self.keys['bybit']['private'].encode('utf-8'),
-                msg=prehash.encode('utf-8'),
-                digestmod=hashlib.sha256
-            ).hexdigest()
-
-            headers = {
-                "X-BAPI-API-KEY": self.keys['bybit']['public'],
-                "X-BAPI-SIGN": sign,
-                "X-BAPI-SIGN-TYPE": "2",
-                "X-BAPI-TIMESTAMP": timestamp,
-                "X-BAPI-RECV-WINDOW": recvWindow
-            }
-            async with session.get(f"{self.base_url+self.coin_info}", headers=headers) as response:
-                # data = await response.json()
-                # print(f"{self.name} request_coin_info: {data.keys()}")
-                return await response.json()
-
-    async def get_tickers_price(self):
-        return_list = await asyncio.gather(self.request_tickers_price(), self.request_status(), self.request_coin_info())
-        ticker_prices, status_of_coins, coin_infos = return_list[0]['result']['list'], return_list[1]['result']['list'], return_list[2]['result']['rows']
-        try:
-            coin_infos = return_list[2]['result']['rows']
-        except Exception as e:
-            print(coin_infos)
-            raise e
-
-        PAIRS = {}
-
-        # Получаю стартовый словарь с трейдодоступными монетами
-        for sample in status_of_coins:
-            base = sample['baseCoin']
-            quote = sample['quoteCoin']
-            tradable = sample['showStatus']
-
-            if tradable != "1":
-                continue
-
-            if quote not in self.quotes:
-                continue
-
-            if base not in PAIRS:
-                PAIRS[base] = {}
-
-            PAIRS[base]["prices"] = {}
-            PAIRS[base]['tradable'] = True
-            PAIRS[base]['quotes'] = self.quotes
-
-        for sample in coin_infos:
-            base = sample['coin']
-            means = {
-                "withdraw_min_fee": 0,
-                "withdraw_min_amount": 0,
-                "deposit_min_amount": 0,
-            }
-            withdraw = False
-            deposit = False
-            for chain in sample['chains']:
-                withdrawable = chain['chainWithdraw']
-                depositable = chain['chainDeposit']
-                if withdrawable == "1":
-                    withdraw = True
-                if depositable == "1":
-                    deposit = True
-                withdraw_min_fee = 0. if not chain['withdrawFee'] else float(chain['withdrawFee'])
-                withdraw_min_amount = 0. if not chain['withdrawMin'] else float(chain['withdrawMin'])
-                deposit_min_amount = 0. if not chain['depositMin'] else float(chain['depositMin'])
-                means["withdraw_min_fee"] += withdraw_min_fee
-                means["withdraw_min_amount"] += withdraw_min_amount
-                means["deposit_min_amount"] += deposit_min_amount
-            for key in means:
-                if means[key] > 0:
-                    means[key] /= len(sample['chains'])
-
-            if base not in PAIRS:
-                continue
-
-            if deposit and withdraw:
-                PAIRS[base]['deposit'] = deposit
-                PAIRS[base]['withdraw'] = withdraw
-                PAIRS[base]['name'] = ""
-                PAIRS[base]['withdraw_min_fee'] = means["withdraw_min_fee"]
-                PAIRS[base]['withdraw_min_amount'] = means["withdraw_min_amount"]
-                PAIRS[base]['deposit_min_amount'] = means["deposit_min_amount"]
-                PAIRS[base]['chain'] = ""
-            else:
-                del PAIRS[base]
-
-        for sample in ticker_prices:
-            symbol = sample['s']
-            for quote in self.quotes:
-                if symbol.endswith(quote):
-                    index = symbol.find(quote)
-                    base = symbol[:index]
-                    break
-                else: 
-                    base = False
-            
-            if base and (base in PAIRS) and float(sample['lp']) != 0 and (float(sample['bp']) / float(sample['ap'])) > self.spread_limit and \
-                float(sample['qv']) > self.vol24:
-                PAIRS[base]["prices"][quote] = sample["lp"]
-            elif base and (base in PAIRS):
-                del PAIRS[base]
-            else:
-                pass
-                # print(base, quote, sample['lp'], float(sample['lp']), float(sample['lp']) != 0)
-
-        print(f"Length of exchange {self.name}: {len(PAIRS)}")
-        with open(f"tickers/tickers_{self.name}.json", "w") as f:
-            json.dump(PAIRS, f)
+    def parse_order_book(self, data):
+        return data['result']['bids'], data['result']['asks']
+
+    async def fetch_coin_info(self, entry=None):
+        timestamp=str(int(time.time() * 10 ** 3))
+        recvWindow = "10000"
+        prehash = timestamp + self.keys['bybit']['public'] + recvWindow
+
+        sign = hmac.new(
+            self.keys['bybit']['private'].encode('utf-8'),
+            msg=prehash.encode('utf-8'),
+            digestmod=hashlib.sha256
+        ).hexdigest()
+
+        headers = {
+            "X-BAPI-API-KEY": self.keys['bybit']['public'],
+            "X-BAPI-SIGN": sign,
+            "X-BAPI-SIGN-TYPE": "2",
+            "X-BAPI-TIMESTAMP": timestamp,
+            "X-BAPI-RECV-WINDOW": recvWindow
+        }
+        entry = await self.request_conditional(self.coin_info, entry, headers=headers, endpoint="coin_info")
+        self.dump("info", entry.data)
+        return entry
+
+    def parse_status(self, sample):
+        return sample['baseCoin'], sample['quoteCoin'], sample['showStatus'] == "1"
+
+    def parse_coin(self, sample):
+        chains = sample['chains']
+        open_ = any(chain['chainWithdraw'] == "1" for chain in chains) and \
+            any(chain['chainDeposit'] == "1" for chain in chains)
+        return open_, {
+            "name": "",
+            "chain": "",
+            "networks": [
+                network(chain.get('chain', ""), "", chain['chainDeposit'] == "1", chain['chainWithdraw'] == "1",
+                        to_float(chain['withdrawFee']), to_float(chain['withdrawMin']), to_float(chain['depositMin']))
+                for chain in chains
+            ],
+        }
 
 
 class GateExchange(BaseExchange):
+    coin_field = "currency"
+    symbol_format = "{base}_{quote}"
+    ticker_fields = ("currency_pair", "highest_bid", "lowest_ask", "quote_volume")
+    last_field = "last"
+    status_fields = ("base", "quote", "trade_status")
+    coin_fields = ("delisted", "withdraw_disabled", "withdraw_delayed", "deposit_disabled", "trade_disabled", "chain")
+
     def __init__(self, name="gate"):
         super().__init__(name=name)
-        self.quotes = ("USDT",)
-    
-    async def request_coin_info(self):
-        async with aiohttp.ClientSession() as session:
-            async with session.get(self.base_url+self.coin_info) as response:
-                data = await response.json()
-                with open(f"tickers/info_{self.name}.json", "w") as f:
-                    json.dump(data, f)
-        return data
 
-    async def get_tickers_price(self):
-        return_list = await asyncio.gather(self.request_tickers_price(), self.request_status(), self.request_coin_info())
-        ticker_prices, status_of_coins, coin_infos = return_list[0], return_list[1], return_list[2]
+    def parse_status(self, sample):
+        return sample['base'], sample['quote'], sample['trade_status'] == "tradable"
 
-        PAIRS = {}
+    def parse_coin(self, sample):
+        open_ = not (sample['delisted'] or sample['withdraw_disabled'] or sample['withdraw_delayed'] or
+                     sample['deposit_disabled'] or sample['trade_disabled'])
+        # одна сеть на монету, комиссий в ответе нет - комиссия неизвестна, а не нулевая
+        return open_, {
+            "name": "",
+            "chain": sample.get('chain', ""),
+            "networks": [network(sample.get('chain', ""), "", not sample['deposit_disabled'],
+                                 not (sample['withdraw_disabled'] or sample['withdraw_delayed']), UNKNOWN_FEE)],
+        }
 
-        # Получаю стартовый словарь с трейдодоступными монетами
-        for sample in status_of_coins:
-            base = sample['base']
-            quote = sample['quote']
-            tradable = sample['trade_status']
 
-            if tradable != "tradable":
-                continue
+EXCHANGES = {
+    "binance": BinanceExchange,
+    "kucoin": KucoinExchange,
+    "bitget": BitgetExchange,
+    "okx": OkxExchange,
+    "bybit": BybitExchange,
+    "gate": GateExchange,
+}
 
-            if quote not in self.quotes:
-                continue
 
-            if base not in PAIRS:
-                PAIRS[base] = {}
+# valid exchanges are binance, okx, bitget, kucoin and gate
+ENABLED = ["binance", "okx", "kucoin", "gate"] # bybit, bitget
 
-            PAIRS[base]["prices"] = {}
-            PAIRS[base]['tradable'] = True
-            PAIRS[base]['quotes'] = self.quotes
-        
-        for sample in coin_infos:
-            base = sample['currency']
-            delisted = sample["delisted"],
-            withdraw = sample["withdraw_disabled"],
-            withdraw_delayed = sample["withdraw_delayed"],
-            deposit = sample["deposit_disabled"],
-            trade_disabled = sample["trade_disabled"]
-            chain = sample["chain"] if "chain" in sample else ""
-            
-            if base not in PAIRS:
-                continue
-
-            if isinstance(delisted, tuple):
-                delisted = delisted[0]
-            
-            if isinstance(withdraw, tuple):
-                withdraw = withdraw[0]
-            
-            if isinstance(withdraw_delayed, tuple):
-                withdraw_delayed = withdraw_delayed[0]
-            
-            if isinstance(deposit, tuple):
-                deposit = deposit[0]
-
-            deposit = not deposit
-            withdraw = not withdraw
-            delisted = not delisted
-            withdraw_delayed = not withdraw_delayed
-            trade_disabled = not trade_disabled
-
-            if deposit and withdraw and delisted and trade_disabled and withdraw_delayed:
-                PAIRS[base]['deposit'] = deposit
-                PAIRS[base]['withdraw'] = withdraw
-                PAIRS[base]['withdraw_delayed'] = withdraw_delayed
-                PAIRS[base]['name'] = ""
-                PAIRS[base]['chain'] = chain
-            else:
-                del PAIRS[base]
 
-        for sample in ticker_prices:
-            base = sample['currency_pair'].split("_")[0]
-            quote = sample['currency_pair'].split("_")[1]
-            if base not in PAIRS:
-                continue
+def load_exchanges(names=ENABLED):
+    return [EXCHANGES[name]() for name in names]
 
-            if quote not in self.quotes:
-                continue
 
-            if float(sample["last"]) > 0 and \
-                (float(sample["highest_bid"]) / float(sample["lowest_ask"])) > self.spread_limit and\
-                float(sample["quote_volume"]) > self.vol24:
-                PAIRS[base]["prices"][quote] = (float(sample["highest_bid"]) + float(sample["lowest_ask"])) / 2
-            elif base in PAIRS:
-                del PAIRS[base]
-            else:
-                pass
-                # print("BAD SAMPLE")
-                # print(sample)
-
-        with open(f"tickers/tickers_{self.name}.json", "w") as f:
-            json.dump(PAIRS, f)
-
-
-def import_classes():
-    # valid exchanges are binance, okx, bitget, kucoin and gate
-    exchanges = [
-        BinanceExchange().get_tickers_price(),
-        # BybitExchange().get_tickers_price(),
-        # BitgetExchange().get_tickers_price(),
-        OkxExchange().get_tickers_price(),
-        KucoinExchange().get_tickers_price(),
-        GateExchange().get_tickers_price(),
-    ]
-
-    return exchanges
\ No newline at end of file
+def import_classes(instances=None):
+    # -> корутины get_tickers_price() включённых бирж, их собирает asyncio.gather
+    if instances is None:
+        instances = load_exchanges()
+    return [exchange.get_tickers_price() for exchange in instances]
@@ -0,0 +1,226 @@
+import os
+import re
+import json
+from collections import namedtuple
+
+
+# Одна сеть монеты на бирже, из coin_info:
+#   network - сеть, приведённая к общему имени (network_key), contract - адрес контракта в нижнем регистре или ""
+#   deposit/withdraw - открыты ли депозит и вывод в этой сети, name - имя сети как у биржи
+Network = namedtuple("Network", "network contract deposit withdraw withdraw_fee withdraw_min deposit_min name")
+
+# Биржи называют одну сеть по-разному (BSC, BEP20, "BNB Smart Chain (BEP20)"). Ключи - имя без регистра,
+# пробелов и знаков; чего нет в таблице, сравнивается как есть
+NETWORK_ALIASES = {
+    "ERC20": "ETH", "ETHEREUM": "ETH",
+    "BEP20": "BSC", "BNBSMARTCHAIN": "BSC", "BNBSMARTCHAINBEP20": "BSC",
+    "BEP2": "BNB", "BNBBEACONCHAIN": "BNB",
+    "TRC20": "TRX", "TRON": "TRX",
+    "SOLANA": "SOL", "SPL": "SOL",
+    "POLYGON": "MATIC",
+    "AVALANCHECCHAIN": "AVAXC", "AVAXC": "AVAXC", "CCHAIN": "AVAXC",
+    "ARBITRUMONE": "ARBITRUM", "ARB": "ARBITRUM", "ARBEVM": "ARBITRUM",
+    "ARBITRUMNOVA": "ARBNOVA",
+    "OPETH": "OPTIMISM", "OP": "OPTIMISM",
+    "CHILIZ": "CHZ", "CHILIZCHAIN": "CHZ",
+    "TERRACLASSIC": "LUNC",
+    "KLAYTN": "KLAY",
+    "FANTOM": "FTM",
+    "N3": "NEO3",
+    "ONTOLOGY": "ONT",
+    "STELLARLUMENS": "XLM", "STELLAR": "XLM",
+    "RIPPLE": "XRP",
+    "ZILLIQA": "ZIL",
+    "BITCOIN": "BTC",
+    "LITECOIN": "LTC",
+    "BITCOINCASH": "BCH",
+    "ETHEREUMCLASSIC": "ETC",
+    "CARDANO": "ADA",
+    "ALGORAND": "ALGO",
+    "APTOS": "APT",
+    "ELROND": "EGLD", "MULTIVERSX": "EGLD",
+    "THETATOKEN": "THETA",
+    "CRONOS": "CRO", "CRONOSCHAIN": "CRO",
+    "OKT": "OKC",
+    "HT": "HECO",
+    "RONIN": "RON",
+    "MOONBEAM": "GLMR",
+    "IOTEX": "IOTX",
+    "COREDAO": "CORE",
+    "ACALA": "ACA",
+    "ARWEAVE": "AR",
+    "ASTAR": "ASTR",
+    "COSMOS": "ATOM",
+    "AVALANCHEXCHAIN": "AVAX", "XCHAIN": "AVAX",
+}
+
+# Платформы токенов: у них имя сети общее для всех бирж, и токен в ETH и тот же тикер только в BSC -
+# перевести нельзя. Родные сети монет биржи зовут кто как хочет (DOGE и "Dogecoin"), их несовпадение ни о чём не говорит
+PLATFORMS = frozenset((
+    "ETH", "BSC", "BNB", "TRX", "SOL", "MATIC", "ARBITRUM", "ARBNOVA", "OPTIMISM", "AVAXC", "FTM",
+    "OKC", "HECO", "KLAY", "CRO", "TON", "NEO3", "ONT", "XLM", "ALGO",
+))
+
+
+# Комиссия вывода, которую биржа не сообщает (Gate): nan, а не 0, чтобы такой вывод не считался бесплатным
+UNKNOWN_FEE = float("nan")
+
+
+def fee_known(fee):
+    return fee == fee
+
+
+def fee_order(network):
+    # для выбора самой дешёвой сети: неизвестная комиссия - после любой известной
+    return network.withdraw_fee if fee_known(network.withdraw_fee) else float("inf")
+
+
+def network_key(name):
+    key = re.sub(r"[^A-Z0-9]", "", (name or "").upper())
+    return NETWORK_ALIASES.get(key, key)
+
+
+def network(name, contract, deposit, withdraw, withdraw_fee=0., withdraw_min=0., deposit_min=0.):
+    return Network(network_key(name), (contract or "").lower(), bool(deposit), bool(withdraw),
+                   withdraw_fee, withdraw_min, deposit_min, name or "")
+
+
+def same_asset(network_A, network_B):
+    # -> True/False, если сети можно сравнить, иначе None. Адрес контракта надёжнее имени сети
+    if network_A.contract and network_B.contract:
+        if network_A.network and network_B.network and network_A.network != network_B.network:
+            return False
+        return network_A.contract == network_B.contract
+    if network_A.network and network_A.network == network_B.network:
+        return True
+    if network_A.network in PLATFORMS and network_B.network in PLATFORMS:
+        return False
+    return None
+
+
+def route(networks_A, networks_B):
+    # Как перевести монету с биржи A на биржу B:
+    #   (сеть вывода на A, сеть депозита на B) с самой дешёвой комиссией вывода - перевод возможен
+    #   False - все сети сравнимы, но общей открытой нет (или это разные токены под одним тикером)
+    #   None - хотя бы одну пару сетей сравнить не по чему (родная сеть под разными именами, биржа не отдаёт
+    #          сетей или адресов), судим только по тикеру
+    best = None
+    unknown = False
+    for network_A in networks_A:
+        for network_B in networks_B:
+            same = same_asset(network_A, network_B)
+            if same is None:
+                unknown = True
+            elif same and network_A.withdraw and network_B.deposit:
+                if best is None or fee_order(network_A) < fee_order(best[0]):
+                    best = (network_A, network_B)
+    if best is not None:
+        return best
+    return None if unknown else False
+
+
+class BadBases:
+    # Ручной список misc/bad_bases.json: монеты, которые по сетям не отличить (KuCoin и Gate не отдают
+    # контрактов), а по факту это разные активы. Компилируется в множество ключей (база, биржа A, биржа B)
+    # в обе стороны. reload() дешёвый: файл перечитывается только если поменялось его mtime
+    def __init__(self, path="misc/bad_bases.json"):
+        self.path = path
+        self.mtime = None
+        self.keys = frozenset()
+        self.bases = frozenset()
+        self.reload()
+
+    def reload(self):
+        mtime = os.path.getmtime(self.path)
+        if mtime == self.mtime:
+            return self
+        with open(self.path, "r") as f:
+            bad_bases = json.load(f)
+        keys = set()
+        for base, pairs in bad_bases.items():
+            for pair in pairs:
+                for exchange_A in pair:
+                    for exchange_B in pair:
+                        if exchange_A != exchange_B:
+                            keys.add((base, exchange_A, exchange_B))
+        self.keys = frozenset(keys)
+        self.bases = frozenset(base for base, _, _ in keys)
+        self.mtime = mtime
+        return self
+
+    def is_bad(self, base, exchange_A, exchange_B):
+        return (base, exchange_A, exchange_B) in self.keys
+
+
+class IdentityIndex:
+    # Какие монеты с одним тикером на разных биржах - один и тот же актив и куда их можно перевести.
+    # Собирается из сетей в списках пар снапшотов (Listing.networks, из coin_info) и пересчитывается только
+    # для бирж, у которых сменился список пар, и только для монет, у которых поменялись сети.
+    # Сетей хватает не везде, поэтому к найденным по ним запретам добавляется ручной список bad_bases (BadBases).
+    # Для сканера - тот же интерфейс, что у BadBases: keys - запрещённые (base, биржа A, биржа B)
+    # с проверкой за O(1); для ProfitEngine - route() с сетями перевода
+    def __init__(self, bad_bases=None):
+        self.listings = {}
+        self.networks = {}
+        self.routes = {}
+        self.keys = frozenset()
+        self.blocked = set()
+        self.bases = frozenset()
+        self.bad_bases = bad_bases
+        self.excluded = frozenset()
+        self.merge()
+
+    def update(self, snapshots):
+        changed = set()
+        for snapshot in snapshots:
+            if self.listings.get(snapshot.name) is snapshot.listing:
+                continue
+            self.listings[snapshot.name] = snapshot.listing
+            networks = snapshot.listing.networks_by_base()
+            previous = self.networks.get(snapshot.name, {})
+            self.networks[snapshot.name] = networks
+            for base in networks.keys() | previous.keys():
+                if networks.get(base) != previous.get(base):
+                    changed.add(base)
+        if changed:
+            self.recompute(changed)
+        # правки misc/bad_bases.json подхватываются без перезапуска
+        if self.bad_bases is not None and self.bad_bases.reload().keys is not self.excluded:
+            self.merge()
+        return self
+
+    def recompute(self, bases):
+        names = list(self.networks)
+        for base in bases:
+            for exchange_A in names:
+                for exchange_B in names:
+                    if exchange_A == exchange_B:
+                        continue
+                    key = (base, exchange_A, exchange_B)
+                    self.routes.pop(key, None)
+                    self.blocked.discard(key)
+                    networks_A = self.networks[exchange_A].get(base)
+                    networks_B = self.networks[exchange_B].get(base)
+                    if not networks_A or not networks_B:
+                        continue
+                    found = route(networks_A, networks_B)
+                    if found:
+                        self.routes[key] = found
+                    elif found is False:
+                        self.blocked.add(key)
+        self.merge()
+
+    def merge(self):
+        self.excluded = self.bad_bases.keys if self.bad_bases is not None else frozenset()
+        self.keys = frozenset(self.blocked) | self.excluded
+        self.bases = frozenset(base for base, _, _ in self.keys)
+
+    def is_bad(self, base, exchange_A, exchange_B):
+        return (base, exchange_A, exchange_B) in self.keys
+
+    def route(self, base, exchange_A, exchange_B):
+        # -> (сеть вывода на A, сеть депозита на B) или None, если сети неизвестны или монета в ручном списке
+        key = (base, exchange_A, exchange_B)
+        if key in self.excluded:
+            return None
+        return self.routes.get(key)
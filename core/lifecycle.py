@@ -0,0 +1,165 @@
+import time
+import heapq
+from collections import deque
+from core import metrics
+
+
+# Сколько живут возможности. Ключ - (база, биржа покупки, биржа продажи), отношение - ask покупки / bid продажи,
+# пик - самое низкое (лучшее) отношение за жизнь. Время - time.monotonic
+
+
+class Event:
+    def __init__(self, kind, key, tracked, now):
+        # kind - open, update (новый пик) или close
+        self.kind = kind
+        self.base, self.exchange_A, self.exchange_B = key
+        self.ratio = tracked.ratio
+        self.peak = tracked.peak
+        self.opened_at = tracked.opened_at
+        # от открытия до последнего раза, когда возможность видели
+        self.duration = tracked.last_seen - tracked.opened_at
+        self.at = now
+
+    def __repr__(self):
+        return f"Event({self.kind} {self.base} {self.exchange_A}/{self.exchange_B} " \
+               f"{self.ratio:.4f} peak={self.peak:.4f} {round(self.duration, 1)}s)"
+
+
+class Tracked:
+    __slots__ = ("opened_at", "last_seen", "ratio", "peak", "expires", "announced")
+
+    def __init__(self, ratio, now):
+        self.opened_at = now
+        self.last_seen = now
+        self.ratio = ratio
+        self.peak = ratio
+        self.expires = None
+        self.announced = False
+
+
+class OpportunityTracker:
+    # Открытые возможности в словаре по ключу, сроки - в куче (срок, ключ) с ленивым удалением:
+    # каждое появление кладёт новую запись, устаревшие отбрасываются, когда до них доходит очередь.
+    # Поэтому и появление, и закрытие - O(log n), на тысячах одновременных ключей цикл не растёт.
+    # ttl - сколько секунд после последнего появления ключ ещё открыт; в режиме опроса это шаг сканера:
+    # возможность закрывается на первом поиске, который её не нашёл. ttl=None - закрывать только явно (stream).
+    # Длительности закрытых хранятся по парам бирж (последние history) и уходят в core.metrics
+    def __init__(self, ttl=None, history=1000):
+        self.ttl = ttl
+        self.history = history
+        self.open = {}
+        self.by_base = {}
+        self.deadlines = []
+        self.durations = {}
+        self.closed = {}
+
+    def see(self, base, exchange_A, exchange_B, ratio, now=None):
+        # -> Event open/update или None
+        now = time.monotonic() if now is None else now
+        key = (base, exchange_A, exchange_B)
+        tracked = self.open.get(key)
+        event = None
+        if tracked is None:
+            tracked = self.open[key] = Tracked(ratio, now)
+            self.by_base.setdefault(base, set()).add(key)
+            event = Event("open", key, tracked, now)
+        else:
+            tracked.last_seen = now
+            tracked.ratio = ratio
+            if ratio < tracked.peak:
+                tracked.peak = ratio
+                event = Event("update", key, tracked, now)
+        if self.ttl is not None:
+            tracked.expires = now + self.ttl
+            heapq.heappush(self.deadlines, (tracked.expires, key))
+        return event
+
+    def close(self, key, now=None):
+        tracked = self.open.pop(key, None)
+        if tracked is None:
+            return None
+        now = time.monotonic() if now is None else now
+        keys = self.by_base[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self.by_base[key[0]]
+        event = Event("close", key, tracked, now)
+        pair = key[1:]
+        if pair not in self.durations:
+            self.durations[pair] = deque(maxlen=self.history)
+        self.durations[pair].append(event.duration)
+        self.closed[pair] = self.closed.get(pair, 0) + 1
+        metrics.opportunity_seconds.observe(event.duration, *pair)
+        return event
+
+    def expire(self, now=None):
+        now = time.monotonic() if now is None else now
+        events = []
+        deadlines = self.deadlines
+        while deadlines and deadlines[0][0] <= now:
+            expires, key = heapq.heappop(deadlines)
+            tracked = self.open.get(key)
+            # запись от прошлого появления: ключ с тех пор видели снова или уже закрыли
+            if tracked is None or tracked.expires != expires:
+                continue
+            events.append(self.close(key, now))
+        return events
+
+    def observe(self, hits, now=None):
+        # Режим опроса: hits из core.scanner.scan, [(биржа покупки, биржа продажи, база, отношение), ...]
+        now = time.monotonic() if now is None else now
+        events = []
+        for exchange_A, exchange_B, base, ratio in hits:
+            event = self.see(base, exchange_A, exchange_B, ratio, now)
+            if event is not None:
+                events.append(event)
+        events.extend(self.expire(now))
+        metrics.open_opportunities.set(len(self.open))
+        return events
+
+    def settle(self, base, best, now=None):
+        # Режим stream: у базы открыта одна пара (IncrementalScanner.signals[base]) или ни одной (best=None).
+        # Остальные открытые пары этой базы закрываются
+        now = time.monotonic() if now is None else now
+        events = []
+        keep = (base,) + tuple(best[:2]) if best is not None else None
+        for key in list(self.by_base.get(base, ())):
+            if key != keep:
+                events.append(self.close(key, now))
+        if best is not None:
+            event = self.see(base, best[0], best[1], best[2], now)
+            if event is not None:
+                events.append(event)
+        metrics.open_opportunities.set(len(self.open))
+        return events
+
+    def announce(self, key):
+        # True только в первый раз за жизнь возможности: о ней сообщаем один раз, а не каждый цикл
+        tracked = self.open.get(key)
+        if tracked is None:
+            return True
+        if tracked.announced:
+            return False
+        tracked.announced = True
+        return True
+
+    def stats(self):
+        # -> {(биржа покупки, биржа продажи): {count, mean, p50, p90, max}} по последним history закрытиям
+        result = {}
+        for pair, durations in self.durations.items():
+            ordered = sorted(durations)
+            result[pair] = {
+                "count": self.closed[pair],
+                "mean": sum(ordered) / len(ordered),
+                "p50": ordered[len(ordered) // 2],
+                "p90": ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))],
+                "max": ordered[-1],
+            }
+        return result
+
+    def report(self):
+        lines = [f"Open opportunities: {len(self.open)}"]
+        for (exchange_A, exchange_B), stat in sorted(self.stats().items()):
+            lines.append(f"{exchange_A} -> {exchange_B}: {stat['count']} closed, p50 {round(stat['p50'], 1)}s, "
+                         f"p90 {round(stat['p90'], 1)}s, max {round(stat['max'], 1)}s")
+        return "\n".join(lines)
@@ -0,0 +1,160 @@
+import time
+from bisect import bisect_left
+from aiohttp import web
+
+
+# Метрики конвейера в текстовом формате Prometheus (GET /metrics на локальном порту, main.py --metrics).
+# Запись - одна операция со словарём по меткам (и bisect для гистограмм), текст собирается только при запросе,
+# поэтому пока метрики никто не читает, цикл ничего не теряет. Метрики - глобальные, как BASES
+REGISTRY = []
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BYTES_BUCKETS = (1e3, 1e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6, 1e7)
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def label_text(names, values, extra=""):
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        # значения метки -> значение
+        self.values = {}
+        REGISTRY.append(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{label_text(self.labels, labels)} {number(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, value=1):
+        self.values[labels] = self.values.get(labels, 0) + value
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, *labels):
+        self.values[labels] = value
+
+
+class Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        # значение метки -> [число попаданий в каждый интервал ..., в +Inf, сумма]
+        child = self.values.get(labels)
+        if child is None:
+            child = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.]
+        child[bisect_left(self.buckets, value)] += 1
+        child[-1] += value
+
+    def time(self, *labels):
+        return Timer(self, labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labels, child in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child):
+                cumulative += count
+                le = 'le="' + number(bound) + '"'
+                lines.append(f"{self.name}_bucket{label_text(self.labels, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{label_text(self.labels, labels)} {number(child[-1])}")
+            lines.append(f"{self.name}_count{label_text(self.labels, labels)} {cumulative}")
+        return lines
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Опрос бирж
+http_seconds = Histogram("arbitrage_http_request_seconds", "HTTP request latency", ("exchange", "endpoint"))
+http_bytes = Histogram("arbitrage_http_response_bytes", "HTTP response body size", ("exchange", "endpoint"), BYTES_BUCKETS)
+http_errors = Counter("arbitrage_http_errors_total", "Failed HTTP requests", ("exchange", "endpoint"))
+decode_seconds = Histogram("arbitrage_decode_seconds", "JSON decode time in the event loop", ("exchange", "endpoint"))
+# С --pool разбор тикеров и список пар считаются в процессах разбора и входят в snapshot_seconds
+snapshot_seconds = Histogram("arbitrage_snapshot_build_seconds", "Snapshot build time, listing included", ("exchange",))
+listing_seconds = Histogram("arbitrage_listing_build_seconds", "Listing build time on new metadata", ("exchange",))
+dropped_bases = Gauge("arbitrage_dropped_bases", "Pairs dropped by each filter in the last snapshot, bases for deposit_withdraw", ("exchange", "filter"))
+active_bases = Gauge("arbitrage_active_bases", "Bases taking part in the scan", ("exchange",))
+
+# Поиск и сигналы
+scan_seconds = Histogram("arbitrage_scan_seconds", "Scan time per cycle", ("mode",))
+scan_hits = Counter("arbitrage_scan_hits_total", "Pairs below the limit before profit and depth checks", ("mode",))
+signals = Counter("arbitrage_signals_total", "Signals by result: queued, suppressed by cooldown, dropped after retries", ("result",))
+telegram_seconds = Histogram("arbitrage_telegram_send_seconds", "Telegram send_message latency", ("result",))
+
+# Жизнь возможностей (core.lifecycle)
+DURATION_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600, 14400)
+opportunity_seconds = Histogram("arbitrage_opportunity_seconds", "How long opportunities stayed open", ("buy", "sell"), DURATION_BUCKETS)
+open_opportunities = Gauge("arbitrage_open_opportunities", "Opportunities open right now")
+
+
+class MetricsServer:
+    # GET /metrics. Слушает только localhost, если не указано иное
+    def __init__(self, port=9108, host="127.0.0.1"):
+        self.port = port
+        self.host = host
+        self.runner = None
+
+    async def handle(self, request):
+        return web.Response(body=render().encode(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        print(f"Metrics on http://{self.host}:{self.port}/metrics")
+        return self
+
+    async def close(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
@@ -0,0 +1,105 @@
+from core.identity import fee_known
+
+
+class Opportunity:
+    def __init__(self, base, buy, sell, buy_price, sell_price, notional, net_profit, break_even, min_notional,
+                 buy_quote="USDT", sell_quote="USDT", fee_known=True):
+        self.base = base
+        self.buy = buy
+        self.sell = sell
+        # за какую котируемую покупать и за какую продавать; цены уже пересчитаны в numeraire
+        self.buy_quote = buy_quote
+        self.sell_quote = sell_quote
+        self.buy_price = buy_price
+        self.sell_price = sell_price
+        self.notional = notional
+        self.net_profit = net_profit
+        self.net_edge = net_profit / notional
+        self.break_even = break_even
+        self.min_notional = min_notional
+        # False - биржа покупки не сообщает комиссию вывода: net_profit посчитан без неё, break_even неизвестен (nan)
+        self.fee_known = fee_known
+        # заполняются core.depth.DepthChecker по стаканам
+        self.executable_spread = None
+        self.max_notional = None
+
+    @property
+    def executable(self):
+        return self.net_profit > 0 and self.notional >= self.min_notional
+
+    def __repr__(self):
+        return f"Opportunity({self.base} {self.buy}/{self.buy_quote}->{self.sell}/{self.sell_quote} edge={self.net_edge:.4f} net={self.net_profit:.2f}{'' if self.fee_known else ' fee?'})"
+
+
+class ProfitEngine:
+    # Чистая прибыль сделки на notional в numeraire:
+    # покупка по taker (лучший ask) на бирже A, вывод монеты (комиссия и минимум вывода A, минимум депозита B),
+    # продажа по taker (лучший bid) на бирже B. Считается только для баз, которые уже прошли фильтр по limit.
+    # Если покупка или продажа идёт через другую котируемую, её обмен на numeraire - ещё одна taker сделка.
+    # Внутри одной биржи вывода нет. Если известна сеть перевода (core.identity), комиссия и минимумы - её,
+    # иначе самой дешёвой сети монеты на бирже A. Неизвестная комиссия вывода (Gate) бесплатной не считается:
+    # прибыль без неё - только верхняя оценка, такие возможности помечаются и идут после посчитанных полностью
+    default_fee = 0.001
+
+    def __init__(self, notional, fees=None, identity=None):
+        self.notional = notional
+        self.fees = fees or {}
+        self.identity = identity
+
+    def evaluate(self, base, snapshot_buy, snapshot_sell):
+        index_buy = snapshot_buy.index(base)
+        index_sell = snapshot_sell.index(base)
+        buy_price = snapshot_buy.best(base)[1]
+        sell_price = snapshot_sell.best(base)[0]
+        sell_quote = snapshot_sell.best_quotes(base)[0]
+        buy_quote = snapshot_buy.best_quotes(base)[1]
+        fee_buy = self.fees.get(snapshot_buy.name, self.default_fee)
+        fee_sell = self.fees.get(snapshot_sell.name, self.default_fee)
+        if buy_quote != snapshot_buy.numeraire:
+            fee_buy = 1 - (1 - fee_buy) ** 2
+        if sell_quote != snapshot_sell.numeraire:
+            fee_sell = 1 - (1 - fee_sell) ** 2
+        route = self.identity.route(base, snapshot_buy.name, snapshot_sell.name) if self.identity is not None else None
+        if snapshot_buy is snapshot_sell:
+            withdraw_fee = withdraw_min = deposit_min = 0.
+        elif route is not None:
+            network_buy, network_sell = route
+            withdraw_fee = network_buy.withdraw_fee
+            withdraw_min = network_buy.withdraw_min
+            deposit_min = network_sell.deposit_min
+        else:
+            withdraw_fee = snapshot_buy.withdraw_fee[index_buy]
+            withdraw_min = snapshot_buy.withdraw_min[index_buy]
+            deposit_min = snapshot_sell.deposit_min[index_sell]
+        known = fee_known(withdraw_fee)
+        if not known:
+            withdraw_fee = 0.
+
+        amount = self.notional * (1 - fee_buy) / buy_price
+        proceeds = (amount - withdraw_fee) * sell_price * (1 - fee_sell)
+        net_profit = proceeds - self.notional
+
+        # notional, при котором выручка покрывает фиксированную комиссию вывода
+        gain = (1 - fee_buy) * (1 - fee_sell) * sell_price / buy_price
+        if not known:
+            break_even = float("nan")
+        elif gain > 1:
+            break_even = withdraw_fee * sell_price * (1 - fee_sell) / (gain - 1)
+        else:
+            break_even = float("inf")
+        min_amount = max(withdraw_min, withdraw_fee + deposit_min)
+        min_notional = min_amount * buy_price / (1 - fee_buy)
+
+        return Opportunity(base, snapshot_buy.name, snapshot_sell.name, buy_price, sell_price,
+                           self.notional, net_profit, break_even, min_notional, buy_quote, sell_quote, known)
+
+    def rank(self, hits, snapshots):
+        # hits - результат scanner.scan: (биржа покупки, биржа продажи, base, ratio)
+        by_name = {snapshot.name: snapshot for snapshot in snapshots}
+        opportunities = []
+        for exchange_A, exchange_B, base, ratio in hits:
+            opportunity = self.evaluate(base, by_name[exchange_A], by_name[exchange_B])
+            if opportunity.executable:
+                opportunities.append(opportunity)
+        opportunities.sort(key=lambda opportunity: (opportunity.fee_known, opportunity.net_edge), reverse=True)
+        return opportunities
@@ -0,0 +1,109 @@
+import time
+import asyncio
+from collections import deque
+
+
+class Budget:
+    # Скользящее окно: сколько веса потрачено за последние window секунд
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self.spent = deque()
+        self.used = 0
+        self.blocked_until = 0.
+
+    def expire(self, now):
+        while self.spent and now - self.spent[0][0] >= self.window:
+            self.used -= self.spent.popleft()[1]
+
+    async def acquire(self, weight):
+        while True:
+            now = time.monotonic()
+            self.expire(now)
+            if self.blocked_until > now:
+                await asyncio.sleep(self.blocked_until - now)
+            elif self.used + weight <= self.limit or not self.spent:
+                self.spent.append((now, weight))
+                self.used += weight
+                return
+            else:
+                await asyncio.sleep(self.spent[0][0] + self.window - now)
+
+    def sync(self, used):
+        # Биржа сама сообщает потраченный вес: если она насчитала больше нас, догоняем
+        now = time.monotonic()
+        self.expire(now)
+        if used > self.used:
+            self.spent.append((now, used - self.used))
+            self.used = used
+
+    def block(self, seconds):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def usage(self):
+        self.expire(time.monotonic())
+        return self.used / self.limit
+
+
+class RateLimiter:
+    # Лимиты биржи из misc/endpoints.json ("rate_limit"):
+    #   budget/window - общий бюджет веса на окно (Binance, KuCoin), weights - вес каждого эндпоинта
+    #   endpoints - отдельные лимиты {эндпоинт: [запросов, окно]} (OKX, Gate, Bitget)
+    #   used_header - заголовок с потраченным весом, по нему бюджет подстраивается под сервер
+    def __init__(self, config=None):
+        config = config or {}
+        self.weights = config.get("weights", {})
+        self.budget = Budget(config["budget"], config["window"]) if "budget" in config else None
+        self.endpoints = {endpoint: Budget(limit, window) for endpoint, (limit, window) in config.get("endpoints", {}).items()}
+        self.used_header = config.get("used_header")
+        self.ban_seconds = config.get("ban_seconds", 120)
+
+    def budgets(self, endpoint):
+        budgets = []
+        if self.budget is not None:
+            budgets.append(self.budget)
+        if endpoint in self.endpoints:
+            budgets.append(self.endpoints[endpoint])
+        return budgets
+
+    async def acquire(self, endpoint):
+        if self.budget is not None:
+            await self.budget.acquire(self.weights.get(endpoint, 1))
+        if endpoint in self.endpoints:
+            await self.endpoints[endpoint].acquire(1)
+
+    def observe(self, endpoint, status, headers):
+        if self.used_header and self.budget is not None and self.used_header in headers:
+            self.budget.sync(int(headers[self.used_header]))
+        if status in (418, 429):
+            # 429 - превышен лимит, 418 - бан по IP за то, что продолжали после 429
+            retry_after = headers.get("Retry-After")
+            seconds = int(retry_after) if retry_after and retry_after.isdigit() else self.ban_seconds
+            print(f"Rate limited ({status}), backing off for {seconds} seconds")
+            for budget in self.budgets(endpoint) or [self.fallback()]:
+                budget.block(seconds)
+
+    def fallback(self):
+        # на биржах без описанных лимитов 429 всё равно должен останавливать запросы
+        if self.budget is None:
+            self.budget = Budget(float("inf"), 1)
+        return self.budget
+
+    def usage(self):
+        budgets = list(self.endpoints.values())
+        if self.budget is not None:
+            budgets.append(self.budget)
+        return max([budget.usage() for budget in budgets], default=0.)
+
+    def min_period(self, endpoints, headroom=0.8):
+        # Минимальный период опроса, при котором endpoints укладываются в headroom от лимитов
+        period = 0.
+        if self.budget is not None and self.budget.limit != float("inf"):
+            weight = sum(self.weights.get(endpoint, 1) for endpoint in endpoints)
+            period = weight * self.budget.window / (self.budget.limit * headroom)
+        for endpoint in endpoints:
+            if endpoint in self.endpoints:
+                budget = self.endpoints[endpoint]
+                period = max(period, budget.window / (budget.limit * headroom))
+        # если потрачено больше запаса (в т.ч. по данным биржи), замедляемся пропорционально
+        return period * max(1., self.usage() / headroom)
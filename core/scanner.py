@@ -0,0 +1,213 @@
+import heapq
+from core.snapshots import BASES
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class Signal:
+    def __init__(self, base, exchange_A, exchange_B, ratio, opened=True):
+        # exchange_A - где дешевле, exchange_B - где дороже
+        self.base = base
+        self.exchange_A = exchange_A
+        self.exchange_B = exchange_B
+        self.ratio = ratio
+        self.opened = opened
+
+    def __repr__(self):
+        state = "open" if self.opened else "close"
+        return f"Signal({state} {self.base} {self.exchange_A}/{self.exchange_B} {self.ratio:.4f})"
+
+
+class IncrementalScanner:
+    # Для каждой базы держим кучу лучших (минимальных) ask и кучу лучших (максимальных) bid по всем биржам.
+    # Обновление одной (биржа, база) перепроверяет только эту базу за O(log n),
+    # а наружу отдаются только пересечения порога limit (открытие и закрытие сигнала).
+    # Отношение - ask биржи покупки к bid биржи продажи, обе цены в numeraire. Биржа покупки и продажи
+    # может совпадать: купить монету за одну котируемую и продать за другую
+    def __init__(self, limit, identity=None):
+        self.limit = limit
+        self.prices = {}
+        self.ask_heaps = {}
+        self.bid_heaps = {}
+        self.signals = {}
+        self.identity = identity
+
+    def is_bad(self, base, exchange_A, exchange_B):
+        return self.identity is not None and self.identity.is_bad(base, exchange_A, exchange_B)
+
+    def update(self, exchange, base, bid, ask):
+        prices = self.prices.setdefault(base, {})
+        if prices.get(exchange) == (bid, ask):
+            return None
+        prices[exchange] = (bid, ask)
+        ask_heap = self.ask_heaps.setdefault(base, [])
+        bid_heap = self.bid_heaps.setdefault(base, [])
+        heapq.heappush(ask_heap, (ask, exchange))
+        heapq.heappush(bid_heap, (-bid, exchange))
+        # Устаревшие записи удаляются лениво, но чтобы кучи не росли бесконечно, иногда пересобираем
+        if len(ask_heap) > 4 * len(prices) + 8:
+            self.rebuild(base)
+        return self.check(base)
+
+    def remove(self, exchange, base):
+        prices = self.prices.get(base)
+        if not prices or exchange not in prices:
+            return None
+        del prices[exchange]
+        return self.check(base)
+
+    def rebuild(self, base):
+        prices = self.prices[base]
+        self.ask_heaps[base] = [(ask, exchange) for exchange, (bid, ask) in prices.items()]
+        self.bid_heaps[base] = [(-bid, exchange) for exchange, (bid, ask) in prices.items()]
+        heapq.heapify(self.ask_heaps[base])
+        heapq.heapify(self.bid_heaps[base])
+
+    def top(self, heap, prices, side, sign):
+        while heap and (heap[0][1] not in prices or prices[heap[0][1]][side] != sign * heap[0][0]):
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def best_pair(self, base):
+        prices = self.prices[base]
+        low = self.top(self.ask_heaps[base], prices, 1, 1)
+        high = self.top(self.bid_heaps[base], prices, 0, -1)
+        if low is None or high is None:
+            return None
+        exchange_A, exchange_B = low[1], high[1]
+        # перевод между этими биржами невозможен (core.identity) - перебираем пары этой базы
+        if self.is_bad(base, exchange_A, exchange_B):
+            return self.best_allowed_pair(base)
+        return exchange_A, exchange_B, low[0] / -high[0]
+
+    def best_allowed_pair(self, base):
+        best = None
+        prices = self.prices[base]
+        for exchange_A, (_, ask_A) in prices.items():
+            for exchange_B, (bid_B, _) in prices.items():
+                if not bid_B or self.is_bad(base, exchange_A, exchange_B):
+                    continue
+                ratio = ask_A / bid_B
+                if best is None or ratio < best[2]:
+                    best = (exchange_A, exchange_B, ratio)
+        return best
+
+    def check(self, base):
+        best = self.best_pair(base)
+        opened = base in self.signals
+        if best is not None and best[2] < self.limit:
+            self.signals[base] = best
+            if not opened:
+                return Signal(base, *best)
+        elif opened:
+            exchange_A, exchange_B, _ = self.signals.pop(base)
+            ratio = best[2] if best is not None else 1.0
+            return Signal(base, exchange_A, exchange_B, ratio, opened=False)
+        return None
+
+    def reload(self, snapshot):
+        # Снапшот биржи пересобран через REST (новые статусы, депозиты и выводы): монеты, которых в нём больше нет,
+        # убираются, остальные берут свежие цены. -> сигналы, как у load
+        signals = []
+        for base, prices in self.prices.items():
+            if snapshot.name in prices and base not in snapshot:
+                signal = self.remove(snapshot.name, base)
+                if signal is not None:
+                    signals.append(signal)
+        return signals + self.load([snapshot])
+
+    def load(self, snapshots):
+        signals = []
+        for snapshot in snapshots:
+            bids, asks = snapshot.norm_bid, snapshot.norm_ask
+            for index in snapshot.active:
+                signal = self.update(snapshot.name, BASES.names[index], bids[index], asks[index])
+                if signal is not None:
+                    signals.append(signal)
+        return signals
+
+
+def scan_pairs(snapshots, limit, identity=None):
+    # Построчный проход по всем парам бирж, используется когда нет numpy. Цены - лучшие по всем котируемым в numeraire.
+    # -> [(биржа покупки, биржа продажи, база, ask покупки / bid продажи), ...]
+    found = []
+    # внутри одной биржи: купить за одну котируемую и продать за другую
+    for snapshot in snapshots:
+        bids, asks = snapshot.norm_bid, snapshot.norm_ask
+        for index in snapshot.active:
+            if asks[index] / bids[index] < limit:
+                found.append((snapshot.name, snapshot.name, BASES.names[index], asks[index] / bids[index]))
+    for index_A in range(len(snapshots)-1):
+        for index_B in range(index_A+1, len(snapshots)):
+            snapshot_A, snapshot_B = snapshots[index_A], snapshots[index_B]
+            exchange_A = snapshot_A.name
+            exchange_B = snapshot_B.name
+            bids_A, asks_A = snapshot_A.norm_bid, snapshot_A.norm_ask
+            bids_B, asks_B = snapshot_B.norm_bid, snapshot_B.norm_ask
+
+            intersection = set(snapshot_A.active).intersection(snapshot_B.active)
+            for index in intersection:
+                base = BASES.names[index]
+                # купить на A и продать на B, и наоборот; направление пропускается, если монету не перевести
+                if asks_A[index] / bids_B[index] < limit and \
+                        (identity is None or not identity.is_bad(base, exchange_A, exchange_B)):
+                    found.append((exchange_A, exchange_B, base, asks_A[index] / bids_B[index]))
+                if asks_B[index] / bids_A[index] < limit and \
+                        (identity is None or not identity.is_bad(base, exchange_B, exchange_A)):
+                    found.append((exchange_B, exchange_A, base, asks_B[index] / bids_A[index]))
+    return found
+
+
+def quote_matrices(snapshots):
+    # Матрицы bid и ask в numeraire базы x биржи, NaN там, где базы на бирже нет. Колонки снапшотов уже выровнены
+    # по BASES, поэтому столбец биржи заполняется одной операцией. Котируемые сведены в одну колонку ещё в снапшоте,
+    # так что размер матриц от их числа не зависит. Остаются базы, которые есть хотя бы на двух биржах
+    # или торгуются на одной бирже к нескольким котируемым
+    size = max([len(snapshot.flags) for snapshot in snapshots], default=0)
+    bids = np.full((size, len(snapshots)), np.nan)
+    asks = np.full((size, len(snapshots)), np.nan)
+    for column, snapshot in enumerate(snapshots):
+        if not len(snapshot.active):
+            continue
+        active = np.frombuffer(snapshot.active, dtype=np.int64)
+        asks[active, column] = np.frombuffer(snapshot.norm_ask, dtype=np.float64)[active]
+        bids[active, column] = np.frombuffer(snapshot.norm_bid, dtype=np.float64)[active]
+    with np.errstate(invalid="ignore"):
+        crossed = np.any(asks < bids, axis=1)
+    rows = np.nonzero((np.count_nonzero(~np.isnan(asks), axis=1) >= 2) | crossed)[0]
+    bases = [BASES.names[row] for row in rows]
+    index = {base: row for row, base in enumerate(bases)}
+    return bases, index, bids[rows], asks[rows]
+
+
+def bad_mask(index, names, identity):
+    mask = np.zeros((len(index), len(names), len(names)), dtype=bool)
+    if identity is None:
+        return mask
+    columns = {name: column for column, name in enumerate(names)}
+    for base, exchange_A, exchange_B in identity.keys:
+        if base in index and exchange_A in columns and exchange_B in columns:
+            mask[index[base], columns[exchange_A], columns[exchange_B]] = True
+    return mask
+
+
+def scan_matrix(snapshots, limit, identity=None):
+    # Все направленные отношения ask[A] / bid[B] считаются одной операцией над массивом базы x биржи x биржи,
+    # элементов столько же, сколько было при сравнении mid. Диагональ (A == B) - сделки внутри одной биржи
+    # через разные котируемые. Формат результата как у scan_pairs
+    names = [snapshot.name for snapshot in snapshots]
+    bases, index, bids, asks = quote_matrices(snapshots)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratios = asks[:, :, None] / bids[:, None, :]
+    hits = ratios < limit
+    hits &= ~bad_mask(index, names, identity)
+    found = []
+    for row, column_A, column_B in zip(*np.nonzero(hits)):
+        found.append((names[column_A], names[column_B], bases[row], float(ratios[row, column_A, column_B])))
+    return found
+
+
+scan = scan_matrix if np is not None else scan_pairs
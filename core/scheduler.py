@@ -0,0 +1,54 @@
+import asyncio
+import sys
+import traceback
+from core import tracing
+
+
+class Scheduler:
+    # Запуск задач с фиксированным шагом от начала цикла (без дрейфа на время самой задачи).
+    # Задача никогда не пересекается сама с собой; если она не уложилась в period:
+    #   skip - пропущенные тики выбрасываются, ждём следующий тик по сетке
+    #   coalesce - пропущенные тики схлопываются в один запуск сразу после текущего
+    # period может быть функцией - тогда шаг пересчитывается каждый цикл (например, по лимитам биржи).
+    # delayed - первый запуск через period, а не сразу.
+    # Каждый запуск задачи - отдельный цикл в core.tracing
+    def __init__(self):
+        self.tasks = []
+
+    def every(self, period, job, overrun="skip", name=None, delayed=False):
+        task = asyncio.create_task(self.run(period, job, overrun, name or getattr(job, "__name__", "job"), delayed))
+        self.tasks.append(task)
+        return task
+
+    async def run(self, period, job, overrun, name, delayed):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        if delayed:
+            next_tick += period() if callable(period) else period
+            await asyncio.sleep(next_tick - loop.time())
+        while True:
+            try:
+                with tracing.cycle(name):
+                    await job()
+            except Exception:
+                traceback.print_exception(*sys.exc_info())
+            step = period() if callable(period) else period
+            next_tick += step
+            now = loop.time()
+            if now > next_tick:
+                missed = int((now - next_tick) // step) + 1
+                print(f"{name}: cycle overran by {round(now - next_tick, 2)} seconds ({overrun}, {missed} ticks missed)")
+                if overrun == "skip":
+                    next_tick += missed * step
+                else:
+                    next_tick = now
+            await asyncio.sleep(next_tick - loop.time())
+
+    async def wait(self):
+        await asyncio.gather(*self.tasks)
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
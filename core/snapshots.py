@@ -0,0 +1,417 @@
+import asyncio
+import os
+import sys
+import time
+import traceback
+from array import array
+from core import decoders
+from core import tracing
+from core.identity import Network, UNKNOWN_FEE, fee_order
+
+
+# Флаги монеты в снапшоте: в поиске участвуют только монеты со всеми флагами (ACTIVE)
+TRADABLE = 1
+DEPOSIT = 2
+WITHDRAW = 4
+PRICED = 8
+ACTIVE = TRADABLE | DEPOSIT | WITHDRAW | PRICED
+
+
+class BaseIndex:
+    # Общая для всех бирж нумерация монет: колонки снапшотов выровнены по ней,
+    # одна и та же монета на любой бирже лежит под одним номером
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+
+    def intern(self, base):
+        index = self.ids.get(base)
+        if index is None:
+            base = sys.intern(base)
+            index = self.ids[base] = len(self.names)
+            self.names.append(base)
+        return index
+
+    def get(self, base):
+        return self.ids.get(base)
+
+    def __len__(self):
+        return len(self.names)
+
+
+BASES = BaseIndex()
+
+
+def zeros(typecode, size):
+    return array(typecode, bytes(array(typecode).itemsize * size))
+
+
+def to_float(value):
+    return float(value) if value not in (None, "") else 0.
+
+
+class Listing:
+    # Часть снапшота, которая зависит только от списка пар и конфига депозитов/выводов.
+    # Собирается заново, только когда обновились метаданные, между циклами переиспользуется
+    def __init__(self, size):
+        self.flags = zeros('B', size)
+        self.withdraw_fee = zeros('d', size)
+        self.withdraw_min = zeros('d', size)
+        self.deposit_min = zeros('d', size)
+        self.names = [None] * size
+        self.chains = [None] * size
+        self.symbols = [None] * size
+        # символ в тикерах -> (номер монеты или -1, котируемая, котируемая, курс которой он задаёт, или None)
+        self.tickers = {}
+        # номер монеты -> сети из coin_info (core.identity.Network), только у монет, о которых биржа их сообщает
+        self.networks = {}
+        # сколько торгуемых монет выкинуто из-за закрытых депозита или вывода
+        self.closed = 0
+
+    def set(self, index, fields):
+        self.flags[index] |= DEPOSIT | WITHDRAW
+        # комиссии нет в ответе биржи (или в старом tickers_<name>.json) - она неизвестна
+        fee = fields.get('withdraw_min_fee')
+        self.withdraw_fee[index] = UNKNOWN_FEE if fee in (None, "") else to_float(fee)
+        self.withdraw_min[index] = to_float(fields.get('withdraw_min_amount'))
+        self.deposit_min[index] = to_float(fields.get('deposit_min_amount'))
+        self.names[index] = fields.get('name')
+        self.chains[index] = fields.get('chain')
+        self.symbols[index] = fields.get('base_another')
+
+    def add_networks(self, index, networks):
+        if networks:
+            self.networks.setdefault(index, []).extend(networks)
+
+    def choose_networks(self):
+        # комиссия и минимумы монеты - по самой дешёвой сети, открытой для вывода
+        for index, networks in self.networks.items():
+            if not self.flags[index] & DEPOSIT:
+                continue
+            networks = [network for network in networks if network.withdraw]
+            if networks:
+                network = min(networks, key=fee_order)
+                self.withdraw_fee[index] = network.withdraw_fee
+                self.withdraw_min[index] = network.withdraw_min
+                self.deposit_min[index] = network.deposit_min
+                self.chains[index] = network.name or self.chains[index]
+
+    def networks_by_base(self):
+        # -> {base: (Network, ...)} монет с открытыми депозитом и выводом, для core.identity.IdentityIndex
+        return {BASES.names[index]: tuple(networks) for index, networks in self.networks.items()
+                if self.flags[index] & DEPOSIT}
+
+
+class Snapshot:
+    # Результат одного опроса биржи. Вместо словаря на каждую монету - колонки по номерам BASES:
+    # флаги и bid/ask/mid/объём по каждой котируемой. Биржа держит один снапшот и перезаполняет его
+    # каждый цикл, массивы не пересоздаются. В прежнем виде (tickers_<name>.json) его отдаёт to_pairs().
+    # Первая котируемая - общая единица (numeraire): rates - курсы остальных котируемых к ней,
+    # а norm_bid/norm_ask - лучшие bid/ask монеты по всем котируемым, пересчитанные в неё
+    def __init__(self, name, quotes=("USDT",), created_at=None):
+        self.name = name
+        self.quotes = quotes
+        self.numeraire = quotes[0]
+        self.created_at = time.time() if created_at is None else created_at
+        self.flags = zeros('B', 0)
+        self.bid = {quote: zeros('d', 0) for quote in quotes}
+        self.ask = {quote: zeros('d', 0) for quote in quotes}
+        self.mid = {quote: zeros('d', 0) for quote in quotes}
+        self.volume = {quote: zeros('d', 0) for quote in quotes}
+        self.norm_bid = zeros('d', 0)
+        self.norm_ask = zeros('d', 0)
+        # номер котируемой в quotes, через которую выгоднее продать (bid) и купить (ask)
+        self.bid_quote = zeros('B', 0)
+        self.ask_quote = zeros('B', 0)
+        self.blank = zeros('d', 0)
+        self.rates = {self.numeraire: (1., 1.)}
+        self.listing = Listing(0)
+        self.active = array('q')
+        # последний unpack(): монеты и их сведения, номера монет в BASES этого процесса
+        self.unpacked = None
+        self.indexes = array('q')
+        # фильтр -> сколько пар он отсеял при последней сборке (spread_limit, vol24, deposit_withdraw)
+        self.dropped = {}
+
+    def columns(self):
+        for columns in (self.bid, self.ask, self.mid, self.volume):
+            yield from columns.values()
+        yield self.norm_bid
+        yield self.norm_ask
+
+    def reset(self, listing):
+        size = len(listing.flags)
+        if len(self.flags) < size:
+            grow = size - len(self.flags)
+            self.flags.extend(zeros('B', grow))
+            self.bid_quote.extend(zeros('B', grow))
+            self.ask_quote.extend(zeros('B', grow))
+            self.blank.extend(zeros('d', grow))
+            for column in self.columns():
+                column.extend(zeros('d', grow))
+        self.flags[:size] = listing.flags
+        for index in range(size, len(self.flags)):
+            self.flags[index] = 0
+        # цены прошлого цикла стираются: котируемая, которой в этот раз нет в тикерах, не должна остаться со старой ценой
+        for column in self.columns():
+            column[:] = self.blank
+        self.rates = {self.numeraire: (1., 1.)}
+        self.listing = listing
+
+    def set_quote(self, index, quote, bid, ask, volume=None):
+        # -> True, если mid поменялся. Сводные norm_* пересчитывает normalize()
+        self.bid[quote][index] = bid
+        self.ask[quote][index] = ask
+        if volume is not None:
+            self.volume[quote][index] = volume
+        mid = (bid + ask) / 2
+        if self.mid[quote][index] == mid:
+            return False
+        self.mid[quote][index] = mid
+        return True
+
+    def legs(self):
+        # котируемые, для которых известен курс: (номер в quotes, bid, ask, курс продажи, курс покупки)
+        return [(position, self.bid[quote], self.ask[quote]) + self.rates[quote]
+                for position, quote in enumerate(self.quotes) if quote in self.rates]
+
+    def normalize(self, index, legs=None):
+        # Лучшие цены монеты в numeraire: купить там, где ask * курс покупки котируемой меньше,
+        # продать там, где bid * курс продажи котируемой больше
+        best_bid = best_ask = 0.
+        bid_quote = ask_quote = 0
+        for position, bids, asks, rate_bid, rate_ask in legs or self.legs():
+            ask = asks[index] * rate_ask
+            if not ask:
+                continue
+            bid = bids[index] * rate_bid
+            if not best_ask or ask < best_ask:
+                best_ask, ask_quote = ask, position
+            if bid > best_bid:
+                best_bid, bid_quote = bid, position
+        self.norm_bid[index] = best_bid
+        self.norm_ask[index] = best_ask
+        self.bid_quote[index] = bid_quote
+        self.ask_quote[index] = ask_quote
+        if best_ask and best_bid:
+            self.flags[index] |= PRICED
+        else:
+            self.flags[index] &= ~PRICED & 0xff
+
+    def finish(self, created_at=None, indexes=None):
+        # indexes - монеты, у которых в этом цикле появились цены; по умолчанию все с остальными флагами
+        listed = TRADABLE | DEPOSIT | WITHDRAW
+        if indexes is None:
+            indexes = [index for index, flags in enumerate(self.flags) if flags & listed == listed]
+        legs = self.legs()
+        for index in indexes:
+            self.normalize(index, legs)
+        self.active = array('q', [index for index, flags in enumerate(self.flags) if flags == ACTIVE])
+        self.created_at = time.time() if created_at is None else created_at
+        return self
+
+    @property
+    def withdraw_fee(self):
+        return self.listing.withdraw_fee
+
+    @property
+    def withdraw_min(self):
+        return self.listing.withdraw_min
+
+    @property
+    def deposit_min(self):
+        return self.listing.deposit_min
+
+    def index(self, base):
+        index = BASES.get(base)
+        if index is None or index >= len(self.flags) or self.flags[index] != ACTIVE:
+            raise KeyError(base)
+        return index
+
+    def bases(self):
+        return [BASES.names[index] for index in self.active]
+
+    def price(self, base, quote="USDT"):
+        # mid по конкретной котируемой; KeyError, если монеты нет или по этой котируемой нет цены
+        if quote not in self.mid or not self.mid[quote][self.index(base)]:
+            raise KeyError((base, quote))
+        return self.mid[quote][self.index(base)]
+
+    def best(self, base):
+        # -> (лучший bid, лучший ask) в numeraire по всем котируемым
+        index = self.index(base)
+        return self.norm_bid[index], self.norm_ask[index]
+
+    def best_quotes(self, base):
+        # -> (котируемая для продажи, котируемая для покупки)
+        index = self.index(base)
+        return self.quotes[self.bid_quote[index]], self.quotes[self.ask_quote[index]]
+
+    def symbol(self, base):
+        # как монета называется в символах биржи (на KuCoin может отличаться)
+        return self.listing.symbols[self.index(base)] or base
+
+    def age(self):
+        return time.time() - self.created_at
+
+    def is_fresh(self, max_age):
+        return self.age() <= max_age
+
+    def __contains__(self, base):
+        index = BASES.get(base)
+        return index is not None and index < len(self.flags) and self.flags[index] == ACTIVE
+
+    def __len__(self):
+        return len(self.active)
+
+    def __repr__(self):
+        return f"Snapshot({self.name!r}, bases={len(self.active)}, created_at={self.created_at})"
+
+    def to_pairs(self):
+        # прежний формат PAIRS: {base: {"prices": {...}, "tradable": True, ...}}
+        listing = self.listing
+        pairs = {}
+        for index in self.active:
+            quotes = [quote for quote in self.quotes if self.mid[quote][index]]
+            pair = {
+                "prices": {quote: self.mid[quote][index] for quote in quotes},
+                "bid": {quote: self.bid[quote][index] for quote in quotes},
+                "ask": {quote: self.ask[quote][index] for quote in quotes},
+                "volume": {quote: self.volume[quote][index] for quote in quotes},
+                "tradable": True,
+                "quotes": self.quotes,
+                "deposit": True,
+                "withdraw": True,
+                "withdraw_min_fee": listing.withdraw_fee[index],
+                "withdraw_min_amount": listing.withdraw_min[index],
+                "deposit_min_amount": listing.deposit_min[index],
+            }
+            for key, column in (("name", listing.names), ("chain", listing.chains), ("base_another", listing.symbols)):
+                if column[index] is not None:
+                    pair[key] = column[index]
+            if index in listing.networks:
+                pair["networks"] = [list(network) for network in listing.networks[index]]
+            pairs[BASES.names[index]] = pair
+        return pairs
+
+    def pack(self):
+        # Компактный вид для передачи из процесса разбора (core.workers): только активные монеты и по именам,
+        # нумерация BASES в каждом процессе своя. Колонки - array, они сериализуются одним куском байт
+        active = self.active
+        listing = self.listing
+        names = [BASES.names[index] for index in active]
+        rows = [(listing.withdraw_fee[index], listing.withdraw_min[index], listing.deposit_min[index],
+                 listing.names[index], listing.chains[index], listing.symbols[index],
+                 tuple(listing.networks.get(index, ()))) for index in active]
+        prices = {}
+        for quote in self.quotes:
+            bids, asks, volumes = self.bid[quote], self.ask[quote], self.volume[quote]
+            prices[quote] = (array('d', [bids[index] for index in active]),
+                             array('d', [asks[index] for index in active]),
+                             array('d', [volumes[index] for index in active]))
+        return self.created_at, dict(self.rates), names, rows, prices, self.dropped
+
+    def unpack(self, packed):
+        # Заполнить снапшот из pack(). Список пар пересобирается, только если поменялись монеты или их сведения
+        created_at, rates, names, rows, prices, self.dropped = packed
+        if self.unpacked != (names, rows):
+            indexes = array('q', [BASES.intern(base) for base in names])
+            listing = Listing(len(BASES))
+            for index, (withdraw_fee, withdraw_min, deposit_min, name, chain, symbol, networks) in zip(indexes, rows):
+                listing.flags[index] = TRADABLE | DEPOSIT | WITHDRAW
+                listing.withdraw_fee[index] = withdraw_fee
+                listing.withdraw_min[index] = withdraw_min
+                listing.deposit_min[index] = deposit_min
+                listing.names[index] = name
+                listing.chains[index] = chain
+                listing.symbols[index] = symbol
+                listing.add_networks(index, networks)
+            self.listing = listing
+            self.indexes = indexes
+            self.unpacked = (names, rows)
+        self.reset(self.listing)
+        self.rates.update(rates)
+        for quote, (bids, asks, volumes) in prices.items():
+            for index, bid, ask, volume in zip(self.indexes, bids, asks, volumes):
+                if ask:
+                    self.set_quote(index, quote, bid, ask, volume)
+        return self.finish(created_at, self.indexes)
+
+    @classmethod
+    def from_pairs(cls, name, pairs, created_at=None, numeraire="USDT"):
+        # снапшот из прежнего формата (сохранённые tickers_<name>.json)
+        quotes = {numeraire}
+        for pair in pairs.values():
+            quotes.update(pair['prices'])
+        snapshot = cls(name, (numeraire,) + tuple(sorted(quotes - {numeraire})))
+        indexes = [BASES.intern(base) for base in pairs]
+        listing = Listing(len(BASES))
+        for index, pair in zip(indexes, pairs.values()):
+            listing.flags[index] = TRADABLE
+            listing.set(index, pair)
+            # неизвестная комиссия (nan) в JSON записывается как null
+            networks = [Network(*network) for network in pair.get('networks', ())]
+            listing.add_networks(index, [network if network.withdraw_fee is not None else
+                                         network._replace(withdraw_fee=UNKNOWN_FEE) for network in networks])
+        snapshot.reset(listing)
+        for index, pair in zip(indexes, pairs.values()):
+            # в старых файлах есть только mid
+            for quote, price in pair['prices'].items():
+                bid = pair.get('bid', {}).get(quote, price)
+                ask = pair.get('ask', {}).get(quote, price)
+                snapshot.set_quote(index, quote, float(bid), float(ask), pair.get('volume', {}).get(quote))
+        # курсы котируемых берутся из их же цен к numeraire, если они есть в файле
+        for quote in snapshot.quotes[1:]:
+            if quote in pairs and numeraire in pairs[quote]['prices']:
+                snapshot.rates[quote] = snapshot.bid[numeraire][BASES.get(quote)], snapshot.ask[numeraire][BASES.get(quote)]
+        return snapshot.finish(created_at)
+
+
+class FileSink:
+    # Запись на диск вне горячего пути: сериализация идёт в отдельном потоке,
+    # а если файл ещё пишется с прошлого цикла, сохраняется только последняя версия
+    def __init__(self, directory="tickers"):
+        self.directory = directory
+        self.pending = {}
+        self.tasks = {}
+
+    def write(self, filename, data):
+        self.pending[filename] = data
+        if filename not in self.tasks:
+            self.tasks[filename] = tracing.detach(self.drain(filename))
+
+    async def drain(self, filename):
+        try:
+            while filename in self.pending:
+                data = self.pending.pop(filename)
+                await asyncio.to_thread(self.dump, os.path.join(self.directory, filename), data)
+        except Exception:
+            traceback.print_exception(*sys.exc_info())
+        finally:
+            del self.tasks[filename]
+
+    @staticmethod
+    def dump(path, data):
+        # непрочитанные ответы бирж (режим core.workers) пишутся как есть
+        with open(path, "wb") as f:
+            f.write(data if isinstance(data, bytes) else decoders.dumps(data))
+
+    async def flush(self):
+        while self.tasks:
+            await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+
+
+def load_snapshot(name, directory="tickers"):
+    path = os.path.join(directory, f"tickers_{name}.json")
+    with open(path, "rb") as f:
+        pairs = decoders.loads(f.read())
+    return Snapshot.from_pairs(name, pairs, created_at=os.path.getmtime(path))
+
+
+def replay(names, directory="tickers"):
+    # Для отладки: прогнать сканер по сохранённым раньше снапшотам
+    snapshots = []
+    for name in names:
+        if os.path.exists(os.path.join(directory, f"tickers_{name}.json")):
+            snapshots.append(load_snapshot(name, directory))
+    return snapshots
@@ -0,0 +1,245 @@
+import time
+import random
+import aiohttp
+import asyncio
+import traceback
+import sys
+from core import exchanges
+from core import decoders
+
+
+class BaseStream:
+    # Живая таблица лучших bid/ask по WebSocket поверх снапшота, полученного через REST:
+    # фильтры по статусу, депозитам/выводам и объёму остаются от REST, здесь обновляются только цены
+    exchange_class = None
+    ping_interval = 20
+    # пауза перед переподключением растёт вдвое от min_backoff до max_backoff и сбрасывается после удачного подключения,
+    # сверху до min_backoff случайного разброса
+    min_backoff = 1
+    max_backoff = 60
+    chunk = 100
+
+    def __init__(self, snapshot, hub):
+        self.exchange = self.exchange_class()
+        self.name = self.exchange.name
+        self.url = self.exchange.endpoints[self.name]['ws_url']
+        self.snapshot = snapshot
+        self.hub = hub
+        self.book = {}
+        self.ws = None
+        self.symbols = self.subscriptions()
+
+    def subscriptions(self):
+        # символ -> (номер монеты или -1, база, котируемая, котируемая, курс которой он задаёт, или None).
+        # Подписываемся только на пары, прошедшие фильтры REST, и на пары котируемых к numeraire
+        snapshot = self.snapshot
+        symbols = {}
+        for base in snapshot.bases():
+            index = snapshot.index(base)
+            for quote in snapshot.quotes:
+                if snapshot.ask[quote][index]:
+                    symbols[self.symbol(snapshot.symbol(base), quote)] = (index, base, quote, None)
+        for quote in snapshot.quotes[1:]:
+            symbol = self.symbol(quote, snapshot.numeraire)
+            index, base, _, _ = symbols.get(symbol, (-1, quote, snapshot.numeraire, None))
+            symbols[symbol] = (index, base, snapshot.numeraire, quote)
+        return symbols
+
+    async def resync(self):
+        # Снапшот пересобран через REST: пары, которые больше не проходят фильтры, выпадают из подписки, новые добавляются.
+        # Если список поменялся, соединение закрывается, и run() подписывается заново уже на новый
+        symbols = self.subscriptions()
+        if symbols.keys() == self.symbols.keys():
+            self.symbols = symbols
+            return False
+        self.symbols = symbols
+        self.book = {key: value for key, value in self.book.items() if key[0] in self.snapshot}
+        if self.ws is not None:
+            await self.ws.close()
+        return True
+
+    def symbol(self, base, quote):
+        return base + quote
+
+    async def connect_url(self):
+        return self.url
+
+    async def subscribe(self, ws):
+        pass
+
+    async def ping(self, ws):
+        await ws.ping()
+
+    def parse(self, message):
+        # -> [(symbol, bid, ask), ...]
+        return []
+
+    async def run(self):
+        backoff = self.min_backoff
+        while True:
+            try:
+                async with self.exchange.get_session().ws_connect(await self.connect_url()) as ws:
+                    self.ws = ws
+                    await self.subscribe(ws)
+                    backoff = self.min_backoff
+                    await self.listen(ws)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                traceback.print_exception(*sys.exc_info())
+            finally:
+                self.ws = None
+            print(f"Reconnecting {self.name} stream in {backoff} seconds")
+            await asyncio.sleep(backoff + random.random() * self.min_backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    async def listen(self, ws):
+        while True:
+            try:
+                msg = await ws.receive(timeout=self.ping_interval)
+            except asyncio.TimeoutError:
+                await self.ping(ws)
+                continue
+            if msg.type == aiohttp.WSMsgType.TEXT:
+                for symbol, bid, ask in self.parse(decoders.loads(msg.data)):
+                    self.update(symbol, bid, ask)
+            elif msg.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSING, aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                return
+
+    def update(self, symbol, bid, ask):
+        if symbol not in self.symbols:
+            return
+        bid, ask = float(bid), float(ask)
+        if bid <= 0 or ask <= 0 or bid / ask <= self.exchange.spread_limit:
+            return
+        index, base, quote, rate = self.symbols[symbol]
+        # новый курс монеты подхватят на своём следующем тике или на следующем цикле REST
+        if rate is not None:
+            self.snapshot.rates[rate] = (bid, ask)
+        if index < 0:
+            return
+        self.book[base, quote] = (bid, ask)
+        if self.snapshot.set_quote(index, quote, bid, ask):
+            self.snapshot.normalize(index)
+            self.snapshot.created_at = time.time()
+            self.hub.mark(self.name, base)
+
+
+class BinanceStream(BaseStream):
+    exchange_class = exchanges.BinanceExchange
+
+    def parse(self, message):
+        if 's' not in message:
+            return []
+        return [(message['s'], message['b'], message['a'])]
+
+
+class OkxStream(BaseStream):
+    exchange_class = exchanges.OkxExchange
+    ping_interval = 25
+
+    def symbol(self, base, quote):
+        return f"{base}-{quote}"
+
+    async def subscribe(self, ws):
+        symbols = list(self.symbols)
+        for i in range(0, len(symbols), self.chunk):
+            args = [{"channel": "tickers", "instId": symbol} for symbol in symbols[i:i+self.chunk]]
+            await ws.send_json({"op": "subscribe", "args": args})
+
+    async def ping(self, ws):
+        await ws.send_str("ping")
+
+    def parse(self, message):
+        return [(sample['instId'], sample['bidPx'], sample['askPx']) for sample in message.get('data', [])]
+
+
+class KucoinStream(BaseStream):
+    exchange_class = exchanges.KucoinExchange
+
+    def symbol(self, base, quote):
+        return f"{base}-{quote}"
+
+    async def connect_url(self):
+        # У KuCoin адрес и токен для WebSocket выдаются отдельным REST запросом
+        async with self.exchange.get_session().post(self.exchange.base_url+self.url) as response:
+            data = (await response.json())['data']
+        server = data['instanceServers'][0]
+        self.ping_interval = server['pingInterval'] / 1000
+        return f"{server['endpoint']}?token={data['token']}&connectId={int(time.time() * 1000)}"
+
+    async def subscribe(self, ws):
+        await ws.send_json({"id": int(time.time() * 1000), "type": "subscribe", "topic": "/market/ticker:all", "response": True})
+
+    async def ping(self, ws):
+        await ws.send_json({"id": int(time.time() * 1000), "type": "ping"})
+
+    def parse(self, message):
+        if message.get('type') != "message":
+            return []
+        return [(message['subject'], message['data']['bestBid'], message['data']['bestAsk'])]
+
+
+class GateStream(BaseStream):
+    exchange_class = exchanges.GateExchange
+
+    def symbol(self, base, quote):
+        return f"{base}_{quote}"
+
+    async def subscribe(self, ws):
+        symbols = list(self.symbols)
+        for i in range(0, len(symbols), self.chunk):
+            await ws.send_json({"time": int(time.time()), "channel": "spot.book_ticker", "event": "subscribe", "payload": symbols[i:i+self.chunk]})
+
+    async def ping(self, ws):
+        await ws.send_json({"time": int(time.time()), "channel": "spot.ping"})
+
+    def parse(self, message):
+        if message.get('event') != "update":
+            return []
+        result = message['result']
+        return [(result['s'], result['b'], result['a'])]
+
+
+STREAMS = {
+    "binance": BinanceStream,
+    "okx": OkxStream,
+    "kucoin": KucoinStream,
+    "gate": GateStream,
+}
+
+
+class StreamHub:
+    # Собирает пары (биржа, база) с изменившейся ценой, чтобы сканер перепроверял только их
+    def __init__(self, snapshots):
+        self.changed = set()
+        self.wakeup = asyncio.Event()
+        self.streams = [STREAMS[snapshot.name](snapshot, self) for snapshot in snapshots if snapshot.name in STREAMS]
+        self.tasks = []
+
+    def mark(self, name, base):
+        self.changed.add((name, base))
+        self.wakeup.set()
+
+    def start(self):
+        self.tasks = [asyncio.create_task(stream.run()) for stream in self.streams]
+        return self.tasks
+
+    async def changes(self, timeout=None):
+        # timeout - чтобы молчащий поток не держал цикл: тогда -> пустое множество
+        try:
+            await asyncio.wait_for(self.wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            return set()
+        self.wakeup.clear()
+        changed, self.changed = self.changed, set()
+        return changed
+
+    async def resync(self):
+        for stream in self.streams:
+            await stream.resync()
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
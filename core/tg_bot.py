@@ -1,6 +1,11 @@
 import json
+import time
+import asyncio
 import logging
 from aiogram import Bot, Dispatcher, executor, types
+from aiogram.utils.exceptions import RetryAfter
+from core import metrics
+from core import tracing
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -30,5 +35,137 @@ async def send_signal(big_message: str):
         await bot.send_message(user, big_message)
 
 
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def split(text, limit):
+    # Сообщение длиннее limit режется по строкам, а строка длиннее limit - по limit символов
+    if len(text) <= limit:
+        return [text]
+    pieces = []
+    for line in text.splitlines(keepends=True):
+        pieces.extend(line[start:start + limit] for start in range(0, len(line), limit))
+    return pieces
+
+
+class SignalDispatcher:
+    # Очередь исходящих сигналов: сканер только кладёт текст через put() и не ждёт сеть.
+    # flush() в конце цикла склеивает сигналы цикла в одно сообщение на пользователя,
+    # рассылка идёт в фоне параллельно, но не быстрее лимита Telegram (~30 сообщений в секунду).
+    # Повтор одного и того же ключа (база, биржа, биржа) в течение cooldown секунд подавляется,
+    # ключи старше cooldown выбрасываются при каждой проверке. Сигнал длиннее лимита Telegram уходит несколькими сообщениями
+    max_length = 4096
+
+    def __init__(self, bot, users, rate=25, cooldown=600):
+        self.bot = bot
+        self.users = users
+        self.bucket = TokenBucket(rate, rate)
+        self.cooldown = cooldown
+        self.queue = asyncio.Queue()
+        self.batch = []
+        self.sent = {}
+        self.task = None
+
+    def put(self, text, key=None):
+        if key is not None:
+            now = time.monotonic()
+            self.prune(now)
+            if key in self.sent:
+                metrics.signals.inc("suppressed")
+                return False
+            self.sent[key] = now
+        metrics.signals.inc("queued")
+        self.batch.append(text)
+        return True
+
+    def prune(self, now):
+        # sent идёт в порядке отправки, поэтому устаревшие ключи - в начале
+        expired = []
+        for key, sent_at in self.sent.items():
+            if now - sent_at < self.cooldown:
+                break
+            expired.append(key)
+        for key in expired:
+            del self.sent[key]
+
+    def flush(self):
+        batch, self.batch = self.batch, []
+        message = ""
+        for text in batch:
+            for piece in split(text, self.max_length):
+                if message and len(message) + len(piece) > self.max_length:
+                    self.queue.put_nowait(message)
+                    message = ""
+                message += piece
+        if message:
+            self.queue.put_nowait(message)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+        return self.task
+
+    async def run(self):
+        while True:
+            message = await self.queue.get()
+            with tracing.cycle("telegram"):
+                await asyncio.gather(*[self.send(user, message) for user in self.users], return_exceptions=True)
+            self.queue.task_done()
+
+    async def send(self, user, message, retries=3):
+        for _ in range(retries):
+            with tracing.span("rate limit"):
+                await self.bucket.acquire()
+            started = time.perf_counter()
+            try:
+                with tracing.span("send"):
+                    result = await self.bot.send_message(user, message)
+                metrics.telegram_seconds.observe(time.perf_counter() - started, "ok")
+                return result
+            except RetryAfter as e:
+                metrics.telegram_seconds.observe(time.perf_counter() - started, "retry_after")
+                logger.warning(f"Flood control for {user}, retry in {e.timeout} seconds")
+                with tracing.span("flood control"):
+                    await asyncio.sleep(e.timeout)
+            except Exception:
+                metrics.telegram_seconds.observe(time.perf_counter() - started, "error")
+                raise
+        metrics.signals.inc("dropped")
+        logger.error(f"Signal to {user} dropped after {retries} attempts")
+
+    async def close(self):
+        self.flush()
+        if self.task is not None:
+            await self.queue.join()
+            self.task.cancel()
+            self.task = None
+
+
+class PrintBot:
+    # Вместо Telegram: сообщение печатается, подписчикам ничего не уходит (main.py --replay)
+    async def send_message(self, user, text):
+        print(text)
+
+
+dispatcher = SignalDispatcher(bot, ids)
+
+
 if __name__ == "__main__":
     executor.start_polling(dp, skip_updates=True)
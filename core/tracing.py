@@ -0,0 +1,179 @@
+import os
+import time
+import heapq
+import signal
+import asyncio
+import cProfile
+import contextvars
+from collections import deque
+
+
+# Трассировка циклов: вложенные интервалы (цикл -> биржа -> запрос/разбор/сборка -> поиск -> рассылка)
+# по time.monotonic. Корень - один запуск задачи планировщика (опрос биржи, поиск) или одна рассылка Telegram.
+# Завершённые циклы лежат в кольцевом буфере; dump() пишет самые долгие в формате folded stacks
+# (flamegraph.pl, speedscope, inferno). Текущий интервал передаётся через contextvars, поэтому задачи
+# asyncio.gather вешают свои интервалы на того, кто их запустил. Вне цикла span() ничего не делает,
+# в процессах разбора (core.workers) тоже. Фоновые задачи запускаются через detach() и в цикл не попадают.
+# Сигналы: SIGUSR1 - cProfile на следующие profile_cycles циклов, SIGUSR2 - dump() самых долгих
+current = contextvars.ContextVar("span", default=None)
+
+
+class Span:
+    __slots__ = ("name", "started", "finished", "children", "wall")
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.monotonic()
+        self.finished = None
+        self.children = []
+        self.wall = None
+
+    def duration(self):
+        return (self.finished or time.monotonic()) - self.started
+
+
+class SpanContext:
+    def __init__(self, tracer, name, root):
+        self.tracer = tracer
+        self.name = name
+        self.root = root
+        self.span = None
+
+    def __enter__(self):
+        parent = current.get()
+        if not self.tracer.enabled or (parent is None and not self.root):
+            return None
+        self.span = Span(self.name)
+        if parent is not None:
+            # цикл внутри цикла - просто вложенный интервал
+            parent.children.append(self.span)
+            self.root = False
+        else:
+            self.span.wall = time.time()
+            self.tracer.started()
+        self.token = current.set(self.span)
+        return self.span
+
+    def __exit__(self, *exc_info):
+        if self.span is None:
+            return
+        self.span.finished = time.monotonic()
+        current.reset(self.token)
+        if self.root:
+            self.tracer.finish(self.span)
+
+
+class Idle:
+    # span() вне цикла: ничего не создаётся
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+IDLE = Idle()
+
+
+class Tracer:
+    def __init__(self, capacity=512, directory="traces", profile_cycles=5, slowest=10):
+        self.enabled = True
+        self.cycles = deque(maxlen=capacity)
+        self.directory = directory
+        self.profile_cycles = profile_cycles
+        self.slowest_count = slowest
+        self.profiler = None
+        self.profile_pending = 0
+        self.profile_left = 0
+
+    def span(self, name):
+        if current.get() is None:
+            return IDLE
+        return SpanContext(self, name, False)
+
+    def cycle(self, name):
+        return SpanContext(self, name, True)
+
+    def started(self):
+        # профилирование, заказанное сигналом, начинается с начала следующего цикла
+        if self.profile_pending and self.profiler is None:
+            self.profile_left, self.profile_pending = self.profile_pending, 0
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+            print(f"Profiling the next {self.profile_left} cycles")
+
+    def finish(self, span):
+        self.cycles.append(span)
+        if self.profiler is not None:
+            self.profile_left -= 1
+            if self.profile_left <= 0:
+                self.stop_profile()
+
+    def profile(self, cycles=None):
+        self.profile_pending = cycles or self.profile_cycles
+
+    def stop_profile(self):
+        profiler, self.profiler = self.profiler, None
+        profiler.disable()
+        path = self.path("profile", "prof")
+        profiler.dump_stats(path)
+        print(f"Profile written to {path} (python3 -m pstats {path})")
+        return path
+
+    def slowest(self, count=None):
+        return heapq.nlargest(count or self.slowest_count, self.cycles, key=Span.duration)
+
+    def folded(self, count=None):
+        # строка на стек: "цикл;биржа;запрос микросекунды", время - собственное, без вложенных интервалов.
+        # Вложенные интервалы из gather идут параллельно, их сумма может быть больше родителя
+        lines = []
+
+        def walk(span, stack):
+            stack = stack + [span.name.replace(";", ",")]
+            own = span.duration() - sum(child.duration() for child in span.children)
+            if own > 0:
+                lines.append(f"{';'.join(stack)} {int(own * 1e6)}")
+            for child in span.children:
+                walk(child, stack)
+
+        for span in self.slowest(count):
+            # каждый цикл - отдельная башня на графике
+            stamp = time.strftime("%H:%M:%S", time.localtime(span.wall))
+            root = Span(f"{span.name} {stamp} {round(span.duration(), 3)}s")
+            root.started, root.finished, root.children = span.started, span.finished, span.children
+            walk(root, [])
+        return lines
+
+    def path(self, kind, extension):
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, f"{kind}-{time.strftime('%Y%m%d-%H%M%S')}.{extension}")
+
+    def dump(self, count=None):
+        path = self.path("slowest", "folded")
+        with open(path, "w") as f:
+            f.write("\n".join(self.folded(count)) + "\n")
+        print(f"Slowest {len(self.slowest(count))} cycles written to {path} (flamegraph.pl {path} > flame.svg)")
+        return path
+
+    def install_signals(self):
+        loop = asyncio.get_running_loop()
+        if hasattr(signal, "SIGUSR1"):
+            loop.add_signal_handler(signal.SIGUSR1, self.profile)
+            loop.add_signal_handler(signal.SIGUSR2, self.dump)
+
+
+tracer = Tracer()
+
+
+def span(name):
+    return tracer.span(name)
+
+
+def cycle(name):
+    return tracer.cycle(name)
+
+
+def detach(coro):
+    # Фоновая задача (обновление кеша, запись на диск) стартует с пустым контекстом. Иначе она унаследует
+    # текущий интервал и повесит свои интервалы на цикл, который её не ждёт и к тому времени уже в буфере
+    return asyncio.create_task(coro, context=contextvars.Context())
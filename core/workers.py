@@ -0,0 +1,103 @@
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from core.snapshots import Snapshot
+
+
+# Состояние процесса-исполнителя: экземпляры бирж и разобранные метаданные (status, coin_info) по ключу биржи
+instances = {}
+metadata = {}
+
+
+def warm():
+    # импорт бирж и чтение конфигов до первого цикла
+    from core import exchanges
+    return os.getpid()
+
+
+def build_packed(key, name, ticker_body, metadata_bodies):
+    # -> Snapshot.pack() или None, если в этом процессе ещё нет метаданных биржи
+    from core import exchanges
+    exchange = instances.get(key)
+    if exchange is None:
+        exchange = instances[key] = exchanges.EXCHANGES[name]()
+    if metadata_bodies is not None:
+        status_body, coin_body = metadata_bodies
+        metadata[key] = (exchange.decoders["status"].decode(status_body), exchange.decoders["coin_info"].decode(coin_body))
+    elif key not in metadata:
+        return None
+    status_of_coins, coin_infos = metadata[key]
+    snapshot = exchange.build_snapshot(exchange.decoders["ticker_price"].decode(ticker_body), status_of_coins, coin_infos)
+    return snapshot.pack()
+
+
+class ParsePool:
+    # Разбор ответов бирж и сборка снапшотов в отдельных процессах, цикл событий остаётся только под I/O и Telegram.
+    # Каждая биржа закреплена за одним процессом: там между циклами живут её список пар и метаданные,
+    # поэтому status и coin_info (мегабайты) отправляются туда только когда MetadataCache их обновил,
+    # а каждый цикл - только тело тикеров. Обратно приходит компактный снапшот (только активные монеты)
+    def __init__(self, processes=None):
+        self.processes = processes or os.cpu_count() or 1
+        # fork до запуска цикла событий и потоков, процессы сразу прогреваются
+        self.context = multiprocessing.get_context("fork")
+        self.executors = []
+        self.slots = {}
+        self.sources = {}
+
+    def start(self):
+        for _ in range(self.processes):
+            executor = ProcessPoolExecutor(max_workers=1, mp_context=self.context)
+            executor.submit(warm).result()
+            self.executors.append(executor)
+        return self
+
+    def executor(self, key):
+        if key not in self.slots:
+            self.slots[key] = len(self.slots) % self.processes
+        return self.executors[self.slots[key]]
+
+    def restart(self, key):
+        # процесс упал: поднимаем новый, метаданные всех его бирж придётся отправить заново
+        slot = self.slots[key]
+        self.executors[slot].shutdown(wait=False)
+        self.executors[slot] = ProcessPoolExecutor(max_workers=1, mp_context=self.context)
+        for other, other_slot in self.slots.items():
+            if other_slot == slot:
+                self.sources.pop(other, None)
+
+    async def build(self, exchange, ticker_body, status_body, coin_body, key=None):
+        key = key or exchange.name
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            source = self.sources.get(key)
+            if source is None or source[0] is not status_body or source[1] is not coin_body:
+                metadata_bodies = (status_body, coin_body)
+            else:
+                metadata_bodies = None
+            try:
+                packed = await loop.run_in_executor(
+                    self.executor(key), build_packed, key, exchange.name, ticker_body, metadata_bodies
+                )
+            except BrokenProcessPool:
+                if attempt:
+                    raise
+                print(f"Parse worker for {key} died, restarting it")
+                self.restart(key)
+                continue
+            self.sources[key] = (status_body, coin_body)
+            if packed is not None:
+                break
+            # процесс новый и метаданных не видел
+            self.sources.pop(key, None)
+        if exchange.snapshot is None:
+            exchange.snapshot = Snapshot(exchange.name, exchange.quotes)
+        return exchange.snapshot.unpack(packed)
+
+    def close(self):
+        for executor in self.executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+        self.executors = []
+        self.slots = {}
+        self.sources = {}
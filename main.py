@@ -3,88 +3,317 @@ import json
 import pprint
 import asyncio
 import aiohttp
-import time
 import traceback
 import sys
+import time
 from datetime import datetime
+from functools import partial
 from core import exchanges
-from core.tg_bot import send_signal
+from core.snapshots import FileSink, replay
+from core.streams import StreamHub
+from core import scanner
+from core.profit import ProfitEngine
+from core.depth import DepthChecker, SkipDepth
+from core.scheduler import Scheduler
+from core.workers import ParsePool
+from core.capture import CaptureSink
+from core.identity import IdentityIndex, BadBases
+from core.lifecycle import OpportunityTracker
+from core import metrics
+from core import tracing
+from core.tg_bot import send_signal, dispatcher, SignalDispatcher, PrintBot
 
 
 with open("misc/keys.json", "rb") as f:
     keys = json.load(f)
 
+identity = IdentityIndex(BadBases()) # какие монеты с одним тикером - один актив и по какой сети их переводить
+taker_fees = {name: endpoint['taker_fee'] for name, endpoint in exchanges.BaseExchange.endpoints.items() if 'taker_fee' in endpoint}
 
-async def find_arbitrage_pairs():
-    valid_exchanges = ["binance", "okx", "gate", "kucoin"] # bitget
-    with open(f"misc/bad_bases.json", "r") as f:
-        bad_bases = json.load(f)
-    try:
-        for index_A in range(len(valid_exchanges)-1):
-            for index_B in range(index_A+1, len(valid_exchanges)):
-                exchange_A = valid_exchanges[index_A]
-                exchange_B = valid_exchanges[index_B]
-
-                with open(f"tickers/tickers_{exchange_A}.json", "r") as f:
-                    tickers_A = json.load(f)
-                
-                with open(f"tickers/tickers_{exchange_B}.json", "r") as f:
-                    tickers_B = json.load(f)
-
-                bases_A = tickers_A.keys()
-                bases_B = tickers_B.keys()
-
-                intersection_bases_A = set(bases_A)
-                intersection_bases_B = set(bases_B)
-
-                intersection_bases = intersection_bases_A.intersection(intersection_bases_B)
-                flag_bad_exchanges = False
-                for base in intersection_bases:
-                    if base in bad_bases:
-                        for bad_exchanges in bad_bases[base]:
-                            if exchange_A in bad_exchanges and exchange_B in bad_exchanges:
-                                flag_bad_exchanges = True
-                    
-                    if flag_bad_exchanges:
-                        continue
-
-                    price_A = tickers_A[base]['prices']['USDT']
-                    price_B = tickers_B[base]['prices']['USDT']
-                    if price_A < price_B:
-                        ratio = price_A / price_B
-                    else:
-                        ratio = price_B / price_A
-                    if ratio < limit:
-                        text = f"""
-Exchange A | Exchange B
-{exchange_A} | {exchange_B}
+
+def opportunity_text(opportunity):
+    if opportunity.fee_known:
+        break_even = f"{round(opportunity.break_even, 2)} USDT"
+    else:
+        break_even = f"неизвестно, комиссия вывода на {opportunity.buy} неизвестна и в Net edge не учтена"
+    text = f"""
+Buy | Sell
+{opportunity.buy} ({opportunity.buy_quote}) | {opportunity.sell} ({opportunity.sell_quote})
 -------------------------------
-Coin: {base}
-Ratio: {ratio}
+Coin: {opportunity.base}
+Ask | Bid: {opportunity.buy_price} | {opportunity.sell_price}
+Edge: {round((opportunity.sell_price / opportunity.buy_price - 1) * 100, 2)}%
+Net edge: {round(opportunity.net_edge * 100, 2)}% на {opportunity.notional} USDT
+Break-even: {break_even}
 """
-                        # pprint.pprint(text)
-                        await send_signal(text)
+    if opportunity.max_notional is not None:
+        text += f"""Executable spread: {round(opportunity.executable_spread * 100, 2)}%
+Max size: {round(opportunity.max_notional, 2)} USDT
+"""
+    return text
+
+
+def report_closed(events):
+    for event in events:
+        if event.kind == "close":
+            print(f"Closed {event.base} {event.exchange_A} -> {event.exchange_B} after {round(event.duration, 1)}s, "
+                  f"peak {round((1 / event.peak - 1) * 100, 2)}%")
+
+
+async def find_arbitrage_pairs(snapshots, dispatcher=dispatcher):
+    # какие биржи опрашивать, решает exchanges.ENABLED: все пришедшие снапшоты идут в поиск
+    try:
+        with metrics.scan_seconds.time("poll"), tracing.span("scan"):
+            hits = scanner.scan(snapshots, limit, identity.update(snapshots))
+        metrics.scan_hits.inc("poll", value=len(hits))
+        with tracing.span("lifecycle"):
+            report_closed(tracker.observe(hits))
+        with tracing.span("profit"):
+            ranked = profit.rank(hits, snapshots)
+        with tracing.span("depth"):
+            opportunities = await depth.check_all(ranked, snapshots)
+        if capture is not None:
+            with tracing.span("capture"):
+                capture.put_snapshots(snapshots)
+                capture.put_opportunities(opportunities)
+        with tracing.span("dispatch"):
+            for opportunity in opportunities:
+                # о возможности сообщаем один раз за её жизнь, а не каждый цикл, пока она держится
+                key = (opportunity.base, opportunity.buy, opportunity.sell)
+                if tracker.announce(key):
+                    dispatcher.put(opportunity_text(opportunity), key=key)
+            dispatcher.flush()
     except Exception as e:
         print(e)
-        print(exchange_A, exchange_B)
-        print(base)
         traceback.print_exception(*sys.exc_info())
 
 
+async def dispatch_signals(signals, by_name, dispatcher=dispatcher):
+    # --stream: открывшиеся сигналы -> чистая прибыль -> стаканы всех кандидатов одним check_all,
+    # чтобы запросы шли параллельно (до concurrency DepthChecker), а не по два на сигнал друг за другом
+    with tracing.span("evaluate"):
+        candidates = []
+        for signal in signals:
+            if signal.opened:
+                opportunity = profit.evaluate(signal.base, by_name[signal.exchange_A], by_name[signal.exchange_B])
+                if opportunity.executable:
+                    candidates.append(opportunity)
+    if not candidates:
+        return []
+    with tracing.span("depth"):
+        opportunities = await depth.check_all(candidates, list(by_name.values()))
+    if capture is not None:
+        capture.put_opportunities(opportunities)
+    for opportunity in opportunities:
+        dispatcher.put(opportunity_text(opportunity), key=(opportunity.base, opportunity.buy, opportunity.sell))
+    dispatcher.flush()
+    return opportunities
+
+
+async def refresh_stream(instances, incremental, hub):
+    # --stream: снапшоты пересобираются через REST на тех же объектах бирж (метаданные из MetadataCache),
+    # сканер забывает монеты, у которых закрылись депозит или вывод, потоки переподписываются на новый список пар
+    signals = []
+    for exchange, result in zip(instances, await asyncio.gather(*[exchange.get_tickers_price() for exchange in instances],
+                                                                return_exceptions=True)):
+        if isinstance(result, BaseException):
+            print(f"Exchange refresh failed: {result!r}")
+            continue
+        signals += incremental.reload(result)
+    await hub.resync()
+    return signals
+
+
+async def gather_snapshots(instances=None):
+    # Ошибка одной биржи не должна ронять весь цикл: такие биржи просто пропускаются
+    snapshots = []
+    for result in await asyncio.gather(*exchanges.import_classes(instances), return_exceptions=True):
+        if isinstance(result, BaseException):
+            print(f"Exchange failed: {result!r}")
+        else:
+            snapshots.append(result)
+    return snapshots
+
+
 async def main():
+    if metrics_server is not None:
+        await metrics_server.start()
+    tracing.tracer.install_signals()
     pasta = f"\n{'---'*20}\nМАШИНА ДЕНЕГ ПО ARBITRAGE ЗАПУЩЕНА ☄️☄️☄️\nРазница между ценами: {round(1 - limit, 2) * 100}%\nПерезарядка на {secs} секунд\n{'---'*20}\n"
     await send_signal(pasta)
-    while True:
-        await asyncio.gather(*exchanges.import_classes())
-        await asyncio.gather(find_arbitrage_pairs())
-        time.sleep(secs)
+    dispatcher.start()
+    if persist:
+        exchanges.BaseExchange.sink = FileSink()
+    instances = exchanges.load_exchanges()
+    latest = {}
+    scheduler = Scheduler()
+
+    # Каждая биржа опрашивается в своём темпе (poll_period в misc/endpoints.json, но не чаще лимитов биржи),
+    # сканер раз в secs секунд работает с последними снапшотами
+    def poller(exchange):
+        async def poll():
+            try:
+                snapshot = await exchange.get_tickers_price()
+            except exchanges.CircuitOpen as e:
+                print(e)
+                return
+            latest[snapshot.name] = snapshot
+        poll.__name__ = f"poll {exchange.name}"
+        return poll
+
+    # Сканер работает только с теми биржами, чьи данные не старше max_age секунд
+    async def scan():
+        await find_arbitrage_pairs([snapshot for snapshot in latest.values() if snapshot.is_fresh(max_age)])
+
+    try:
+        with tracing.cycle("startup"):
+            for snapshot in await gather_snapshots(instances):
+                latest[snapshot.name] = snapshot
+        for exchange in instances:
+            # стартовый опрос только что был, следующий - через свой период
+            scheduler.every(partial(exchange.poll_interval, secs), poller(exchange), overrun=overrun, delayed=True)
+        scheduler.every(secs, scan, overrun=overrun)
+        await scheduler.wait()
+    finally:
+        print(tracker.report())
+        await scheduler.close()
+        await dispatcher.close()
+        if exchanges.BaseExchange.sink is not None:
+            await exchanges.BaseExchange.sink.flush()
+        if exchanges.BaseExchange.pool is not None:
+            exchanges.BaseExchange.pool.close()
+        if capture is not None:
+            await capture.close()
+        if metrics_server is not None:
+            await metrics_server.close()
+        await exchanges.BaseExchange.close_sessions()
+
+
+async def main_stream():
+    # python3 main.py --stream: цены по WebSocket, перепроверяются только изменившиеся базы,
+    # сигнал отправляется один раз при пересечении порога
+    if metrics_server is not None:
+        await metrics_server.start()
+    tracing.tracer.install_signals()
+    pasta = f"\n{'---'*20}\nМАШИНА ДЕНЕГ ПО ARBITRAGE ЗАПУЩЕНА В РЕЖИМЕ STREAM ☄️☄️☄️\nРазница между ценами: {round(1 - limit, 2) * 100}%\n{'---'*20}\n"
+    await send_signal(pasta)
+    dispatcher.start()
+    # возможности закрывает сам сканер, сроки не нужны
+    tracker.ttl = None
+    instances = exchanges.load_exchanges()
+    snapshots = await gather_snapshots(instances)
+    by_name = {snapshot.name: snapshot for snapshot in snapshots}
+    # биржи, упавшие на старте, в стрим не попадают и не обновляются
+    instances = [exchange for exchange in instances if by_name.get(exchange.name) is exchange.snapshot]
+    # статусы, депозиты и выводы меняются на ходу: снапшоты пересобираются через REST с периодом кеша метаданных
+    refresh_period = min(min(exchange.metadata_ttl.values()) for exchange in instances) if instances else None
+    refreshed_at = time.monotonic()
+    incremental = scanner.IncrementalScanner(limit, identity.update(snapshots))
+    signals = incremental.load(snapshots)
+    for signal in signals:
+        tracker.settle(signal.base, incremental.signals.get(signal.base))
+    hub = StreamHub(snapshots)
+    hub.start()
+    stale = set()
+    try:
+        while True:
+            with tracing.cycle("stream"):
+                # Биржа, по которой давно не было обновлений (например, упал стрим), выключается из сканера
+                for snapshot in snapshots:
+                    if snapshot.is_fresh(max_age):
+                        stale.discard(snapshot.name)
+                    elif snapshot.name not in stale:
+                        print(f"{snapshot.name} is stale, excluding it from the scan")
+                        stale.add(snapshot.name)
+                        for base in snapshot.bases():
+                            incremental.remove(snapshot.name, base)
+                            if base in tracker.by_base:
+                                report_closed(tracker.settle(base, incremental.signals.get(base)))
+                await dispatch_signals(signals, by_name)
+                signals = []
+                if refresh_period is not None and time.monotonic() - refreshed_at >= refresh_period:
+                    refreshed_at = time.monotonic()
+                    with tracing.span("refresh"):
+                        signals = await refresh_stream(instances, incremental, hub)
+                # правки misc/bad_bases.json и новые списки пар после refresh_stream
+                identity.update(snapshots)
+                # с таймаутом: иначе при полностью молчащем потоке проверка устаревания выше не запускается
+                changes = await hub.changes(timeout=max_age / 3)
+                with metrics.scan_seconds.time("stream"), tracing.span("scan"):
+                    for name, base in changes:
+                        # монету могла убрать пересборка через REST, пока подписка ещё старая
+                        if base not in by_name[name]:
+                            continue
+                        signal = incremental.update(name, base, *by_name[name].best(base))
+                        if signal is not None:
+                            signals.append(signal)
+                with tracing.span("lifecycle"):
+                    # у открытой базы могла смениться лучшая пара, поэтому сверяемся со всеми изменившимися
+                    # и со всеми, чей сигнал поменяла пересборка через REST
+                    for base in {base for _, base in changes} | {signal.base for signal in signals}:
+                        report_closed(tracker.settle(base, incremental.signals.get(base)))
+                metrics.scan_hits.inc("stream", value=len(signals))
+            await asyncio.sleep(stream_interval)
+    finally:
+        print(tracker.report())
+        await hub.close()
+        await dispatcher.close()
+        if exchanges.BaseExchange.pool is not None:
+            exchanges.BaseExchange.pool.close()
+        if capture is not None:
+            await capture.close()
+        if metrics_server is not None:
+            await metrics_server.close()
+        await exchanges.BaseExchange.close_sessions()
+
+
+async def main_replay():
+    # python3 main.py --replay: один проход сканера по сохранённым tickers/tickers_<name>.json включённых бирж.
+    # Цены в файлах старые, поэтому найденное только печатается, в Telegram ничего не уходит, а стаканы не запрашиваются
+    printer = SignalDispatcher(PrintBot(), ["replay"])
+    printer.start()
+    with tracing.cycle("replay"):
+        await find_arbitrage_pairs(replay(exchanges.ENABLED), printer)
+    print(tracker.report())
+    await printer.close()
+    if capture is not None:
+        await capture.close()
+    await exchanges.BaseExchange.close_sessions()
 
 
 if __name__ == "__main__":
     limit = 0.98
     secs = 30
+    max_age = 90 # снапшоты старше этого (секунды) не участвуют в поиске
+    overrun = "skip" # что делать, если цикл не уложился в secs: skip или coalesce
+    notional = 1000 # размер сделки в USDT для расчёта чистой прибыли
+    profit = ProfitEngine(notional, taker_fees, identity)
+    depth = DepthChecker(notional, concurrency=8) # стаканы только для кандидатов
+    # открытые возможности и их длительности; в режиме опроса возможность закрывается на первом поиске,
+    # который её не нашёл, в --stream - при пересечении порога обратно (core.lifecycle)
+    tracker = OpportunityTracker(ttl=secs / 2)
+    stream_interval = 1 # минимальная пауза между проверками в режиме --stream
+    persist = "--persist" in sys.argv # сохранять ответы бирж и снапшоты в tickers/
+    # --capture: история цен и возможностей в captures/ (core.capture, читать через core.capture.read)
+    capture = CaptureSink() if "--capture" in sys.argv else None
+    # --profile: cProfile на первые циклы, дальше по SIGUSR1; SIGUSR2 - самые долгие циклы в traces/ (core.tracing)
+    if "--profile" in sys.argv:
+        tracing.tracer.profile()
+    # --metrics: метрики Prometheus на http://127.0.0.1:9108/metrics (core.metrics)
+    metrics_server = metrics.MetricsServer(9108) if "--metrics" in sys.argv else None
+    if "--pool" in sys.argv:
+        # разбор ответов и сборка снапшотов в отдельных процессах, процессы поднимаются до цикла событий
+        exchanges.BaseExchange.pool = ParsePool().start()
+    if "--replay" in sys.argv:
+        # стаканы живых бирж к записанным ценам не относятся
+        depth = SkipDepth()
+        asyncio.run(main_replay())
+        sys.exit()
     try:
-        asyncio.run(main())
+        if "--stream" in sys.argv:
+            asyncio.run(main_stream())
+        else:
+            asyncio.run(main())
     except Exception as e:
         traceback.print_exception(*sys.exc_info())
         asyncio.run(send_signal("ПРОГРАММА ПО ARBITRAGE ВЫКЛЮЧИЛАСЬ"))
@@ -0,0 +1,15 @@
+import os
+import sys
+import json
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.suite import workdir
+
+
+# Модули читают misc/ из текущей папки при импорте, поэтому тесты работают во временной папке,
+# как bench/suite.py: ненастоящие ключи, пустой список подписчиков Telegram и misc/endpoints.json репозитория.
+# Записанные ответы бирж - по абсолютному пути, ROOT/tickers
+with open(os.path.join(ROOT, "misc", "endpoints.json"), "rb") as f:
+    os.chdir(workdir(json.load(f)))
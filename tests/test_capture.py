@@ -0,0 +1,41 @@
+import asyncio
+from core.capture import CaptureSink, read
+
+
+ROW = (1700000000., "BTC", "binance", "okx", "USDT", "USDT", 25000., 25100., 1000., 3., 0.003, 0.002, 5000.)
+
+
+def test_close_returns_with_items_still_queued(tmp_path):
+    async def go():
+        sink = CaptureSink(str(tmp_path))
+        for _ in range(10):
+            sink.put("opportunities", [ROW])
+        # drain ещё не успел забрать очередь
+        await asyncio.wait_for(sink.close(), 5)
+        assert sink.task is None
+    asyncio.run(go())
+    assert len(read("opportunities", directory=str(tmp_path))["time"]) == 10
+
+
+def test_close_returns_after_drain_went_idle(tmp_path):
+    async def go():
+        sink = CaptureSink(str(tmp_path), flush_interval=0.01)
+        sink.put("opportunities", [ROW])
+        await asyncio.sleep(0.05)
+        sink.put("opportunities", [ROW, ROW])
+        await asyncio.wait_for(sink.close(), 5)
+    asyncio.run(go())
+    columns = read("opportunities", directory=str(tmp_path))
+    assert list(columns["base"]) == ["BTC"] * 3
+    assert list(columns["sell_price"]) == [25100.] * 3
+
+
+def test_close_with_full_queue(tmp_path):
+    async def go():
+        sink = CaptureSink(str(tmp_path), max_pending=2)
+        for _ in range(5):
+            sink.put("opportunities", [ROW])
+        await asyncio.wait_for(sink.close(), 5)
+        return sink.dropped
+    assert asyncio.run(go()) == 3
+    assert len(read("opportunities", directory=str(tmp_path))["time"]) == 2
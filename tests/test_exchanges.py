@@ -0,0 +1,263 @@
+import os
+import json
+import asyncio
+import pytest
+from aiohttp import web
+from core import exchanges
+from core.exchanges import CircuitBreaker, CircuitOpen
+
+
+def opened(reset_timeout=0.):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=reset_timeout)
+    breaker.failure()
+    breaker.failure()
+    return breaker
+
+
+def test_breaker_opens_after_threshold():
+    async def go():
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        breaker.failure()
+        assert await breaker.acquire() == (True, None)
+        breaker.failure()
+        assert await breaker.acquire() == (False, None)
+    asyncio.run(go())
+
+
+def test_half_open_lets_one_probe_through_and_holds_the_rest():
+    async def go():
+        breaker = opened()
+        results = []
+
+        async def request():
+            allowed, probe = await breaker.acquire()
+            results.append((allowed, probe is not None))
+
+        waiting = [asyncio.create_task(request()) for _ in range(5)]
+        allowed, probe = await breaker.acquire()
+        assert allowed and probe is not None
+        await asyncio.sleep(0.01)
+        # пока проба идёт, остальные ждут
+        assert results == []
+        breaker.success()
+        await asyncio.gather(*waiting)
+        assert results == [(True, False)] * 5
+    asyncio.run(go())
+
+
+def test_failed_probe_opens_circuit_for_the_waiting():
+    async def go():
+        breaker = opened(reset_timeout=0.05)
+        await asyncio.sleep(0.06)
+        allowed, probe = await breaker.acquire()
+        assert allowed and probe is not None
+        waiting = asyncio.create_task(breaker.acquire())
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+        breaker.failure()
+        assert await waiting == (False, None)
+    asyncio.run(go())
+
+
+def test_abandoned_probe_hands_over_to_next_request():
+    async def go():
+        breaker = opened()
+        _, probe = await breaker.acquire()
+        waiting = asyncio.create_task(breaker.acquire())
+        await asyncio.sleep(0.01)
+        # проба отменена: ни успеха, ни ошибки
+        breaker.finish(probe)
+        allowed, next_probe = await waiting
+        assert allowed and next_probe is not None and next_probe is not probe
+    asyncio.run(go())
+
+
+def test_only_probe_request_reaches_exchange_while_half_open():
+    async def go():
+        started = []
+
+        async def handle(request):
+            started.append(asyncio.get_running_loop().time())
+            await asyncio.sleep(0.1)
+            return web.json_response({"symbols": []})
+
+        app = web.Application()
+        app.router.add_get("/api/v3/exchangeInfo", handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", 8767).start()
+        exchange = exchanges.BinanceExchange()
+        exchange.base_url = "http://127.0.0.1:8767"
+        exchange.breaker = opened()
+        try:
+            await asyncio.gather(*[exchange.request("/api/v3/exchangeInfo", endpoint="status") for _ in range(4)])
+        finally:
+            await exchanges.BaseExchange.close_sessions()
+            await runner.cleanup()
+        assert len(started) == 4
+        # остальные запросы ушли только после ответа на пробный
+        assert all(moment - started[0] >= 0.09 for moment in started[1:])
+        assert exchange.breaker.opened_at is None
+    asyncio.run(go())
+
+
+def test_open_circuit_rejects_without_request():
+    async def go():
+        exchange = exchanges.BinanceExchange()
+        exchange.base_url = "http://127.0.0.1:1"
+        exchange.breaker = opened(reset_timeout=60)
+        try:
+            await exchange.request("/api/v3/exchangeInfo", endpoint="status")
+        except CircuitOpen:
+            return
+        raise AssertionError("request went through an open circuit")
+    asyncio.run(go())
+
+
+def test_cancelled_exchange_does_not_become_snapshot():
+    import main
+
+    class Cancelled:
+        async def get_tickers_price(self):
+            raise asyncio.CancelledError()
+
+    class Working:
+        async def get_tickers_price(self):
+            return "snapshot"
+
+    assert asyncio.run(main.gather_snapshots([Cancelled(), Working()])) == ["snapshot"]
+
+
+# Сверка сборки снапшота с прежним выводом: tickers/tickers_<name>.json записан старым кодом
+# из тех же ответов price/status/info. Расхождения - только задуманные (описаны в [user-014])
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RECORDED = ["binance", "okx", "kucoin", "gate", "bitget"]
+# у ECOX нет записи в сведениях о монетах, такие монеты теперь отбрасываются
+MISSING = {"kucoin": {"ECOX"}}
+# раньше тикер не за USDT (BTC-USDC) удалял монету с OKX целиком
+SUPERSET = {"okx"}
+
+
+def recorded(name):
+    exchange = exchanges.EXCHANGES[name]()
+    payloads = []
+    for kind, endpoint in (("price", "ticker_price"), ("status", "status"), ("info", "coin_info")):
+        with open(os.path.join(ROOT, "tickers", f"{kind}_{name}.json"), "rb") as f:
+            payloads.append(exchange.decoders[endpoint].decode(f.read()))
+    return exchange, exchange.build_snapshot(*payloads)
+
+
+def check_normalized(snapshot, pairs):
+    # norm_bid/norm_ask - лучшие bid/ask по всем котируемым, пересчитанные в USDT по курсам снапшота
+    for base, pair in pairs.items():
+        bids = [bid * snapshot.rates[quote][0] for quote, bid in pair["bid"].items() if quote in snapshot.rates]
+        asks = [ask * snapshot.rates[quote][1] for quote, ask in pair["ask"].items() if quote in snapshot.rates]
+        assert snapshot.best(base) == (max(bids), min(asks))
+        if "USDT" in pair["prices"]:
+            assert snapshot.best(base)[0] >= pair["bid"]["USDT"]
+            assert snapshot.best(base)[1] <= pair["ask"]["USDT"]
+
+
+@pytest.mark.parametrize("name", RECORDED)
+def test_snapshot_matches_baseline_output(name):
+    exchange, snapshot = recorded(name)
+    with open(os.path.join(ROOT, "tickers", f"tickers_{name}.json")) as f:
+        baseline = json.load(f)
+    pairs = snapshot.to_pairs()
+    usdt = {base for base, pair in pairs.items() if "USDT" in pair["prices"]}
+
+    expected = set(baseline) - MISSING.get(name, set())
+    assert set(baseline) - usdt == MISSING.get(name, set())
+    if name in SUPERSET:
+        assert usdt > expected
+    else:
+        assert usdt == expected
+    for base in set(baseline) & usdt:
+        assert pairs[base]["prices"]["USDT"] == baseline[base]["prices"]["USDT"]
+        assert pairs[base].get("name") == baseline[base].get("name")
+        assert pairs[base].get("base_another") == baseline[base].get("base_another")
+    for pair in pairs.values():
+        assert set(pair["prices"]) <= set(exchange.quotes)
+        assert pair["quotes"] == exchange.quotes
+    check_normalized(snapshot, pairs)
+
+
+def test_bybit_snapshot_from_payload():
+    # ответ собран вручную по spot v3, как эндпоинты в misc/endpoints.json: тикеры s/bp/ap/qv/lp, монеты в result.rows
+    chain = {"chain": "ETH", "chainDeposit": "1", "chainWithdraw": "1",
+             "withdrawFee": "0.001", "withdrawMin": "0.002", "depositMin": "0"}
+    status = {"result": {"list": [
+        {"baseCoin": "BTC", "quoteCoin": "USDT", "showStatus": "1"},
+        {"baseCoin": "ETH", "quoteCoin": "USDT", "showStatus": "1"},
+        {"baseCoin": "ETH", "quoteCoin": "BTC", "showStatus": "1"},
+        {"baseCoin": "SOL", "quoteCoin": "USDT", "showStatus": "0"},
+        {"baseCoin": "XRP", "quoteCoin": "USDT", "showStatus": "1"},
+    ]}}
+    info = {"result": {"rows": [
+        {"coin": "BTC", "chains": [dict(chain, chain="BTC")]},
+        {"coin": "ETH", "chains": [chain]},
+        {"coin": "SOL", "chains": [chain]},
+        {"coin": "XRP", "chains": [dict(chain, chainWithdraw="0")]},
+    ]}}
+    price = {"result": {"list": [
+        {"s": "BTCUSDT", "bp": "25000", "ap": "25002", "qv": "1000000", "lp": "25001"},
+        {"s": "ETHUSDT", "bp": "2000", "ap": "2002", "qv": "1000000", "lp": "2001"},
+        {"s": "ETHBTC", "bp": "0.0801", "ap": "0.0802", "qv": "100", "lp": "0.08"},
+        {"s": "SOLUSDT", "bp": "20", "ap": "20.01", "qv": "1000000", "lp": "20"},
+        {"s": "XRPUSDT", "bp": "0.5", "ap": "0.5001", "qv": "1000000", "lp": "0.5"},
+    ]}}
+    exchange = exchanges.BybitExchange()
+    payloads = [exchange.decoders[endpoint].decode(json.dumps(data).encode())
+                for data, endpoint in ((price, "ticker_price"), (status, "status"), (info, "coin_info"))]
+    snapshot = exchange.build_snapshot(*payloads)
+    pairs = snapshot.to_pairs()
+
+    # SOL не торгуется, у XRP закрыт вывод
+    assert set(pairs) == {"BTC", "ETH"}
+    assert pairs["BTC"]["prices"] == {"USDT": 25001.}
+    assert pairs["ETH"]["prices"] == {"USDT": 2001., "BTC": 0.08015}
+    assert pairs["ETH"]["withdraw_min_fee"] == 0.001
+    # продать ETH выгоднее за BTC: 0.0801 * 25000 = 2002.5 > 2000
+    assert snapshot.best("ETH") == (0.0801 * 25000., 2002.)
+    assert snapshot.best_quotes("ETH") == ("BTC", "USDT")
+    check_normalized(snapshot, pairs)
+
+
+def test_bybit_fixtures_build_snapshot():
+    # tickers/*_bybit.json собраны вручную из записи Binance (см. bench/suite.py)
+    exchange, snapshot = recorded("bybit")
+    _, binance = recorded("binance")
+    assert len(snapshot) > 100
+    assert set(snapshot.bases()) <= set(binance.bases()) | set(exchange.quotes)
+    check_normalized(snapshot, snapshot.to_pairs())
+
+
+def test_bybit_coin_info_is_persisted():
+    class Sink:
+        def __init__(self):
+            self.files = {}
+
+        def write(self, filename, data):
+            self.files[filename] = data
+
+    async def go():
+        async def handle(request):
+            return web.json_response({"retCode": 0, "result": {"rows": []}})
+
+        app = web.Application()
+        app.router.add_get("/asset/v3/private/coin-info/query", handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", 8767).start()
+        exchange = exchanges.BybitExchange()
+        exchange.base_url = "http://127.0.0.1:8767"
+        exchange.sink = Sink()
+        try:
+            await exchange.fetch_coin_info()
+        finally:
+            await exchanges.BaseExchange.close_sessions()
+            await runner.cleanup()
+        return exchange.sink.files
+    files = asyncio.run(go())
+    assert list(files) == ["info_bybit.json"]
+    assert files["info_bybit.json"]["result"] == {"rows": []}
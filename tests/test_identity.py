@@ -0,0 +1,58 @@
+import os
+import json
+from core.identity import IdentityIndex, BadBases
+from core.scanner import scan_pairs, scan_matrix
+from test_exchanges import ROOT, RECORDED, recorded
+
+
+BAD_BASES = os.path.join(ROOT, "misc", "bad_bases.json")
+
+
+def index():
+    snapshots = [recorded(name)[1] for name in RECORDED]
+    return IdentityIndex(BadBases(BAD_BASES)).update(snapshots), snapshots
+
+
+def listed():
+    # каждая запись ручного списка в обе стороны
+    with open(BAD_BASES) as f:
+        bad_bases = json.load(f)
+    for base, pairs in bad_bases.items():
+        for exchange_A, exchange_B in pairs:
+            yield base, exchange_A, exchange_B
+            yield base, exchange_B, exchange_A
+
+
+def test_every_bad_bases_entry_stays_blocked():
+    identity, _ = index()
+    for base, exchange_A, exchange_B in listed():
+        assert identity.is_bad(base, exchange_A, exchange_B)
+        assert (base, exchange_A, exchange_B) in identity.keys
+        assert base in identity.bases
+        assert identity.route(base, exchange_A, exchange_B) is None
+
+
+def test_bad_bases_entries_are_not_reported():
+    identity, snapshots = index()
+    bad = set(listed())
+    # порог выше 1 - в ответ попадают все пары бирж с общей монетой
+    for scan in (scan_pairs, scan_matrix):
+        hits = scan(snapshots, 10, identity)
+        assert hits
+        assert not [hit for hit in hits if (hit[2], hit[0], hit[1]) in bad]
+
+
+def test_networks_alone_miss_listed_entries():
+    # без ручного списка MC kucoin->binance и BABYDOGE проходят: сетей для них не хватает
+    snapshots = [recorded(name)[1] for name in RECORDED]
+    identity = IdentityIndex().update(snapshots)
+    assert not identity.is_bad("MC", "kucoin", "binance")
+    assert identity.route("BABYDOGE", "okx", "gate") is not None
+    assert IdentityIndex(BadBases(BAD_BASES)).update(snapshots).route("BABYDOGE", "okx", "gate") is None
+
+
+def test_bad_bases_keep_network_blocks():
+    identity, _ = index()
+    without = IdentityIndex().update([recorded(name)[1] for name in RECORDED])
+    assert without.blocked <= identity.keys
+    assert identity.keys == frozenset(without.blocked) | BadBases(BAD_BASES).keys
@@ -0,0 +1,74 @@
+from core.lifecycle import OpportunityTracker
+
+
+KEY = ("SOL", "binance", "okx")
+
+
+def hit(ratio, base="SOL", exchange_A="binance", exchange_B="okx"):
+    return (exchange_A, exchange_B, base, ratio)
+
+
+def kinds(events):
+    return [(event.kind, event.base, event.exchange_A, event.exchange_B) for event in events]
+
+
+def test_open_update_close_by_ttl():
+    tracker = OpportunityTracker(ttl=5)
+    assert kinds(tracker.observe([hit(0.97)], now=0)) == [("open",) + KEY]
+    # хуже пика - без события, лучше - update с новым пиком
+    assert tracker.observe([hit(0.975)], now=2) == []
+    events = tracker.observe([hit(0.96)], now=4)
+    assert kinds(events) == [("update",) + KEY] and events[0].peak == 0.96
+
+    # последнее появление в 4, ttl 5: в 8 ещё открыта, в 9 закрыта
+    assert tracker.observe([], now=8) == []
+    events = tracker.observe([], now=9)
+    assert kinds(events) == [("close",) + KEY]
+    assert events[0].duration == 4 and events[0].peak == 0.96
+    assert tracker.open == {} and tracker.by_base == {}
+    assert tracker.stats()[("binance", "okx")]["count"] == 1
+
+
+def test_stale_deadlines_are_skipped():
+    tracker = OpportunityTracker(ttl=5)
+    for now in range(4):
+        tracker.observe([hit(0.97)], now=now)
+    # по записи в куче на каждое появление, живая - только последняя
+    assert len(tracker.deadlines) == 4
+    assert tracker.observe([], now=7) == []
+    assert KEY in tracker.open and len(tracker.deadlines) == 1
+    assert kinds(tracker.observe([], now=8)) == [("close",) + KEY]
+
+    # закрытый явно ключ не закрывается второй раз по старой записи
+    tracker.observe([hit(0.97)], now=10)
+    assert tracker.close(KEY, now=11) is not None
+    assert tracker.observe([], now=20) == []
+    assert tracker.closed[("binance", "okx")] == 2
+
+
+def test_settle_closes_previous_pair_when_best_switches():
+    tracker = OpportunityTracker()
+    assert kinds(tracker.settle("SOL", ("binance", "okx", 0.97), now=0)) == [("open",) + KEY]
+    assert tracker.settle("SOL", ("binance", "okx", 0.97), now=2) == []
+    events = tracker.settle("SOL", ("binance", "bybit", 0.96), now=3)
+    assert kinds(events) == [("close",) + KEY, ("open", "SOL", "binance", "bybit")]
+    # длительность - до последнего раза, когда пару видели лучшей
+    assert events[0].duration == 2
+    assert tracker.by_base == {"SOL": {("SOL", "binance", "bybit")}}
+    # другие базы не трогаются, best=None закрывает всё по базе
+    tracker.settle("DOT", ("okx", "binance", 0.97), now=4)
+    assert kinds(tracker.settle("SOL", None, now=5)) == [("close", "SOL", "binance", "bybit")]
+    assert set(tracker.open) == {("DOT", "okx", "binance")}
+
+
+def test_announce_once_per_lifetime():
+    tracker = OpportunityTracker(ttl=5)
+    tracker.observe([hit(0.97)], now=0)
+    assert tracker.announce(KEY)
+    tracker.observe([hit(0.96)], now=1)
+    assert not tracker.announce(KEY)
+    # после закрытия это новая возможность - о ней сообщается снова
+    tracker.observe([], now=10)
+    tracker.observe([hit(0.97)], now=11)
+    assert tracker.announce(KEY)
+    assert not tracker.announce(KEY)
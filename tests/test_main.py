@@ -0,0 +1,116 @@
+import asyncio
+import pytest
+import main
+from core import exchanges
+from core.snapshots import Snapshot
+from core.profit import ProfitEngine
+from core.lifecycle import OpportunityTracker
+
+
+class Collect:
+    # вместо SignalDispatcher: запоминает ключи сообщений
+    def __init__(self):
+        self.keys = []
+
+    def put(self, text, key=None):
+        self.keys.append(key)
+        return True
+
+    def flush(self):
+        pass
+
+
+class Depth:
+    # вместо DepthChecker: стаканы не запрашиваются, запоминается каждый вызов
+    def __init__(self):
+        self.calls = []
+
+    async def check_all(self, opportunities, snapshots):
+        self.calls.append(list(opportunities))
+        return opportunities
+
+
+@pytest.fixture
+def globals_(monkeypatch):
+    # то, что main.py задаёт в __main__
+    monkeypatch.setattr(main, "limit", 0.98, raising=False)
+    monkeypatch.setattr(main, "profit", ProfitEngine(1000, main.taker_fees), raising=False)
+    monkeypatch.setattr(main, "depth", Depth(), raising=False)
+    monkeypatch.setattr(main, "tracker", OpportunityTracker(), raising=False)
+    monkeypatch.setattr(main, "capture", None, raising=False)
+    return main
+
+
+def pair(bid, ask):
+    return {"prices": {"USDT": (bid + ask) / 2}, "bid": {"USDT": bid}, "ask": {"USDT": ask}, "withdraw_min_fee": 0.}
+
+
+def test_every_polled_exchange_is_scanned(globals_):
+    # bitget не в ENABLED по умолчанию, но если его снапшот пришёл, он участвует в поиске
+    assert "bitget" not in exchanges.ENABLED
+    snapshots = [Snapshot.from_pairs("binance", {"SOL": pair(20., 20.01)}),
+                 Snapshot.from_pairs("bitget", {"SOL": pair(21., 21.01)})]
+    dispatcher = Collect()
+    asyncio.run(main.find_arbitrage_pairs(snapshots, dispatcher))
+    assert dispatcher.keys == [("SOL", "binance", "bitget")]
+
+
+def test_replay_does_not_touch_exchanges(globals_, monkeypatch):
+    from core.depth import SkipDepth
+
+    async def offline(*args, **kwargs):
+        raise AssertionError("replay requested an order book")
+
+    monkeypatch.setattr(exchanges.BaseExchange, "request_order_book", offline)
+    monkeypatch.setattr(main, "depth", SkipDepth())
+    snapshots = [Snapshot.from_pairs("binance", {"SOL": pair(20., 20.01)}),
+                 Snapshot.from_pairs("okx", {"SOL": pair(21., 21.01)})]
+    dispatcher = Collect()
+    asyncio.run(main.find_arbitrage_pairs(snapshots, dispatcher))
+    assert dispatcher.keys == [("SOL", "binance", "okx")]
+
+
+def test_stream_signals_are_depth_checked_together(globals_):
+    from core.scanner import Signal
+    bases = ["SOL", "AVAX", "DOT"]
+    by_name = {
+        "binance": Snapshot.from_pairs("binance", {base: pair(20., 20.01) for base in bases}),
+        "okx": Snapshot.from_pairs("okx", {base: pair(21., 21.01) for base in bases}),
+    }
+    signals = [Signal(base, "binance", "okx", 0.95) for base in bases] + [Signal("SOL", "binance", "okx", 1., opened=False)]
+    dispatcher = Collect()
+    opportunities = asyncio.run(main.dispatch_signals(signals, by_name, dispatcher))
+    # один вызов на все открывшиеся сигналы
+    assert [[opportunity.base for opportunity in call] for call in main.depth.calls] == [bases]
+    assert [opportunity.base for opportunity in opportunities] == bases
+    assert dispatcher.keys == [(base, "binance", "okx") for base in bases]
+    assert asyncio.run(main.dispatch_signals([], by_name, dispatcher)) == []
+    assert len(main.depth.calls) == 1
+
+
+class Rebuilt:
+    # вместо биржи: get_tickers_price пересобирает тот же снапшот из очередного набора пар
+    def __init__(self, name, *listings):
+        self.name = name
+        self.listings = list(listings)
+        self.snapshot = Snapshot.from_pairs(name, self.listings.pop(0))
+
+    async def get_tickers_price(self):
+        fresh = Snapshot.from_pairs(self.name, self.listings.pop(0))
+        self.snapshot.__dict__.update(fresh.__dict__)
+        return self.snapshot
+
+
+def test_stream_refresh_drops_closed_withdrawals():
+    from core.scanner import IncrementalScanner
+    from core.streams import StreamHub
+    binance = Rebuilt("binance", {"SOL": pair(20., 20.01), "DOT": pair(5., 5.01)},
+                      {"DOT": pair(5., 5.01)})
+    okx = Rebuilt("okx", {"SOL": pair(21., 21.01), "DOT": pair(5., 5.01)}, {"SOL": pair(21., 21.01), "DOT": pair(5., 5.01)})
+    incremental = IncrementalScanner(0.98)
+    assert [signal.base for signal in incremental.load([binance.snapshot, okx.snapshot])] == ["SOL"]
+
+    # на binance закрыли вывод SOL: после пересборки сигнал закрывается, а не висит до следующего тика
+    signals = asyncio.run(main.refresh_stream([binance, okx], incremental, StreamHub([])))
+    assert [(signal.base, signal.opened) for signal in signals] == [("SOL", False)]
+    assert "SOL" not in incremental.signals
@@ -0,0 +1,59 @@
+import math
+import json
+from core.snapshots import Snapshot
+from core.identity import network, route, UNKNOWN_FEE
+from core.profit import ProfitEngine
+
+
+def pair(bid, ask, fee=None):
+    pair = {"prices": {"USDT": (bid + ask) / 2}, "bid": {"USDT": bid}, "ask": {"USDT": ask}}
+    if fee is not None:
+        pair["withdraw_min_fee"] = fee
+    return pair
+
+
+def snapshots():
+    # на gate комиссий вывода нет (как в его ответах), на kucoin они есть
+    gate = Snapshot.from_pairs("gate", {"MDX": pair(0.0859, 0.086), "BTC": pair(25000., 25001.)})
+    kucoin = Snapshot.from_pairs("kucoin", {"MDX": pair(0.0964, 0.0965, 1), "BTC": pair(25600., 25601., 0.0005)})
+    binance = Snapshot.from_pairs("binance", {"MDX": pair(0.0964, 0.0965, 1), "BTC": pair(25100., 25101., 0.0005)})
+    return gate, kucoin, binance
+
+
+def test_unknown_withdraw_fee_is_not_free():
+    gate, kucoin, _ = snapshots()
+    profit = ProfitEngine(1000)
+    opportunity = profit.evaluate("MDX", gate, kucoin)
+    assert not opportunity.fee_known
+    assert math.isnan(opportunity.break_even)
+    assert opportunity.executable
+
+    costed = profit.evaluate("MDX", kucoin, gate)
+    assert costed.fee_known and not math.isnan(costed.break_even)
+
+
+def test_fully_costed_rank_first():
+    gate, kucoin, binance = snapshots()
+    hits = [("gate", "kucoin", "MDX", 0.89), ("binance", "kucoin", "BTC", 0.99)]
+    ranked = ProfitEngine(1000).rank(hits, [gate, kucoin, binance])
+    # у MDX с gate выше оценка, но комиссия вывода неизвестна
+    assert ranked[0].net_edge < ranked[1].net_edge
+    assert [(opportunity.base, opportunity.fee_known) for opportunity in ranked] == [("BTC", True), ("MDX", False)]
+
+
+def test_route_prefers_network_with_known_fee():
+    unknown = network("ETH", "", True, True, UNKNOWN_FEE)
+    known = network("ERC20", "", True, True, 5.)
+    assert route([unknown, known], [network("ETH", "", True, True, 1.)])[0] is known
+
+
+def test_unknown_fee_survives_persisted_snapshot():
+    gate, _, _ = snapshots()
+    assert math.isnan(gate.withdraw_fee[gate.index("MDX")])
+    pairs = gate.to_pairs()
+    pairs["MDX"]["networks"] = [list(network("ETH", "", True, True, UNKNOWN_FEE))]
+    # orjson пишет nan как null
+    pairs = json.loads(json.dumps(pairs).replace("NaN", "null"))
+    restored = Snapshot.from_pairs("gate", pairs)
+    assert math.isnan(restored.withdraw_fee[restored.index("MDX")])
+    assert math.isnan(restored.listing.networks[restored.index("MDX")][0].withdraw_fee)
@@ -0,0 +1,115 @@
+import os
+import json
+import pytest
+from core.snapshots import Snapshot
+from core.identity import IdentityIndex, BadBases
+from core.scanner import IncrementalScanner, scan_pairs, scan_matrix
+
+
+LIMIT = 0.98
+# на a дешевле всего, на b дороже всего; c дороже a больше чем на порог, а b дороже c - меньше
+PRICES = {"a": (99., 100.), "b": (110., 111.), "c": (107.5, 108.5)}
+BASES = ["SKIP"] + [f"COIN{number}" for number in range(5)]
+
+
+class Excluded:
+    # запрет только на указанные направления, без зеркальных
+    def __init__(self, *keys):
+        self.keys = frozenset(keys)
+
+    def is_bad(self, base, exchange_A, exchange_B):
+        return (base, exchange_A, exchange_B) in self.keys
+
+
+def snapshots():
+    result = []
+    for name, (bid, ask) in PRICES.items():
+        pairs = {base: {"prices": {"USDT": (bid + ask) / 2}, "bid": {"USDT": bid}, "ask": {"USDT": ask}} for base in BASES}
+        result.append(Snapshot.from_pairs(name, pairs))
+    return result
+
+
+def found(scan, identity=None):
+    return {(base, buy, sell) for buy, sell, base, _ in scan(snapshots(), LIMIT, identity)}
+
+
+@pytest.mark.parametrize("scan", [scan_pairs, scan_matrix])
+def test_exclusion_hides_only_its_direction(scan):
+    everything = found(scan)
+    assert everything == {(base, buy, sell) for base in BASES for buy, sell in (("a", "b"), ("a", "c"))}
+
+    hits = found(scan, Excluded(("SKIP", "a", "b")))
+    assert hits == everything - {("SKIP", "a", "b")}
+    # обратное направление запрещено, прямое - нет
+    assert found(scan, Excluded(("SKIP", "b", "a"))) == everything
+
+
+@pytest.mark.parametrize("scan", [scan_pairs, scan_matrix])
+def test_exclusion_does_not_stick(scan):
+    # прежний флаг пропуска не сбрасывался: после запрещённой базы терялись все следующие
+    hits = found(scan, Excluded(("SKIP", "a", "b"), ("COIN4", "a", "c")))
+    assert {base for base, buy, sell in hits if (buy, sell) == ("a", "b")} == set(BASES[1:])
+    assert {base for base, buy, sell in hits if (buy, sell) == ("a", "c")} == set(BASES[:-1])
+    # следующий проход без запретов видит всё
+    assert found(scan) == found(scan, Excluded())
+
+
+def test_incremental_scanner_falls_back_to_allowed_pair():
+    scanner = IncrementalScanner(LIMIT, Excluded(("SKIP", "a", "b"), ("COIN0", "b", "a")))
+    signals = {signal.base: signal for signal in scanner.load(snapshots())}
+    assert set(signals) == set(BASES)
+    # запрещена лучшая пара - берётся следующая по выгоде
+    assert (signals["SKIP"].exchange_A, signals["SKIP"].exchange_B) == ("a", "c")
+    for base in BASES[1:]:
+        assert (signals[base].exchange_A, signals[base].exchange_B) == ("a", "b")
+
+    # запрет на SKIP не мешает обновлениям других баз на тех же биржах
+    signal = scanner.update("b", "COIN1", 99., 100.)
+    assert signal is None and scanner.signals["COIN1"][:2] == ("a", "c")
+
+
+def write(path, data, mtime):
+    with open(path, "w") as f:
+        json.dump(data, f)
+    os.utime(path, (mtime, mtime))
+
+
+def test_bad_bases_reload_on_mtime(tmp_path):
+    path = str(tmp_path / "bad_bases.json")
+    write(path, {"SKIP": [["a", "b"]]}, 1000)
+    bad_bases = BadBases(path)
+    assert bad_bases.keys == {("SKIP", "a", "b"), ("SKIP", "b", "a")}
+    assert bad_bases.bases == {"SKIP"}
+
+    # файл тот же по mtime - не перечитывается
+    write(path, {"COIN0": [["a", "c"]]}, 1000)
+    assert bad_bases.reload().keys == {("SKIP", "a", "b"), ("SKIP", "b", "a")}
+
+    write(path, {"COIN0": [["a", "c"]]}, 2000)
+    assert bad_bases.reload().keys == {("COIN0", "a", "c"), ("COIN0", "c", "a")}
+
+
+def test_identity_picks_up_edited_bad_bases(tmp_path):
+    path = str(tmp_path / "bad_bases.json")
+    write(path, {"SKIP": [["a", "b"]]}, 1000)
+    identity = IdentityIndex(BadBases(path)).update(snapshots())
+    assert found(scan_matrix, identity) == found(scan_matrix) - {("SKIP", "a", "b")}
+
+    write(path, {}, 2000)
+    identity.update(snapshots())
+    assert found(scan_matrix, identity) == found(scan_matrix)
+    assert found(scan_pairs, identity) == found(scan_pairs)
+
+
+def test_incremental_reload_drops_bases_gone_from_rest():
+    scanner = IncrementalScanner(LIMIT)
+    a, b, c = snapshots()
+    scanner.load([a, b, c])
+    assert scanner.signals["SKIP"][:2] == ("a", "b")
+    # вывод SKIP на a закрыли: пересобранный снапшот a её больше не содержит
+    a.flags[a.index("SKIP")] = 0
+    a.finish()
+    signals = scanner.reload(a)
+    assert [(signal.base, signal.opened) for signal in signals] == [("SKIP", False)]
+    assert "a" not in scanner.prices["SKIP"]
+    assert scanner.signals["COIN0"][:2] == ("a", "b")
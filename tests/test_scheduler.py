@@ -0,0 +1,33 @@
+import asyncio
+from core.scheduler import Scheduler
+
+
+def runs(period, seconds, **options):
+    async def go():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        times = []
+
+        async def job():
+            times.append(loop.time() - started)
+
+        scheduler = Scheduler()
+        scheduler.every(period, job, **options)
+        await asyncio.sleep(seconds)
+        await scheduler.close()
+        return times
+    return asyncio.run(go())
+
+
+def test_runs_at_once_and_then_every_period():
+    times = runs(0.05, 0.22)
+    assert len(times) == 5
+    assert times[0] < 0.02
+    for number, moment in enumerate(times):
+        assert abs(moment - number * 0.05) < 0.02
+
+
+def test_delayed_first_run_waits_one_period():
+    times = runs(lambda: 0.05, 0.22, delayed=True)
+    assert len(times) == 4
+    assert abs(times[0] - 0.05) < 0.02
@@ -0,0 +1,219 @@
+import json
+import asyncio
+from bench.stub import StreamStub
+from core.snapshots import Snapshot
+from core import streams
+
+
+PAIRS = {
+    "BTC": {"prices": {"USDT": 25000.}, "bid": {"USDT": 24999.}, "ask": {"USDT": 25001.}},
+    "ETH": {"prices": {"USDT": 2000., "BTC": 0.08}, "bid": {"USDT": 1999., "BTC": 0.0799}, "ask": {"USDT": 2001., "BTC": 0.0801}},
+}
+
+
+def snapshot(name):
+    return Snapshot.from_pairs(name, json.loads(json.dumps(PAIRS)))
+
+
+def stream(name):
+    hub = streams.StreamHub([])
+    return streams.STREAMS[name](snapshot(name), hub), hub
+
+
+def test_parse_ticker_messages():
+    binance, _ = stream("binance")
+    assert binance.parse({"u": 1, "s": "BTCUSDT", "b": "24990", "B": "1", "a": "25010", "A": "2"}) == \
+        [("BTCUSDT", "24990", "25010")]
+    assert binance.parse({"result": None, "id": 1}) == []
+
+    okx, _ = stream("okx")
+    message = {"arg": {"channel": "tickers", "instId": "BTC-USDT"},
+               "data": [{"instId": "BTC-USDT", "bidPx": "24990", "askPx": "25010", "last": "25000"}]}
+    assert okx.parse(message) == [("BTC-USDT", "24990", "25010")]
+    assert okx.parse({"event": "subscribe", "arg": {"channel": "tickers", "instId": "BTC-USDT"}}) == []
+
+    kucoin, _ = stream("kucoin")
+    message = {"type": "message", "topic": "/market/ticker:all", "subject": "BTC-USDT",
+               "data": {"bestBid": "24990", "bestAsk": "25010", "price": "25000"}}
+    assert kucoin.parse(message) == [("BTC-USDT", "24990", "25010")]
+    assert kucoin.parse({"id": "1", "type": "welcome"}) == []
+
+    gate, _ = stream("gate")
+    message = {"channel": "spot.book_ticker", "event": "update", "result": {"s": "BTC_USDT", "b": "24990", "a": "25010"}}
+    assert gate.parse(message) == [("BTC_USDT", "24990", "25010")]
+    assert gate.parse({"channel": "spot.book_ticker", "event": "subscribe", "result": {"status": "success"}}) == []
+
+
+def test_subscribes_to_listed_pairs_and_quote_rates():
+    okx, _ = stream("okx")
+    assert set(okx.symbols) == {"BTC-USDT", "ETH-USDT", "ETH-BTC"}
+    # BTC-USDT - и цена монеты BTC, и курс котируемой BTC
+    assert okx.symbols["BTC-USDT"][1:] == ("BTC", "USDT", "BTC")
+    gate, _ = stream("gate")
+    assert set(gate.symbols) == {"BTC_USDT", "ETH_USDT", "ETH_BTC"}
+
+
+def test_update_moves_snapshot_prices():
+    binance, hub = stream("binance")
+    snapshot = binance.snapshot
+    created_at = snapshot.created_at
+    binance.update("ETHUSDT", "1990", "1991")
+    assert snapshot.bid["USDT"][snapshot.index("ETH")] == 1990.
+    assert snapshot.best("ETH")[1] == 1991.
+    assert snapshot.created_at > created_at
+    assert hub.changed == {("binance", "ETH")}
+
+    # та же цена - база не перепроверяется
+    hub.changed.clear()
+    binance.update("ETHUSDT", "1990", "1991")
+    assert hub.changed == set()
+
+
+def test_update_skips_bad_quotes():
+    binance, hub = stream("binance")
+    snapshot = binance.snapshot
+    binance.update("DOGEUSDT", "0.07", "0.0701")
+    binance.update("ETHUSDT", "0", "1991")
+    # спред шире spread_limit, как в фильтре REST
+    binance.update("ETHUSDT", "1800", "2000")
+    assert hub.changed == set()
+    assert snapshot.best("ETH") == (1999., 2001.)
+
+
+def test_update_of_quote_pair_sets_rate():
+    binance, hub = stream("binance")
+    snapshot = binance.snapshot
+    binance.update("BTCUSDT", "30000", "30001")
+    assert snapshot.rates["BTC"] == (30000., 30001.)
+    assert hub.changed == {("binance", "BTC")}
+    # ETH за BTC пересчитывается по новому курсу на своём следующем тике
+    binance.update("ETHBTC", "0.0799", "0.08")
+    assert snapshot.best("ETH")[0] == 0.0799 * 30000.
+
+
+async def until(condition):
+    while not condition():
+        await asyncio.sleep(0.01)
+
+
+def subscriptions(stub):
+    return [json.loads(message) for message in stub.received if message != "ping"]
+
+
+def run(case):
+    async def go():
+        stub = await StreamStub().start()
+        try:
+            await asyncio.wait_for(case(stub), 10)
+        finally:
+            await streams.exchanges.BaseExchange.close_sessions()
+            await stub.close()
+    asyncio.run(go())
+
+
+def test_stream_applies_messages_from_server():
+    async def case(stub):
+        hub = streams.StreamHub([snapshot("binance")])
+        hub.streams[0].url = stub.url
+        hub.start()
+        try:
+            await stub.connected.wait()
+            await stub.send({"u": 1, "s": "BTCUSDT", "b": "25100", "B": "1", "a": "25101", "A": "1"})
+            assert await hub.changes() == {("binance", "BTC")}
+            assert hub.streams[0].snapshot.best("BTC") == (25100., 25101.)
+        finally:
+            await hub.close()
+    run(case)
+
+
+def test_stream_reconnects_and_subscribes_again():
+    async def case(stub):
+        hub = streams.StreamHub([snapshot("okx")])
+        okx = hub.streams[0]
+        okx.url = stub.url
+        okx.min_backoff = 0.01
+        hub.start()
+        try:
+            await until(lambda: len(subscriptions(stub)) == 1)
+            await stub.drop()
+            await until(lambda: len(subscriptions(stub)) == 2)
+            assert len(stub.attempts) == 2
+            assert {arg["instId"] for arg in subscriptions(stub)[1]["args"]} == set(okx.symbols)
+
+            await stub.send({"arg": {"channel": "tickers"}, "data": [{"instId": "ETH-USDT", "bidPx": "2010", "askPx": "2011"}]})
+            assert await hub.changes() == {("okx", "ETH")}
+        finally:
+            await hub.close()
+    run(case)
+
+
+def test_stream_pings_when_idle():
+    async def case(stub):
+        hub = streams.StreamHub([snapshot("okx")])
+        hub.streams[0].url = stub.url
+        hub.streams[0].ping_interval = 0.05
+        hub.start()
+        try:
+            await until(lambda: "ping" in stub.received)
+        finally:
+            await hub.close()
+    run(case)
+
+
+def test_reconnect_backoff_doubles_up_to_limit_and_resets():
+    async def case(stub):
+        stub.refuse = True
+        hub = streams.StreamHub([snapshot("binance")])
+        binance = hub.streams[0]
+        binance.url = stub.url
+        binance.min_backoff = 0.05
+        binance.max_backoff = 0.2
+        hub.start()
+        try:
+            await until(lambda: len(stub.attempts) >= 6)
+            gaps = [after - before for before, after in zip(stub.attempts, stub.attempts[1:])]
+            # каждая пауза - backoff плюс разброс до min_backoff
+            for gap, backoff in zip(gaps, (0.05, 0.1, 0.2, 0.2, 0.2)):
+                assert backoff <= gap < backoff + 0.05 + 0.1
+
+            stub.refuse = False
+            await stub.connected.wait()
+            connected = len(stub.attempts)
+            await stub.drop()
+            await until(lambda: len(stub.attempts) > connected)
+            # после удачного подключения отсчёт снова с min_backoff
+            assert stub.attempts[-1] - stub.attempts[-2] < 0.2
+        finally:
+            await hub.close()
+    run(case)
+
+
+def test_silent_feed_does_not_block_the_loop():
+    async def go():
+        hub = streams.StreamHub([])
+        started = asyncio.get_running_loop().time()
+        assert await hub.changes(timeout=0.05) == set()
+        return asyncio.get_running_loop().time() - started
+    assert asyncio.run(go()) < 1
+
+
+def test_resync_resubscribes_after_rest_rebuild():
+    async def case(stub):
+        hub = streams.StreamHub([snapshot("okx")])
+        okx = hub.streams[0]
+        okx.url = stub.url
+        okx.min_backoff = 0.01
+        hub.start()
+        try:
+            await until(lambda: len(subscriptions(stub)) == 1)
+            # пересборка через REST: у ETH закрыли вывод, монета больше не проходит фильтры
+            okx.snapshot.flags[okx.snapshot.index("ETH")] = 0
+            okx.snapshot.finish()
+            await hub.resync()
+            await until(lambda: len(subscriptions(stub)) == 2)
+            assert {arg["instId"] for arg in subscriptions(stub)[1]["args"]} == {"BTC-USDT"}
+            # без изменений соединение не трогается
+            assert not await okx.resync()
+        finally:
+            await hub.close()
+    run(case)
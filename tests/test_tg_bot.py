@@ -0,0 +1,127 @@
+import time
+import asyncio
+from aiogram.utils.exceptions import RetryAfter
+from core.tg_bot import SignalDispatcher, split
+
+
+class FakeBot:
+    # Вместо aiogram.Bot: запоминает отправленное, первые flood ответов - RetryAfter
+    def __init__(self, flood=0):
+        self.messages = []
+        self.flood = flood
+
+    async def send_message(self, user, text):
+        if self.flood:
+            self.flood -= 1
+            raise RetryAfter(0)
+        self.messages.append((user, text))
+
+
+def deliver(dispatcher, produce):
+    async def go():
+        dispatcher.start()
+        produce(dispatcher)
+        await dispatcher.close()
+    asyncio.run(go())
+
+
+def test_cycle_is_batched_into_one_message_per_user():
+    bot = FakeBot()
+    dispatcher = SignalDispatcher(bot, [1, 2])
+
+    def produce(dispatcher):
+        for base in ("BTC", "ETH", "SOL"):
+            assert dispatcher.put(f"{base}\n", key=(base, "binance", "okx"))
+        dispatcher.flush()
+
+    deliver(dispatcher, produce)
+    assert sorted(bot.messages) == [(1, "BTC\nETH\nSOL\n"), (2, "BTC\nETH\nSOL\n")]
+
+
+def test_put_never_waits_for_network():
+    class SlowBot(FakeBot):
+        async def send_message(self, user, text):
+            await asyncio.sleep(1)
+
+    async def go():
+        dispatcher = SignalDispatcher(SlowBot(), [1])
+        dispatcher.start()
+        started = time.perf_counter()
+        for number in range(100):
+            dispatcher.put(f"{number}\n", key=(str(number), "binance", "okx"))
+            dispatcher.flush()
+        assert time.perf_counter() - started < 0.1
+        dispatcher.task.cancel()
+        await asyncio.gather(dispatcher.task, return_exceptions=True)
+
+    asyncio.run(go())
+
+
+def test_repeated_key_is_suppressed_within_cooldown():
+    dispatcher = SignalDispatcher(FakeBot(), [1], cooldown=0.05)
+    key = ("BTC", "binance", "okx")
+    assert dispatcher.put("first", key=key)
+    assert not dispatcher.put("again", key=key)
+    # другая пара бирж - другой ключ
+    assert dispatcher.put("other pair", key=("BTC", "okx", "binance"))
+    time.sleep(0.06)
+    assert dispatcher.put("after cooldown", key=key)
+    assert dispatcher.batch == ["first", "other pair", "after cooldown"]
+
+
+def test_expired_keys_are_dropped():
+    dispatcher = SignalDispatcher(FakeBot(), [1], cooldown=0.05)
+    for number in range(1000):
+        dispatcher.put("", key=(str(number), "binance", "okx"))
+    time.sleep(0.06)
+    dispatcher.put("", key=("BTC", "binance", "okx"))
+    assert list(dispatcher.sent) == [("BTC", "binance", "okx")]
+
+
+def test_long_signal_is_split_under_telegram_limit():
+    bot = FakeBot()
+    dispatcher = SignalDispatcher(bot, [1])
+    text = "".join(f"line {number}\n" for number in range(2000)) + "x" * 5000
+
+    def produce(dispatcher):
+        dispatcher.put("short\n")
+        dispatcher.put(text)
+        dispatcher.flush()
+
+    deliver(dispatcher, produce)
+    sent = [message for _, message in bot.messages]
+    assert len(sent) > 1
+    assert all(len(message) <= SignalDispatcher.max_length for message in sent)
+    assert "".join(sent) == "short\n" + text
+
+
+def test_split_keeps_short_text_whole():
+    assert split("abc", 10) == ["abc"]
+    assert split("a" * 25, 10) == ["a" * 10, "a" * 10, "a" * 5]
+
+
+def test_retry_after_is_waited_out():
+    bot = FakeBot(flood=2)
+    dispatcher = SignalDispatcher(bot, [1])
+
+    def produce(dispatcher):
+        dispatcher.put("signal")
+        dispatcher.flush()
+
+    deliver(dispatcher, produce)
+    assert bot.messages == [(1, "signal")]
+
+
+def test_fan_out_is_rate_limited():
+    bot = FakeBot()
+    dispatcher = SignalDispatcher(bot, list(range(15)), rate=10)
+
+    def produce(dispatcher):
+        dispatcher.put("signal")
+        dispatcher.flush()
+
+    started = time.perf_counter()
+    deliver(dispatcher, produce)
+    # 10 сразу из запаса, ещё 5 - по 0.1 секунды
+    assert len(bot.messages) == 15
+    assert time.perf_counter() - started >= 0.45
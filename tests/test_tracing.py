@@ -0,0 +1,58 @@
+import asyncio
+from core import tracing
+from core.exchanges import MetadataCache, CacheEntry
+from core.capture import CaptureSink
+
+
+def test_nested_spans_hang_under_cycle():
+    async def go():
+        with tracing.cycle("poll binance") as cycle:
+            with tracing.span("request tickers"):
+                await asyncio.gather(asyncio.sleep(0), asyncio.sleep(0))
+        return cycle
+    cycle = asyncio.run(go())
+    assert [child.name for child in cycle.children] == ["request tickers"]
+    assert cycle is tracing.tracer.cycles[-1]
+
+
+def test_background_refresh_does_not_join_cycle():
+    async def go():
+        cache = MetadataCache()
+        stale = CacheEntry({"old": True})
+        stale.fetched_at -= 3600
+        cache.entries["status"] = stale
+
+        async def fetch(entry):
+            with tracing.span("request status"):
+                await asyncio.sleep(0.05)
+            return CacheEntry({"old": False})
+
+        with tracing.cycle("poll binance") as cycle:
+            assert await cache.get("status", 60, fetch) == {"old": True}
+        await asyncio.gather(*cache.refreshing.values())
+        assert cache.entries["status"].data == {"old": False}
+        return cycle
+    cycle = asyncio.run(go())
+    # обновление шло после цикла и не должно висеть под ним
+    assert cycle.children == []
+    assert not any("request status" in line for line in tracing.tracer.folded())
+
+
+def test_detached_task_starts_outside_any_cycle(tmp_path):
+    async def go():
+        seen = []
+
+        async def background():
+            seen.append(tracing.current.get())
+            with tracing.span("write") as span:
+                seen.append(span)
+
+        with tracing.cycle("scan") as cycle:
+            await tracing.detach(background())
+            sink = CaptureSink(str(tmp_path))
+            sink.put("snapshots", [])
+        await sink.close()
+        return cycle, seen
+    cycle, seen = asyncio.run(go())
+    assert seen == [None, None]
+    assert cycle.children == []